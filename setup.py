@@ -37,6 +37,9 @@ setup(
         "Topic :: Software Development :: Libraries :: Python Modules",
     ],
     install_requires=get_requirements(),
+    extras_require={
+        "udcache-async": ["aiohttp"],
+    },
     python_requires=">=3.6",
     entry_points={
         "console_scripts": [
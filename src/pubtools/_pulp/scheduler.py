@@ -0,0 +1,296 @@
+import fnmatch
+import json
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+try:
+    from time import monotonic
+except ImportError:  # pragma: no cover
+    from monotonic import monotonic
+
+LOG = logging.getLogger("pubtools.pulp")
+
+
+class BoundedStarter(object):
+    """Starts queued operations with bounded concurrency.
+
+    'take_next' is called with 'lock' held, and returns the next operation
+    which can be started, or None. Each operation is then passed to 'start'
+    without the lock held. The owner must call :meth:`finished` with the lock
+    held as each started operation completes, then :meth:`start_more`.
+
+    Only one thread starts operations at a time. This also avoids unbounded
+    recursion if operations complete immediately, since a completion callback
+    arriving while operations are being started simply returns and leaves the
+    rest to the thread already starting them.
+    """
+
+    def __init__(self, lock, take_next, start, concurrency=0):
+        """Create a new starter.
+
+        Arguments:
+            lock (threading.Lock)
+                Lock guarding the owner's queue of operations.
+            take_next (callable)
+                Returns the next operation to start, or None.
+            start (callable)
+                Starts a single operation.
+            concurrency (int)
+                Max number of operations to have running at once. If 0, there
+                is no limit.
+        """
+        self.concurrency = concurrency
+        self.running = 0
+        self._lock = lock
+        self._take_next = take_next
+        self._start = start
+        self._starting = False
+
+    def finished(self):
+        """Record that a started operation has completed.
+
+        Must be called with the lock held."""
+        self.running -= 1
+
+    def start_more(self):
+        """Start as many queued operations as possible."""
+        with self._lock:
+            if self._starting:
+                return
+            self._starting = True
+
+        while True:
+            with self._lock:
+                item = None
+                if not self.concurrency or self.running < self.concurrency:
+                    item = self._take_next()
+                if item is None:
+                    self._starting = False
+                    return
+                self.running += 1
+
+            self._start(item)
+
+
+class PublishScheduler(object):
+    """Schedules Pulp repo publishes with bounded concurrency.
+
+    Repos are started in the following order:
+
+    - repos matching any of the 'priority' patterns first, then...
+    - longest historical publish duration first, according to a local history
+      file (if any), since starting the longest publishes first tends to
+      minimize the total time taken to publish all repos.
+
+    Repos without any recorded duration are treated as taking the median of
+    the known durations.
+    """
+
+    def __init__(self, concurrency=0, history_path=None, priority=None):
+        """Create a new scheduler.
+
+        Arguments:
+            concurrency (int)
+                Max number of publishes to have running at once. If 0, all
+                publishes are started immediately.
+            history_path (str)
+                Path to a JSON file used to load and save publish durations
+                per repo ID.
+            priority (list[str])
+                fnmatch-style patterns for repo IDs to be published first.
+        """
+        self.concurrency = concurrency
+        self.history_path = history_path
+        self.priority = priority or []
+        self.history = self._load_history()
+
+        self._lock = threading.Lock()
+        # Separate lock for writes to the history file, so those don't block
+        # scheduling.
+        self._save_lock = threading.Lock()
+        self._queue = deque()
+        self._starter = BoundedStarter(
+            self._lock,
+            self._take_next,
+            lambda item: self._start(*item),
+            concurrency=concurrency,
+        )
+
+    def _load_history(self):
+        if not self.history_path or not os.path.exists(self.history_path):
+            return {}
+
+        try:
+            with open(self.history_path) as f:
+                return json.load(f)
+        except ValueError:
+            LOG.warning("Ignoring invalid publish history file: %s", self.history_path)
+            return {}
+
+    def save_history(self):
+        """Write publish durations to the history file, if any."""
+        if not self.history_path:
+            return
+
+        with self._lock:
+            history = dict(self.history)
+
+        tmp_path = self.history_path + ".tmp"
+        with self._save_lock:
+            with open(tmp_path, "w") as f:
+                json.dump(history, f, indent=2, sort_keys=True)
+            os.rename(tmp_path, self.history_path)
+
+    def is_priority(self, repo_id):
+        return any(fnmatch.fnmatch(repo_id, pattern) for pattern in self.priority)
+
+    def order(self, repos):
+        """Returns the given repos in the order they should be published."""
+        repos = list(repos)
+
+        known = sorted(self.history.values())
+        default = known[len(known) // 2] if known else 0
+
+        def sort_key(repo):
+            return (
+                not self.is_priority(repo.id),
+                -self.history.get(repo.id, default),
+            )
+
+        return sorted(repos, key=sort_key)
+
+    def schedule(self, repos, publish_fn):
+        """Publish the given repos via publish_fn, a callable accepting a repo and
+        returning a Future.
+
+        Returns a list of Futures, one per repo in the same order as 'repos',
+        each resolved with the result of publish_fn for that repo.
+        """
+        repos = list(repos)
+        out = [Future() for _ in repos]
+        out_by_repo = dict(zip([id(repo) for repo in repos], out))
+
+        with self._lock:
+            for repo in self.order(repos):
+                self._queue.append((repo, publish_fn, out_by_repo[id(repo)]))
+
+        self._starter.start_more()
+        return out
+
+    def _take_next(self):
+        return self._queue.popleft() if self._queue else None
+
+    def _start(self, repo, publish_fn, out):
+        start_time = monotonic()
+
+        def on_done(publish_f):
+            with self._lock:
+                self._starter.finished()
+                if not publish_f.exception():
+                    self.history[repo.id] = round(monotonic() - start_time, 1)
+
+            if publish_f.exception():
+                out.set_exception(publish_f.exception())
+            else:
+                out.set_result(publish_f.result())
+
+            self._starter.start_more()
+
+        try:
+            publish_f = publish_fn(repo)
+        except Exception as ex:  # pylint: disable=broad-except
+            publish_f = Future()
+            publish_f.set_exception(ex)
+
+        publish_f.add_done_callback(on_done)
+
+
+class RepoLockScheduler(object):
+    """Schedules operations on Pulp repos such that operations locking any
+    of the same repos never run at once.
+
+    Pulp holds a lock on a repo for as long as a task on that repo is queued
+    or running, so operations sharing a repo would be serialized by Pulp
+    anyway, in an arbitrary order. Holding them back here instead keeps
+    them in the order scheduled and leaves Pulp's task queue free for
+    operations which can actually proceed.
+
+    An operation whose repos are free may start ahead of earlier operations
+    still waiting on other repos, but never ahead of an earlier operation
+    sharing any of its repos.
+    """
+
+    def __init__(self, concurrency=0):
+        """Create a new scheduler.
+
+        Arguments:
+            concurrency (int)
+                Max number of operations to have running at once. If 0, any
+                number of operations on distinct repos may run at once.
+        """
+        self.concurrency = concurrency
+
+        self._lock = threading.Lock()
+        self._queue = []
+        self._locked = set()
+        self._starter = BoundedStarter(
+            self._lock,
+            self._take_next,
+            lambda item: self._start(*item),
+            concurrency=concurrency,
+        )
+
+    def schedule(self, repo_ids, fn):
+        """Run fn, a callable accepting no arguments and returning a Future,
+        once none of the repos in 'repo_ids' are locked by other operations.
+
+        Returns a Future resolved with the result of fn.
+        """
+        out = Future()
+
+        with self._lock:
+            self._queue.append((frozenset(repo_ids), fn, out))
+
+        self._starter.start_more()
+        return out
+
+    def _take_next(self):
+        # Returns the next operation which can be started, or None.
+        # Caller must hold the lock.
+        #
+        # Repos of earlier waiting operations are considered locked too, so
+        # that operations on any one repo always run in the order scheduled.
+        blocked = set(self._locked)
+        for idx, item in enumerate(self._queue):
+            repo_ids = item[0]
+            if not repo_ids & blocked:
+                del self._queue[idx]
+                self._locked.update(repo_ids)
+                return item
+            blocked.update(repo_ids)
+
+        return None
+
+    def _start(self, repo_ids, fn, out):
+        def on_done(op_f):
+            with self._lock:
+                self._locked.difference_update(repo_ids)
+                self._starter.finished()
+
+            if op_f.exception():
+                out.set_exception(op_f.exception())
+            else:
+                out.set_result(op_f.result())
+
+            self._starter.start_more()
+
+        try:
+            op_f = fn()
+        except Exception as ex:  # pylint: disable=broad-except
+            op_f = Future()
+            op_f.set_exception(ex)
+
+        op_f.add_done_callback(on_done)
@@ -1,25 +1,76 @@
+import collections
+import os
 import threading
 import logging
+from concurrent.futures import Future
+
+try:
+    from time import monotonic
+except ImportError:  # pragma: no cover
+    from monotonic import monotonic
+
+import attr
+from more_executors.futures import f_proxy, f_return
+from pubtools.pulplib import Criteria, Matcher
 
 from .pulp import PulpClientService
 
 LOG = logging.getLogger("pubtools.pulp")
 
+# Number of seconds for which completed search results are cached.
+# If 0, results are not cached after completion, though identical searches
+# still share a single request while in flight.
+SEARCH_CACHE_TTL = float(os.getenv("PUBTOOLS_PULP_SEARCH_CACHE_TTL") or "0")
+
+# Max number of searches held in cache.
+SEARCH_CACHE_SIZE = int(os.getenv("PUBTOOLS_PULP_SEARCH_CACHE_SIZE") or "1000")
+
+
+def criteria_key(value):
+    """Returns a hashable key for the given Criteria, such that equivalent criteria
+    have equal keys.
+    """
+    # Criteria are not reliably hashable (e.g. they may hold lists) and don't have
+    # a useful repr, so they're converted to nested tuples here.
+    if attr.has(type(value)):
+        return (type(value).__name__,) + tuple(
+            criteria_key(getattr(value, field.name))
+            for field in attr.fields(type(value))
+        )
+
+    if isinstance(value, (list, tuple)):
+        return tuple([criteria_key(elem) for elem in value])
+
+    if isinstance(value, dict):
+        return tuple(sorted((key, criteria_key(elem)) for (key, elem) in value.items()))
+
+    if isinstance(value, (Criteria, Matcher, type)):
+        # e.g. TrueCriteria, or a unit class.
+        return getattr(value, "__name__", type(value).__name__)
+
+    return value
+
 
 class CachingPulpClient(object):
     """A Pulp client wrapper adding some modest caching."""
 
-    def __init__(self, delegate):
+    def __init__(
+        self, delegate, search_ttl=SEARCH_CACHE_TTL, search_cache_size=SEARCH_CACHE_SIZE
+    ):
         # Most methods work as usual, so just copy some references across.
-        self.search_repository = delegate.search_repository
-        self.search_content = delegate.search_content
-        self.copy_content = delegate.copy_content
-        self.update_content = delegate.update_content
-
         self._delegate = delegate
         self._repo_cache = {}
         self._lock = threading.Lock()
 
+        # Cache of searches, keyed by (search type, criteria), where each value
+        # is a tuple of (future, expiry time). Expiry time is None while
+        # the search is in progress.
+        self._search_ttl = search_ttl
+        self._search_cache_size = search_cache_size
+        self._search_cache = collections.OrderedDict()
+        self.search_hits = 0
+        self.search_misses = 0
+
     def get_repository(self, repo_id):
         with self._lock:
             # Use cached object if we have one - but not if it was
@@ -34,6 +85,84 @@ class CachingPulpClient(object):
 
         return out
 
+    def preload_repositories(self, repos):
+        """Add already-fetched repos to the cache used by get_repository."""
+        with self._lock:
+            for repo in repos:
+                self._repo_cache[repo.id] = f_return(repo)
+
+    def search_repository(self, criteria=None):
+        return self._search("repository", self._delegate.search_repository, criteria)
+
+    def search_content(self, criteria=None):
+        return self._search("content", self._delegate.search_content, criteria)
+
+    def _search(self, search_type, search_fn, criteria):
+        key = (search_type, criteria_key(criteria))
+
+        with self._lock:
+            cached = self._search_cache.get(key)
+            if cached:
+                (out, expires) = cached
+                if not out.done() or (
+                    expires is not None
+                    and monotonic() < expires
+                    and not out.exception()
+                ):
+                    self.search_hits += 1
+                    self._search_cache.move_to_end(key)
+                    return out
+                del self._search_cache[key]
+
+            # A placeholder is cached before the search is started, so that
+            # identical searches arriving concurrently will share a single
+            # request without the lock being held while the search is started.
+            self.search_misses += 1
+            placeholder = Future()
+            out = f_proxy(placeholder)
+            self._search_cache[key] = (out, None)
+            while len(self._search_cache) > self._search_cache_size:
+                self._search_cache.popitem(last=False)
+
+        out.add_done_callback(lambda f: self._search_done(key, f))
+
+        try:
+            search_f = search_fn(criteria)
+        except Exception as ex:  # pylint: disable=broad-except
+            placeholder.set_exception(ex)
+        else:
+            search_f.add_done_callback(
+                lambda f: self._resolve_placeholder(placeholder, f)
+            )
+
+        return out
+
+    @staticmethod
+    def _resolve_placeholder(placeholder, search_f):
+        exception = search_f.exception()
+        if exception:
+            placeholder.set_exception(exception)
+        else:
+            placeholder.set_result(search_f.result())
+
+    def _search_done(self, key, search_f):
+        with self._lock:
+            cached = self._search_cache.get(key)
+            if not cached or cached[0] is not search_f:
+                # Already evicted or invalidated.
+                return
+
+            if self._search_ttl <= 0 or search_f.exception():
+                del self._search_cache[key]
+            else:
+                self._search_cache[key] = (search_f, monotonic() + self._search_ttl)
+
+    def _invalidate_searches(self, search_type):
+        with self._lock:
+            for key in list(self._search_cache.keys()):
+                if key[0] == search_type:
+                    del self._search_cache[key]
+
     def _invalidate(self, repo_id):
         with self._lock:
             self._repo_cache.pop(repo_id, None)
@@ -43,8 +172,30 @@ class CachingPulpClient(object):
         # cache becomes invalidated.
         out = self._delegate.update_repository(repo)
         out.add_done_callback(lambda _: self._invalidate(repo.id))
+        out.add_done_callback(lambda _: self._invalidate_searches("repository"))
         return out
 
+    def update_content(self, unit):
+        return self.track_content_change(self._delegate.update_content(unit))
+
+    def copy_content(self, *args, **kwargs):
+        # Copies change the repository_memberships of units, so any content
+        # searches may be outdated.
+        return self.track_content_change(self._delegate.copy_content(*args, **kwargs))
+
+    def track_content_change(self, change_f):
+        """Invalidate cached content searches once 'change_f' completes.
+
+        Content changed via repository objects (such as uploads and removals)
+        doesn't pass through this client, so callers making such changes should
+        pass the resulting futures here. Otherwise, a search started just after
+        the change may share a search which started before it.
+
+        Returns 'change_f'.
+        """
+        change_f.add_done_callback(lambda _: self._invalidate_searches("content"))
+        return change_f
+
     def __enter__(self):
         # CachingPulpClient satisfies the context manager protocol to be
         # API-compatible with client, but it does not shut down the delegate
@@ -87,3 +238,13 @@ class CachingPulpClientService(PulpClientService):
         wrapping the specified client if given or a new client otherwise.
         """
         return CachingPulpClient(pulp_client or self.new_pulp_client(**kwargs))
+
+    def __exit__(self, *exc_details):
+        if self.__instance:
+            LOG.info(
+                "Pulp search cache: %s hit(s), %s miss(es)",
+                self.__instance.search_hits,
+                self.__instance.search_misses,
+            )
+
+        super(CachingPulpClientService, self).__exit__(*exc_details)
@@ -1,9 +1,91 @@
+import itertools
+import os
 import threading
+from concurrent.futures import Future
 
 import pushcollector
 
+from pubtools._pulp.scheduler import BoundedStarter
+
 from .base import Service
 
+# Max number of push items sent in a single collector update, when recording
+# push items in chunks.
+RECORD_CHUNK_SIZE = int(os.getenv("PUBTOOLS_PULP_RECORD_CHUNK_SIZE") or "2000")
+
+# Max number of collector updates in progress at once, when recording push
+# items in chunks.
+RECORD_IN_FLIGHT = int(os.getenv("PUBTOOLS_PULP_RECORD_IN_FLIGHT") or "4")
+
+
+class ChunkedUpdate(object):
+    # Records push items from an iterable onto a collector in chunks, with a
+    # bounded number of updates in progress at once.
+    #
+    # Nothing here blocks: the next chunk is taken from the iterable only once
+    # a previous update has completed, so that at most chunk_size * in_flight
+    # push items exist at any time (beyond what's held by the iterable).
+
+    def __init__(self, collector, push_items, chunk_size, in_flight):
+        self.collector = collector
+        self.push_items = iter(push_items)
+        self.chunk_size = max(chunk_size, 1)
+        self.result = Future()
+
+        self._lock = threading.Lock()
+        self._exhausted = False
+        self._starter = BoundedStarter(
+            self._lock,
+            self._take_chunk,
+            self._send,
+            concurrency=max(in_flight, 1),
+        )
+
+    def start(self):
+        self._starter.start_more()
+        return self.result
+
+    def _take_chunk(self):
+        # Must be called with lock held.
+        if self._exhausted or self.result.done():
+            return None
+
+        try:
+            chunk = list(itertools.islice(self.push_items, self.chunk_size))
+        except Exception as ex:  # pylint: disable=broad-except
+            self._exhausted = True
+            self.result.set_exception(ex)
+            return None
+
+        if not chunk:
+            self._exhausted = True
+            if not self._starter.running:
+                self.result.set_result(None)
+            return None
+
+        return chunk
+
+    def _send(self, chunk):
+        update_f = self.collector.update_push_items(chunk)
+        update_f.add_done_callback(self._on_update_done)
+
+    def _on_update_done(self, update_f):
+        with self._lock:
+            self._starter.finished()
+            if self.result.done():
+                return
+
+            exception = update_f.exception()
+            if exception:
+                self.result.set_exception(exception)
+                return
+
+            if self._exhausted and not self._starter.running:
+                self.result.set_result(None)
+                return
+
+        self._starter.start_more()
+
 
 class CollectorService(Service):
     """A service providing a pushcollector instance.
@@ -25,3 +107,16 @@ class CollectorService(Service):
             if not self.__instance:
                 self.__instance = pushcollector.Collector.get()
         return self.__instance
+
+    def update_push_items_chunked(self, push_items):
+        """Record push items from an iterable, which may be a generator.
+
+        Push items are sent to the collector in chunks of up to
+        ``PUBTOOLS_PULP_RECORD_CHUNK_SIZE`` items, with up to
+        ``PUBTOOLS_PULP_RECORD_IN_FLIGHT`` updates in progress at once.
+
+        Returns a Future resolved with None once all push items are recorded.
+        """
+        return ChunkedUpdate(
+            self.collector, push_items, RECORD_CHUNK_SIZE, RECORD_IN_FLIGHT
+        ).start()
@@ -0,0 +1,248 @@
+from collections import defaultdict
+
+from pubtools.pulplib import FakeController
+
+# The index relies on internals of the pulplib fake, since the fake provides
+# no extension point for searches.
+from pubtools.pulplib._impl.criteria import (
+    AndCriteria,
+    EqMatcher,
+    FieldMatchCriteria,
+    InMatcher,
+    OrCriteria,
+)
+from pubtools.pulplib._impl.fake.client import FakeClient
+from pubtools.pulplib._impl.fake.match import ABSENT, get_field
+
+# Unit fields commonly used in searches by push, delete and copy-repo.
+INDEXED_FIELDS = ("sha256sum", "filename", "id", "path")
+
+
+class UnitIndex(dict):
+    """A dict of units by unit key, as used by the pulplib fake, which also
+    keeps units indexed by the values of a few commonly searched fields.
+
+    The index is maintained as units are stored, so it's always consistent
+    with the dict contents.
+    """
+
+    def __init__(self, fields=INDEXED_FIELDS):
+        super(UnitIndex, self).__init__()
+
+        # field => value => set of unit keys
+        self.index = dict([(field, defaultdict(set)) for field in fields])
+
+        # field => set of unit keys whose value for that field can't be indexed,
+        # hence they must be considered for any search on that field.
+        self.unindexed = dict([(field, set()) for field in fields])
+
+        # Keys of units stored since the last call to take_changes, and IDs of
+        # units removed (or replaced by a unit with another ID) since then.
+        self.changed_keys = set()
+        self.removed_ids = set()
+
+    def __setitem__(self, key, unit):
+        if key in self:
+            old_unit = self[key]
+            self.__unindex(key, old_unit)
+            if old_unit.unit_id != unit.unit_id:
+                self.removed_ids.add(old_unit.unit_id)
+        super(UnitIndex, self).__setitem__(key, unit)
+        self.__index(key, unit)
+        self.changed_keys.add(key)
+
+    def __delitem__(self, key):
+        self.__unindex(key, self[key])
+        self.removed_ids.add(self[key].unit_id)
+        super(UnitIndex, self).__delitem__(key)
+
+    def pop(self, key, *args):
+        if key in self:
+            self.__unindex(key, self[key])
+            self.removed_ids.add(self[key].unit_id)
+        return super(UnitIndex, self).pop(key, *args)
+
+    def take_changes(self):
+        """Returns a list of units stored, and a set of IDs of units removed,
+        since the last call to this method.
+        """
+        units = [self[key] for key in self.changed_keys if key in self]
+        removed_ids = self.removed_ids - set([unit.unit_id for unit in units])
+
+        self.changed_keys = set()
+        self.removed_ids = set()
+
+        return (units, removed_ids)
+
+    def __index(self, key, unit):
+        for field, values in self.index.items():
+            value = self.__get_field(field, unit)
+            if value is ABSENT:
+                continue
+            try:
+                if isinstance(value, list):
+                    # A list may match on any element, so don't try to index it.
+                    raise TypeError()
+                values[value].add(key)
+            except TypeError:
+                self.unindexed[field].add(key)
+
+    def __unindex(self, key, unit):
+        for field, values in self.index.items():
+            self.unindexed[field].discard(key)
+
+            value = self.__get_field(field, unit)
+            try:
+                keys = values.get(value)
+            except TypeError:
+                continue
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del values[value]
+
+    @staticmethod
+    def __get_field(field, unit):
+        # Uses the same lookup as the fake's matching, so that the index agrees
+        # with the fake on the value of each field.
+        try:
+            return get_field(field, unit)
+        except Exception:  # pylint: disable=broad-except
+            # The fake can't match on this field for this unit. Such units
+            # will be considered unindexable, so that searches on the field
+            # behave the same as in the fake.
+            return []
+
+    def candidate_keys(self, criteria):
+        """Returns a set of keys of those units which may match 'criteria',
+        or None if the index can't narrow down the search.
+
+        The returned set may include units which don't match; the caller is
+        still expected to apply the criteria to each unit.
+        """
+        # pylint: disable=protected-access
+        if isinstance(criteria, FieldMatchCriteria):
+            field = criteria._field
+            matcher = criteria._matcher
+            if field not in self.index:
+                return None
+
+            if isinstance(matcher, EqMatcher):
+                values = [matcher._value]
+            elif isinstance(matcher, InMatcher):
+                values = matcher._values
+            else:
+                return None
+
+            out = set(self.unindexed[field])
+            for value in values:
+                try:
+                    out.update(self.index[field].get(value) or ())
+                except TypeError:
+                    return None
+            return out
+
+        if isinstance(criteria, AndCriteria):
+            out = None
+            for operand in criteria._operands:
+                keys = self.candidate_keys(operand)
+                if keys is not None:
+                    out = keys if out is None else (out & keys)
+            return out
+
+        if isinstance(criteria, OrCriteria) and criteria._operands:
+            out = set()
+            for operand in criteria._operands:
+                keys = self.candidate_keys(operand)
+                if keys is None:
+                    return None
+                out.update(keys)
+            return out
+
+        return None
+
+
+class CandidateState(object):
+    # A view onto a fake state in which only the candidate units for a search
+    # are visible. Everything else is delegated to the real state.
+    def __init__(self, state, keys):
+        self._state = state
+        self._keys = keys
+
+    def __getattr__(self, name):
+        return getattr(self._state, name)
+
+    @property
+    def all_units(self):
+        with self._state.lock:
+            units_by_key = self._state.units_by_key
+            return [units_by_key[key] for key in self._keys if key in units_by_key]
+
+    def repo_units(self, repo_id):
+        # As in FakeState, the caller must hold the lock.
+        assert self._state.lock.locked()
+
+        units_by_key = self._state.units_by_key
+        repo_keys = self._state.repo_unit_keys.get(repo_id) or set()
+        return [units_by_key[key] for key in repo_keys & self._keys]
+
+
+class IndexedFakeClient(FakeClient):
+    # A fake client which uses the index from the state (if any) to search
+    # only the units which may match the search criteria, rather than scanning
+    # all units. Results are the same as with the plain fake client.
+
+    def _candidate_client(self, criteria):
+        # Returns a client searching only the candidate units for 'criteria',
+        # or None if the index can't be used for this search.
+        index = self._state.units_by_key
+        if not criteria or not isinstance(index, UnitIndex):
+            return None
+
+        with self._state.lock:
+            keys = index.candidate_keys(criteria)
+
+        if keys is None:
+            return None
+
+        return FakeClient(CandidateState(self._state, keys))
+
+    def search_content(self, criteria=None):
+        self._ensure_alive()
+
+        client = self._candidate_client(criteria)
+        if client is None:
+            return super(IndexedFakeClient, self).search_content(criteria)
+        return client.search_content(criteria)
+
+    def _search_repo_units(self, repo_id, criteria):
+        client = self._candidate_client(criteria)
+        if client is None:
+            return super(IndexedFakeClient, self)._search_repo_units(repo_id, criteria)
+        return client._search_repo_units(  # pylint: disable=protected-access
+            repo_id, criteria
+        )
+
+
+class IndexedFakeController(FakeController):
+    """A pulplib fake controller whose clients use an index to answer common
+    content searches without scanning all units.
+    """
+
+    def __init__(self):
+        super(IndexedFakeController, self).__init__()
+
+        # Swap in the indexed dict before any units are stored.
+        self._state.units_by_key = UnitIndex()
+
+    def new_client(self):
+        return IndexedFakeClient(self._state)
+
+    def take_unit_changes(self):
+        """Returns a list of units stored, and a set of IDs of units removed,
+        since the last call to this method.
+
+        This allows changes to be persisted without serializing every unit.
+        """
+        with self._state.lock:
+            return self._state.units_by_key.take_changes()
@@ -0,0 +1,65 @@
+import attr
+import yaml
+
+
+@attr.s(frozen=True)
+class SimulationProfile(object):
+    """Parameters controlling the simulated behavior of the fake Pulp.
+
+    All latencies are in seconds; failure rates are probabilities in the
+    range 0 to 1.
+    """
+
+    workers = attr.ib(default=4)
+    """Number of Pulp workers, i.e. max number of tasks running at once."""
+
+    max_queued_tasks = attr.ib(default=200)
+    """Max number of tasks which may be queued or running at once; further
+    tasks are held back by the client."""
+
+    search_workers = attr.ib(default=10)
+    """Max number of searches handled at once."""
+
+    import_latency = attr.ib(default=0.5)
+    copy_latency = attr.ib(default=0.5)
+    publish_latency = attr.ib(default=2.0)
+    remove_latency = attr.ib(default=0.5)
+
+    search_latency = attr.ib(default=0.05)
+    """Base latency of every search."""
+
+    search_latency_per_term = attr.ib(default=0.0005)
+    """Additional search latency for each value matched by search criteria."""
+
+    import_failure_rate = attr.ib(default=0.0)
+    copy_failure_rate = attr.ib(default=0.0)
+    publish_failure_rate = attr.ib(default=0.0)
+    remove_failure_rate = attr.ib(default=0.0)
+    search_failure_rate = attr.ib(default=0.0)
+
+    seed = attr.ib(default=None)
+    """Seed for simulated failures; set for reproducible runs."""
+
+    @classmethod
+    def load(cls, path):
+        """Load a profile from a YAML file at 'path', or return the default
+        profile if 'path' is "default".
+
+        The file should contain a mapping of profile attributes; any attributes
+        not included use their default values.
+        """
+        if path == "default":
+            return cls()
+
+        with open(path, "rt") as f:  # pylint:disable=unspecified-encoding
+            raw = yaml.load(f, Loader=yaml.SafeLoader) or {}
+
+        known = [field.name for field in attr.fields(cls)]
+        unknown = sorted(set(raw.keys()) - set(known))
+        if unknown:
+            raise ValueError(
+                "Unknown field(s) in fake Pulp profile %s: %s"
+                % (path, ", ".join(unknown))
+            )
+
+        return cls(**raw)
@@ -1,3 +1,5 @@
+import datetime
+import json
 import os
 import logging
 
@@ -8,10 +10,41 @@ from frozenlist2 import frozenlist
 from pubtools.pluggy import pm, hookimpl
 
 from pubtools import pulplib
-from pubtools.pulplib import FakeController, FileRepository, YumRepository
+from pubtools.pulplib import FileRepository, YumRepository
 
 LOG = logging.getLogger("pubtools-pulp")
 
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f%z"
+DATETIME_FORMAT_NAIVE = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+def new_controller(profile=None):
+    """Create and return a new fake controller, with unit searches indexed.
+
+    If 'profile' is given, the fake also simulates the latency, repo locking
+    and task queueing of a real Pulp server.
+
+    The index and simulation extend private parts of pulplib's fake. They are
+    only imported here, so that an incompatible version of pulplib can't break
+    anything other than the fake; in that case, the plain fake is used instead.
+    """
+    try:
+        # pylint:disable=import-outside-toplevel
+        from .fakeindex import IndexedFakeController
+        from .fakesim import SimulatedFakeController
+
+        if profile:
+            return SimulatedFakeController(profile)
+        return IndexedFakeController()
+    except (ImportError, AttributeError):
+        LOG.warning(
+            "Fake Pulp extensions unsupported by this version of pulplib, "
+            "using plain fake%s",
+            " without simulation" if profile else "",
+            exc_info=True,
+        )
+        return pulplib.FakeController()
+
 
 def default_value_match(obj, field, field_value):
     if not field:
@@ -115,13 +148,62 @@ def yaml_dumper(*args, **kwargs):
     return out
 
 
+def json_default(value):
+    # JSON encoder fallback for types not natively supported by JSON.
+    if isinstance(value, datetime.datetime):
+        return {"_datetime": value.strftime(DATETIME_FORMAT)}
+    raise TypeError("Can't serialize %r" % (value,))  # pragma: no cover
+
+
+def json_object_hook(value):
+    # Inverse of json_default.
+    if list(value.keys()) == ["_datetime"]:
+        raw = value["_datetime"]
+        try:
+            return datetime.datetime.strptime(raw, DATETIME_FORMAT)
+        except ValueError:
+            return datetime.datetime.strptime(raw, DATETIME_FORMAT_NAIVE)
+    return value
+
+
+def json_dumps(value):
+    return json.dumps(value, sort_keys=True, default=json_default)
+
+
 class PersistentFake(object):
-    """Wraps pulplib fake client adding persistence of state."""
+    """Wraps pulplib fake client adding persistence of state.
+
+    The format of persisted state depends on the extension of 'state_path':
+
+    - ".yaml": the entire state is written as a single YAML document at the end
+      of each task. This is convenient to view and edit by hand, but slow for
+      large amounts of state.
+
+    - ".jsonl": state is written as JSON lines, one line per repo or unit.
+      At the end of each task, only those repos and units which have changed
+      are appended, with later lines taking precedence over earlier lines. The
+      file is compacted once it holds more outdated lines than current lines.
+      Use export_yaml to obtain a human-readable copy of this state.
+    """
 
-    def __init__(self, state_path):
-        self.ctrl = FakeController()
+    def __init__(self, state_path, legacy_state_path=None, profile=None):
+        self.ctrl = new_controller(profile)
         self.state_path = state_path
 
+        # If set, state will be loaded from here in the case that nothing
+        # exists yet at state_path.
+        self.legacy_state_path = legacy_state_path
+
+        # For JSON lines format: serialized form of each repo/unit as last
+        # loaded or saved, keyed by (kind, id), and total number of lines in
+        # the state file.
+        self._persisted = {}
+        self._persisted_lines = 0
+
+        # Repos as last loaded or saved, by ID. Repos are immutable, so a repo
+        # has changed only if it's no longer the same object.
+        self._persisted_repos = {}
+
         # Register ourselves with pubtools so we can get the task stop hook,
         # at which point we will save our current state.
         pm.register(self)
@@ -142,6 +224,10 @@ class PersistentFake(object):
         self.ctrl.insert_repository(YumRepository(id="all-erratum-content-2019"))
         self.ctrl.insert_repository(YumRepository(id="all-erratum-content-2020"))
 
+    @property
+    def is_jsonl(self):
+        return self.state_path.endswith(".jsonl")
+
     def load(self):
         """Load data into the fake from previously serialized state (if any).
 
@@ -149,65 +235,254 @@ class PersistentFake(object):
         to seed the fake with some hardcoded state.
         """
 
-        if not os.path.exists(self.state_path):
+        if os.path.exists(self.state_path):
+            path = self.state_path
+        elif self.legacy_state_path and os.path.exists(self.legacy_state_path):
+            path = self.legacy_state_path
+        else:
             return self.load_initial()
 
-        with open(self.state_path, "rt") as f:  # pylint:disable=unspecified-encoding
+        if path.endswith(".jsonl"):
+            (repos, units) = self.read_jsonl(path)
+        else:
+            (repos, units) = self.read_yaml(path)
+
+        self.insert_state(repos, units)
+
+        if path == self.state_path and self.is_jsonl:
+            # Everything just loaded is already persisted.
+            self._persisted_repos = self.repos_by_id()
+            self.take_unit_changes()
+
+    def read_yaml(self, path):
+        with open(path, "rt") as f:  # pylint:disable=unspecified-encoding
             raw = yaml.load(f, Loader=yaml.SafeLoader)
 
-        repos = raw.get("repos") or []
-        for repo in deserialize(repos):
+        repos = deserialize(raw.get("repos") or [])
+        units = deserialize(raw.get("units") or [])
+        return (repos, units)
+
+    def read_jsonl(self, path):
+        current = {}
+        lines = 0
+
+        with open(path, "rt") as f:  # pylint:disable=unspecified-encoding
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                lines += 1
+                record = json.loads(line, object_hook=json_object_hook)
+                key = (record["kind"], record["id"])
+                if record.get("deleted"):
+                    current.pop(key, None)
+                else:
+                    current[key] = (line, record["data"])
+
+        if path == self.state_path:
+            self._persisted = dict(
+                [(key, line) for (key, (line, _)) in current.items()]
+            )
+            self._persisted_lines = lines
+
+        repos = []
+        units = []
+        for (kind, _), (_, data) in sorted(current.items()):
+            (repos if kind == "repo" else units).append(deserialize(data))
+
+        return (repos, units)
+
+    def insert_state(self, repos, units):
+        for repo in repos:
             self.ctrl.insert_repository(repo)
 
-        units = raw.get("units") or []
-        for unit in deserialize(units):
+        # Units are grouped by repo so they can be inserted with a single
+        # call per repo, rather than a call per unit per repo.
+        repos_by_id = dict([(repo.id, repo) for repo in self.ctrl.repositories])
+        units_by_repo_id = {}
+        for unit in units:
             for repo_id in unit.repository_memberships:
-                repo = self.ctrl.client.get_repository(repo_id).result()
-                self.ctrl.insert_units(repo, [unit])
+                units_by_repo_id.setdefault(repo_id, []).append(unit)
+
+        for repo_id, repo_units in units_by_repo_id.items():
+            repo = repos_by_id.get(repo_id)
+            if repo is None:
+                # Same error as the fake client would raise for a missing repo.
+                self.ctrl.client.get_repository(repo_id).result()
+            self.ctrl.insert_units(repo, repo_units)
 
     def save(self):
         """Serialize the current state of the fake and save it to persistent storage."""
 
-        serialized = {}
-
-        serialized["repos"] = serialize(self.ctrl.repositories)
-        serialized["repos"].sort(key=lambda repo: repo["id"])
-
-        all_units = list(self.ctrl.client.search_content())
-        serialized["units"] = serialize(all_units)
-
-        # This sort key is a bit expensive since it means we essentially do yaml dump
-        # twice. On the plus side it ensures a stable order across py2 and py3.
-        serialized["units"].sort(key=lambda x: yaml.dump(x, Dumper=yaml_dumper))
-
         path = self.state_path
 
         state_dir = os.path.dirname(path)
         if not os.path.isdir(state_dir):
             os.makedirs(state_dir)
 
-        with open(path, "wt") as f:  # pylint:disable=unspecified-encoding
-            yaml.dump(serialized, f, Dumper=yaml_dumper)
+        if self.is_jsonl:
+            self.save_jsonl()
+        else:
+            self.export_yaml(path)
 
         LOG.info("Fake pulp state persisted to %s", path)
 
+    def export_yaml(self, path):
+        """Write the current state of the fake to 'path' in YAML format."""
+
+        repos = serialize(self.ctrl.repositories)
+        repos.sort(key=lambda repo: repo["id"])
+
+        # Each unit is dumped once and the dumped units are sorted, which ensures
+        # a stable order across py2 and py3. The result is the same as dumping
+        # all units at once in that order.
+        units = sorted(
+            [
+                yaml.dump([serialize(unit)], Dumper=yaml_dumper)
+                for unit in self.ctrl.client.search_content()
+            ]
+        )
+
+        with open(path, "wt") as f:  # pylint:disable=unspecified-encoding
+            yaml.dump({"repos": repos}, f, Dumper=yaml_dumper)
+            if units:
+                f.write("units:\n")
+                f.writelines(units)
+            else:
+                f.write("units: []\n")
+
+    def repos_by_id(self):
+        return dict([(repo.id, repo) for repo in self.ctrl.repositories])
+
+    def take_unit_changes(self):
+        # Returns units changed and IDs of units removed since the last call,
+        # or None if the fake doesn't keep track of changes.
+        take_changes = getattr(self.ctrl, "take_unit_changes", None)
+        return take_changes() if take_changes else None
+
+    def changed_state_lines(self):
+        # Returns JSON lines for repos and units which may have changed since
+        # state was last loaded or saved, keyed by (kind, id), and the set of
+        # keys for repos and units which no longer exist.
+        changed = {}
+        deleted = set()
+
+        repos = self.repos_by_id()
+        for repo_id, repo in repos.items():
+            if self._persisted_repos.get(repo_id) is not repo:
+                changed[("repo", repo_id)] = json_dumps(
+                    {"kind": "repo", "id": repo_id, "data": serialize(repo)}
+                )
+        deleted.update(
+            [
+                ("repo", repo_id)
+                for repo_id in self._persisted_repos
+                if repo_id not in repos
+            ]
+        )
+        self._persisted_repos = repos
+
+        unit_changes = self.take_unit_changes()
+        if unit_changes is not None:
+            (units, removed_ids) = unit_changes
+            deleted.update([("unit", unit_id) for unit_id in removed_ids])
+        else:
+            # Without tracking of changes, every unit must be checked.
+            units = list(self.ctrl.client.search_content())
+            unit_ids = set([unit.unit_id for unit in units])
+            deleted.update(
+                [
+                    key
+                    for key in self._persisted
+                    if key[0] == "unit" and key[1] not in unit_ids
+                ]
+            )
+
+        for unit in units:
+            # The fake assigns unit_id to every unit, so that's used as a key.
+            changed[("unit", unit.unit_id)] = json_dumps(
+                {"kind": "unit", "id": unit.unit_id, "data": serialize(unit)}
+            )
+
+        return (changed, deleted)
+
+    def save_jsonl(self):
+        (changed, deleted) = self.changed_state_lines()
+        current = self._persisted
+
+        appended = [
+            line for (key, line) in sorted(changed.items()) if current.get(key) != line
+        ]
+        current.update(changed)
+
+        deleted = sorted([key for key in deleted if key in current])
+        for key in deleted:
+            del current[key]
+            appended.append(json_dumps({"kind": key[0], "id": key[1], "deleted": True}))
+
+        total_lines = self._persisted_lines + len(appended)
+        compact = (
+            not os.path.exists(self.state_path) or total_lines > 2 * len(current) + 100
+        )
+
+        if compact:
+            # Write everything from scratch.
+            lines = [line for (_, line) in sorted(current.items())]
+            tmp_path = self.state_path + ".tmp"
+            with open(tmp_path, "wt") as f:  # pylint:disable=unspecified-encoding
+                for line in lines:
+                    f.write(line + "\n")
+            os.rename(tmp_path, self.state_path)
+            total_lines = len(lines)
+        elif appended:
+            with open(
+                self.state_path, "at"
+            ) as f:  # pylint:disable=unspecified-encoding
+                for line in appended:
+                    f.write(line + "\n")
+
+        LOG.debug(
+            "Fake pulp state: %s line(s) appended, compacted: %s",
+            len(appended),
+            compact,
+        )
+
+        self._persisted_lines = total_lines
+
     @hookimpl
     def task_stop(self, failed):  # pylint:disable=unused-argument
         """Called when a task is ending."""
         pm.unregister(self)
+
         self.save()
 
+        simulation = getattr(self.ctrl, "simulation", None)
+        if simulation:
+            simulation.log_stats()
+            simulation.shutdown()
 
-def new_fake_controller(state_path=None):
+
+def new_fake_controller(state_path=None, profile=None):
     """Create and return a new fake Pulp controller.
 
     On top of the fake built in to pulplib library, this adds persistent state
     stored under ~/.config/pubtools-pulp by default.
 
-    The state is persisted in a somewhat human-accessible form; the idea is that
-    you can manually view and edit the YAML to see how the commands behave.
+    The state is persisted in JSON lines format by default, which can be converted
+    to YAML for manual viewing via PersistentFake.export_yaml. If 'state_path' ends
+    with ".yaml", the state is instead persisted directly in YAML, so you can
+    manually view and edit it to see how the commands behave.
+
+    If 'profile' is provided, it should be a SimulationProfile controlling the
+    simulation of a real Pulp server's latency, repo locking and task queueing.
     """
-    state_path = state_path or os.path.expanduser("~/.config/pubtools-pulp/fake.yaml")
-    fake = PersistentFake(state_path)
+    legacy_state_path = None
+    if not state_path:
+        state_path = os.path.expanduser("~/.config/pubtools-pulp/fake.jsonl")
+        # State may have been persisted in YAML by earlier versions.
+        legacy_state_path = os.path.expanduser("~/.config/pubtools-pulp/fake.yaml")
+    fake = PersistentFake(
+        state_path, legacy_state_path=legacy_state_path, profile=profile
+    )
     fake.load()
     return fake.ctrl
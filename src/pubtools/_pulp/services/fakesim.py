@@ -0,0 +1,255 @@
+import logging
+import random
+import threading
+import time
+
+from more_executors import Executors
+from more_executors.futures import f_proxy
+from pubtools.pulplib import PulpException, Task, TaskFailedException
+
+from pubtools.pulplib._impl.criteria import (
+    AndCriteria,
+    FieldMatchCriteria,
+    InMatcher,
+    OrCriteria,
+)
+
+from .fakeindex import IndexedFakeClient, IndexedFakeController
+from .fakeprofile import SimulationProfile  # pylint:disable=unused-import
+
+LOG = logging.getLogger("pubtools-pulp")
+
+# Kinds of Pulp tasks which are simulated.
+TASK_KINDS = ("import", "copy", "publish", "remove")
+
+
+def criteria_width(criteria):
+    """Returns the number of values matched by 'criteria', as a rough measure
+    of the cost of a search.
+    """
+    # pylint: disable=protected-access
+    if isinstance(criteria, FieldMatchCriteria):
+        if isinstance(criteria._matcher, InMatcher):
+            return max(len(criteria._matcher._values), 1)
+        return 1
+
+    if isinstance(criteria, (AndCriteria, OrCriteria)):
+        return sum([criteria_width(operand) for operand in criteria._operands])
+
+    return 1
+
+
+class Simulation(object):
+    """Simulates the latency, repo locking and task queueing of a real Pulp
+    server, according to a profile.
+
+    - Tasks operating on a repo hold an exclusive lock on that repo while
+      queued and running, as in Pulp.
+    - At most 'workers' tasks run at once; other tasks wait for a worker.
+    - Searches take longer as the width of their criteria grows.
+    - Tasks and searches may fail at random.
+    """
+
+    def __init__(self, profile):
+        self.profile = profile
+
+        self._lock = threading.Lock()
+        self._random = random.Random(profile.seed)
+        self._repo_locks = {}
+        self._workers = threading.BoundedSemaphore(max(profile.workers, 1))
+        self._task_executor = Executors.thread_pool(
+            name="pubtools-pulp-fake-tasks", max_workers=profile.max_queued_tasks
+        )
+        self._search_executor = Executors.thread_pool(
+            name="pubtools-pulp-fake-search", max_workers=profile.search_workers
+        )
+
+        # Stats
+        self.task_count = dict([(kind, 0) for kind in TASK_KINDS])
+        self.search_count = 0
+        self.failure_count = 0
+        self.lock_wait = 0.0
+        self.worker_wait = 0.0
+
+    def repo_lock(self, repo_id):
+        with self._lock:
+            return self._repo_locks.setdefault(repo_id, threading.Lock())
+
+    def should_fail(self, rate):
+        if not rate:
+            return False
+        with self._lock:
+            failed = self._random.random() < rate
+            if failed:
+                self.failure_count += 1
+            return failed
+
+    def submit_task(self, kind, repo_id, fn):
+        """Submit a Pulp task of the given kind, which operates on the given repo.
+
+        'fn' is called to perform the task once the simulated task has been
+        scheduled and run; it must return a Future.
+
+        Returns a Future for the task's result.
+        """
+        return f_proxy(self._task_executor.submit(self._run_task, kind, repo_id, fn))
+
+    def _run_task(self, kind, repo_id, fn):
+        with self._lock:
+            self.task_count[kind] += 1
+
+        start = time.time()
+        with self.repo_lock(repo_id):
+            locked = time.time()
+            with self._workers:
+                running = time.time()
+
+                with self._lock:
+                    self.lock_wait += locked - start
+                    self.worker_wait += running - locked
+
+                time.sleep(getattr(self.profile, kind + "_latency"))
+
+                if self.should_fail(getattr(self.profile, kind + "_failure_rate")):
+                    raise TaskFailedException(
+                        Task(
+                            id="simulated-%s-failure" % kind,
+                            completed=True,
+                            succeeded=False,
+                            error_summary="Simulated %s failure on %s"
+                            % (kind, repo_id),
+                            error_details="Simulated %s failure on %s"
+                            % (kind, repo_id),
+                        )
+                    )
+
+                return fn().result()
+
+    def submit_search(self, criteria, fn):
+        """Submit a search using 'criteria'.
+
+        'fn' is called to perform the search after the simulated latency;
+        it must return a Future.
+
+        Returns a Future for the search's result.
+        """
+        return f_proxy(self._search_executor.submit(self._run_search, criteria, fn))
+
+    def _run_search(self, criteria, fn):
+        with self._lock:
+            self.search_count += 1
+
+        width = criteria_width(criteria) if criteria else 1
+        time.sleep(
+            self.profile.search_latency + self.profile.search_latency_per_term * width
+        )
+
+        if self.should_fail(self.profile.search_failure_rate):
+            raise PulpException("Simulated search failure")
+
+        return fn().result()
+
+    def shutdown(self):
+        """Shut down threads used by the simulation.
+
+        Operations through the fake are not possible after shutdown.
+        """
+        self._task_executor.shutdown(wait=True)
+        self._search_executor.shutdown(wait=True)
+
+    def log_stats(self):
+        LOG.info(
+            "Fake Pulp simulation: %s task(s) (%s), %s search(es), %s failure(s)",
+            sum(self.task_count.values()),
+            ", ".join(
+                ["%s %s" % (count, kind) for (kind, count) in self.task_count.items()]
+            ),
+            self.search_count,
+            self.failure_count,
+        )
+        LOG.info(
+            "Fake Pulp simulation: %.1fs waiting for repo locks, %.1fs waiting for workers",
+            self.lock_wait,
+            self.worker_wait,
+        )
+
+
+class SimulatedFakeClient(IndexedFakeClient):
+    # A fake client where operations are subject to a Simulation.
+
+    def __init__(self, state, simulation):
+        super(SimulatedFakeClient, self).__init__(state)
+        self._simulation = simulation
+
+    def search_repository(self, criteria=None):
+        self._ensure_alive()
+        return self._simulation.submit_search(
+            criteria,
+            lambda: super(SimulatedFakeClient, self).search_repository(criteria),
+        )
+
+    def search_content(self, criteria=None):
+        self._ensure_alive()
+        return self._simulation.submit_search(
+            criteria,
+            lambda: super(SimulatedFakeClient, self).search_content(criteria),
+        )
+
+    def _search_repo_units(self, repo_id, criteria):
+        return self._simulation.submit_search(
+            criteria,
+            lambda: super(SimulatedFakeClient, self)._search_repo_units(
+                repo_id, criteria
+            ),
+        )
+
+    def copy_content(self, from_repository, to_repository, *args, **kwargs):
+        self._ensure_alive()
+        return self._simulation.submit_task(
+            "copy",
+            to_repository.id,
+            lambda: super(SimulatedFakeClient, self).copy_content(
+                from_repository, to_repository, *args, **kwargs
+            ),
+        )
+
+    def _do_import(self, repo_id, *args, **kwargs):
+        return self._simulation.submit_task(
+            "import",
+            repo_id,
+            lambda: super(SimulatedFakeClient, self)._do_import(
+                repo_id, *args, **kwargs
+            ),
+        )
+
+    def _do_unassociate(self, repo_id, *args, **kwargs):
+        return self._simulation.submit_task(
+            "remove",
+            repo_id,
+            lambda: super(SimulatedFakeClient, self)._do_unassociate(
+                repo_id, *args, **kwargs
+            ),
+        )
+
+    def _publish_repository(self, repo, distributors_with_config):
+        return self._simulation.submit_task(
+            "publish",
+            repo.id,
+            lambda: super(SimulatedFakeClient, self)._publish_repository(
+                repo, distributors_with_config
+            ),
+        )
+
+
+class SimulatedFakeController(IndexedFakeController):
+    """A pulplib fake controller whose clients simulate the latency, repo
+    locking and task queueing of a real Pulp server.
+    """
+
+    def __init__(self, profile):
+        # Must be set up before the parent creates a client.
+        self.simulation = Simulation(profile)
+        super(SimulatedFakeController, self).__init__()
+
+    def new_client(self):
+        return SimulatedFakeClient(self._state, self.simulation)
@@ -9,6 +9,7 @@ from pubtools.pluggy import pm
 
 from .base import Service
 from .fakepulp import new_fake_controller
+from .fakeprofile import SimulationProfile
 
 LOG = logging.getLogger("pubtools.pulp")
 
@@ -78,6 +79,15 @@ class PulpClientService(Service):
             ),
             action="store_true",
         )
+        group.add_argument(
+            "--pulp-fake-profile",
+            help=(
+                "With --pulp-fake, simulate the latency, repo locking and task "
+                + "queueing of a real Pulp server. Either 'default' or the path "
+                + "of a YAML file overriding default simulation parameters."
+            ),
+            default=None,
+        )
 
     @property
     def pulp_client(self):
@@ -93,7 +103,12 @@ class PulpClientService(Service):
         """A Pulp fake controller used during task, instantiated on demand."""
         with self.__lock:
             if not self.__fake_controller:
-                self.__fake_controller = new_fake_controller()
+                profile = None
+                if self._service_args.pulp_fake_profile:
+                    profile = SimulationProfile.load(
+                        self._service_args.pulp_fake_profile
+                    )
+                self.__fake_controller = new_fake_controller(profile=profile)
         return self.__fake_controller
 
     def new_pulp_client(self, **kwargs):
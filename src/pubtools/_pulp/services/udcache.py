@@ -1,6 +1,7 @@
 import threading
 
 from pubtools._pulp.ud import UdCacheClient
+from pubtools._pulp.ud_async import AsyncUdCacheClient
 from pubtools._pulp.arguments import from_environ
 
 from .base import Service
@@ -52,6 +53,14 @@ class UdCacheClientService(Service):
             default="",
             type=from_environ("UDCACHE_KEY"),
         )
+        group.add_argument(
+            "--udcache-async",
+            help=(
+                "Use an asyncio-based client for UD cache flush, allowing many "
+                "concurrent flushes (requires the udcache-async extra)"
+            ),
+            action="store_true",
+        )
 
     @property
     def udcache_client(self):
@@ -88,7 +97,11 @@ class UdCacheClientService(Service):
         else:
             kwargs["auth"] = auth
 
-        return UdCacheClient(
+        client_class = UdCacheClient
+        if args.udcache_async:
+            client_class = AsyncUdCacheClient
+
+        return client_class(
             args.udcache_url,
             **kwargs,
         )
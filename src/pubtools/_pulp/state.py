@@ -0,0 +1,78 @@
+import json
+import logging
+import os
+import threading
+
+LOG = logging.getLogger("pubtools.pulp")
+
+
+class StateFile(object):
+    """Base class for progress of a task persisted to a JSON file between runs.
+
+    This allows an interrupted run to resume without repeating work already
+    completed. If constructed without a path, nothing is persisted.
+
+    Subclasses implement :meth:`load` and :meth:`dump` to convert their state
+    from and to JSON-compatible data, and should hold :attr:`lock` while
+    updating state and calling :meth:`save`.
+    """
+
+    def __init__(self, path=None, request=None):
+        """Create a new state and load it from 'path', if the file exists.
+
+        Arguments:
+            path (str)
+                Path of the JSON file used to persist state.
+            request (object)
+                JSON-compatible description of what was requested from the
+                task, such as repo IDs or filters. State saved by a run with
+                a different request is ignored.
+        """
+        self.path = path
+        self.request = request
+        self.lock = threading.Lock()
+
+    def load_file(self):
+        """Load state from the file, if any, by passing its content to
+        :meth:`load`. Must be called by subclasses once initialized.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        with open(self.path, "rt") as f:  # pylint:disable=unspecified-encoding
+            raw = json.load(f)
+
+        if raw.get("request") != self.request:
+            LOG.warning(
+                "Ignoring progress in %s, which was for a different request",
+                self.path,
+            )
+            return
+
+        self.load(raw)
+
+    def load(self, raw):
+        """Restore state from data previously returned by :meth:`dump`."""
+        raise NotImplementedError()  # pragma: no cover
+
+    def dump(self):
+        """Returns the current state as a JSON-compatible dict."""
+        raise NotImplementedError()  # pragma: no cover
+
+    def save(self):
+        """Save the current state, if a path was provided."""
+        if not self.path:
+            return
+
+        raw = self.dump()
+        raw["request"] = self.request
+
+        state_dir = os.path.dirname(self.path)
+        if state_dir and not os.path.isdir(state_dir):
+            os.makedirs(state_dir)
+
+        # Write and rename so state isn't lost if we're interrupted here.
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wt") as f:  # pylint:disable=unspecified-encoding
+            json.dump(raw, f, indent=2, sort_keys=True)
+        os.rename(tmp_path, self.path)
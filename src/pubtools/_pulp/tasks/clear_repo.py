@@ -1,12 +1,21 @@
 import logging
+import threading
+from concurrent.futures import Future
 from functools import partial
 
+try:
+    from time import monotonic
+except ImportError:  # pragma: no cover
+    from monotonic import monotonic
+
 import attr
-from more_executors.futures import f_map, f_sequence
-from pubtools.pulplib import ContainerImageRepository, Criteria
+from more_executors.futures import f_flat_map, f_map, f_return, f_sequence
+from pubtools.pulplib import ContainerImageRepository, Criteria, Matcher
 
 from pubtools._pulp.arguments import SplitAndExtend
+from pubtools._pulp.scheduler import BoundedStarter
 from pubtools._pulp.services import CollectorService, PulpClientService
+from pubtools._pulp.state import StateFile
 from pubtools._pulp.task import PulpTask
 from pubtools._pulp.tasks.common import PulpRepositoryOperation
 
@@ -34,6 +43,249 @@ class ClearedRepo(object):
     """The repo which was cleared."""
 
 
+class ClearState(StateFile):
+    """Progress of clearing repos in batches, persisted between runs.
+
+    Repos already cleared are not searched again, and counts of batches and
+    units continue from where they stopped for the others. Progress is only
+    resumed when clearing the same repos and content types as the interrupted
+    run.
+    """
+
+    def __init__(self, path=None, repo_ids=None, content_type=None):
+        super(ClearState, self).__init__(
+            path,
+            request={
+                "repo": sorted(repo_ids or []),
+                "content_type": sorted(content_type) if content_type else None,
+            },
+        )
+
+        # repo ID => {"batches": <int>, "removed": <int>, "done": <bool>}
+        self.repos = {}
+
+        self.load_file()
+
+    def load(self, raw):
+        self.repos = raw.get("repos") or {}
+
+    def dump(self):
+        return {"repos": self.repos}
+
+    def repo(self, repo_id):
+        """Returns the progress of clearing a repo."""
+        with self.lock:
+            return dict(
+                self.repos.get(repo_id) or {"batches": 0, "removed": 0, "done": False}
+            )
+
+    def batch_done(self, repo_id, removed):
+        """Record that a batch of 'removed' units was removed from a repo."""
+        with self.lock:
+            progress = self.repos.setdefault(
+                repo_id, {"batches": 0, "removed": 0, "done": False}
+            )
+            progress["batches"] += 1
+            progress["removed"] += removed
+            self.save()
+
+    def repo_done(self, repo_id):
+        """Record that a repo has been fully cleared."""
+        with self.lock:
+            progress = self.repos.setdefault(
+                repo_id, {"batches": 0, "removed": 0, "done": False}
+            )
+            progress["done"] = True
+            self.save()
+
+    def all_done(self):
+        """Record that all repos have been cleared, so the next run doesn't
+        resume this one.
+        """
+        with self.lock:
+            self.repos = {}
+            self.save()
+
+
+def take_units(page_f, count, units=None):
+    # Given a future for a page of search results, returns a future for a list
+    # of up to 'count' units, fetching only as many pages as needed.
+    def handle_page(page):
+        out = (units or []) + page.data
+        if len(out) >= count or not page.next:
+            return f_return(out[:count])
+        return take_units(page.next, count, out)
+
+    return f_flat_map(page_f, handle_page)
+
+
+class BatchedClear(object):
+    # Removes content from a repo in batches of up to batch_size units, one
+    # batch at a time, recording progress onto a ClearState.
+    #
+    # Push items for each batch are recorded via 'record', a callable accepting
+    # the batch's tasks and returning a Future, before the batch is counted as
+    # done. Hence, items removed by an interrupted run are never left
+    # unrecorded once progress is resumed.
+    #
+    # Each batch is removed by a separate Pulp task, found by a fresh search of
+    # the repo once the previous batch has been removed. This means the repo is
+    # never locked for long at a time, tasks on other repos may run in between
+    # batches, and if interrupted, only the batch in progress is lost.
+    #
+    # Nothing here blocks. Batches are started via a BoundedStarter, so that
+    # searches and removals completing immediately don't cause recursion.
+
+    def __init__(self, repo, criteria, batch_size, state, record):
+        self.repo = repo
+        self.criteria = criteria
+        self.batch_size = batch_size
+        self.state = state
+        self.record = record
+        self.result = Future()
+
+        self._tasks = []
+        self._removed = 0
+        self._progress = state.repo(repo.id)
+        self._start_time = None
+
+        self._lock = threading.Lock()
+        self._wanted = False
+        self._starter = BoundedStarter(
+            self._lock, self._take_next, self._start_batch, concurrency=1
+        )
+
+    def start(self):
+        progress = self._progress
+        repo_id = self.repo.id
+
+        if progress["done"]:
+            LOG.info(
+                "%s: already cleared by a previous run, %s unit(s) in %s batch(es)",
+                repo_id,
+                progress["removed"],
+                progress["batches"],
+            )
+            self.result.set_result([])
+            return self.result
+
+        if progress["batches"]:
+            LOG.info(
+                "%s: resuming from batch %s, %s unit(s) already removed",
+                repo_id,
+                progress["batches"] + 1,
+                progress["removed"],
+            )
+
+        self._start_time = monotonic()
+        self._next()
+        return self.result
+
+    def _next(self):
+        with self._lock:
+            self._wanted = True
+        self._starter.start_more()
+
+    def _take_next(self):
+        # Must be called with lock held.
+        if not self._wanted:
+            return None
+        self._wanted = False
+        return True
+
+    def _start_batch(self, _):
+        units_f = take_units(self.repo.search_content(self.criteria), self.batch_size)
+        remove_f = f_flat_map(units_f, self._remove)
+        remove_f.add_done_callback(self._on_removed)
+
+    def _remove(self, units):
+        if not units:
+            return f_return(None)
+
+        # Pulp requires type IDs for removal by criteria, hence the types of
+        # all units in the batch are included.
+        criteria = Criteria.and_(
+            Criteria.with_field(
+                "content_type_id",
+                Matcher.in_(sorted(set([u.content_type_id for u in units]))),
+            ),
+            Criteria.with_field("unit_id", Matcher.in_([u.unit_id for u in units])),
+        )
+        return self.repo.remove_content(criteria=criteria)
+
+    def _on_removed(self, remove_f):
+        with self._lock:
+            self._starter.finished()
+
+        try:
+            self._handle_removed(remove_f.result())
+        except Exception as ex:  # pylint: disable=broad-except
+            self.result.set_exception(ex)
+
+    def _handle_removed(self, tasks):
+        if tasks is None:
+            # Nothing more found.
+            self._done()
+            return
+
+        recorded_f = f_map(self.record(tasks), lambda _: tasks)
+        recorded_f.add_done_callback(self._on_recorded)
+
+    def _on_recorded(self, recorded_f):
+        try:
+            self._batch_done(recorded_f.result())
+        except Exception as ex:  # pylint: disable=broad-except
+            self.result.set_exception(ex)
+
+    def _batch_done(self, tasks):
+        repo_id = self.repo.id
+        removed = sum([len(task.units) for task in tasks if task.repo_id == repo_id])
+        self._tasks.extend(tasks)
+        self._removed += removed
+
+        self.state.batch_done(repo_id, removed)
+        progress = self._progress
+        progress["batches"] += 1
+        progress["removed"] += removed
+
+        elapsed = monotonic() - self._start_time
+        LOG.info(
+            "%s: removed batch %s, %s unit(s) (%s in total, %.1f unit(s)/sec)",
+            repo_id,
+            progress["batches"],
+            removed,
+            progress["removed"],
+            self._removed / elapsed if elapsed else 0.0,
+            extra={
+                "event": {
+                    "type": "clear-batch-end",
+                    "repo": repo_id,
+                    "batch": progress["batches"],
+                    "removed": progress["removed"],
+                }
+            },
+        )
+
+        if not removed:
+            # Searching again would only find the same units.
+            LOG.warning("%s: found units which could not be removed", repo_id)
+            self._done()
+            return
+
+        self._next()
+
+    def _done(self):
+        self.state.repo_done(self.repo.id)
+        self.result.set_result(self._tasks)
+
+
+def batch_size(str_batch_size):
+    val = int(str_batch_size)
+    if val < 0:
+        raise ValueError
+    return val
+
+
 class ClearRepo(CollectorService, PulpClientService, PulpRepositoryOperation):
     """Remove all contents from one or more Pulp repositories.
 
@@ -42,6 +294,10 @@ class ClearRepo(CollectorService, PulpClientService, PulpRepositoryOperation):
     filtered to selected content types.
     """
 
+    def __init__(self, *args, **kwargs):
+        super(ClearRepo, self).__init__(*args, **kwargs)
+        self._clear_state = None
+
     @property
     def content_type(self):
         # Only return non-None if there were really any types given.
@@ -58,8 +314,34 @@ class ClearRepo(CollectorService, PulpClientService, PulpRepositoryOperation):
             action=SplitAndExtend,
             split_on=",",
         )
+        self.parser.add_argument(
+            "--batch-size",
+            help=(
+                "remove content in batches of at most this many units, rather "
+                "than with a single Pulp task per repo"
+            ),
+            type=batch_size,
+            default=0,
+        )
+        self.parser.add_argument(
+            "--clear-state-file",
+            help=(
+                "with --batch-size, path of a file used to store clearing progress; "
+                "if given, an interrupted run will resume from where it stopped"
+            ),
+            default=None,
+        )
         self.parser.add_argument("repo", nargs="+", help="Repositories to be cleared")
 
+    @property
+    def clear_state(self):
+        """Progress of clearing in batches, loaded on demand from --clear-state-file."""
+        if self._clear_state is None:
+            self._clear_state = ClearState(
+                self.args.clear_state_file, self.args.repo, self.content_type
+            )
+        return self._clear_state
+
     @step("Check repos")
     def get_repos(self):
         # Returns all repos to be operated on by this task.
@@ -100,12 +382,15 @@ class ClearRepo(CollectorService, PulpClientService, PulpRepositoryOperation):
                 % ", ".join(sorted(container_repo_ids))
             )
 
-        return out
+        return sorted(out, key=lambda repo: repo.id)
 
     @step("Clear content")
     def clear_content(self, repos):
         out = []
 
+        if self.args.batch_size > 0:
+            return self.clear_content_batched(repos)
+
         for repo in repos:
             f = repo.remove_content(type_ids=self.content_type)
             f = f_map(f, partial(ClearedRepo, repo=repo))
@@ -114,6 +399,35 @@ class ClearRepo(CollectorService, PulpClientService, PulpRepositoryOperation):
 
         return out
 
+    def clear_content_batched(self, repos):
+        # Like clear_content, but removing content from each repo in batches
+        # of --batch-size units.
+        type_criteria = None
+        if self.content_type:
+            type_criteria = Criteria.with_field(
+                "content_type_id", Matcher.in_(self.content_type)
+            )
+
+        out = []
+        for repo in repos:
+            f = BatchedClear(
+                repo,
+                type_criteria,
+                self.args.batch_size,
+                self.clear_state,
+                partial(self.record_batch, repo),
+            ).start()
+            f = f_map(f, partial(ClearedRepo, repo=repo))
+            f = f_map(f, self.log_remove)
+            out.append(f)
+
+        return out
+
+    def record_batch(self, repo, tasks):
+        # Records push items for a batch of content removed from repo.
+        cleared_f = f_return(ClearedRepo(tasks=tasks, repo=repo))
+        return self.record_push_items([cleared_f], "DELETED")[0]
+
     def run(self):
         # Get the repos we'll be dealing with.
         # This is blocking so we'll fail early on missing/bad repos.
@@ -124,7 +438,10 @@ class ClearRepo(CollectorService, PulpClientService, PulpRepositoryOperation):
 
         # As clearing completes, record pushitem info on what was removed.
         # We don't have to wait on this before continuing.
-        to_await = self.record_push_items(cleared_repos_fs, "DELETED")
+        # When clearing in batches, this was already done for each batch.
+        to_await = []
+        if self.args.batch_size <= 0:
+            to_await = self.record_push_items(cleared_repos_fs, "DELETED")
 
         # Don't need the repo clearing tasks for anything more.
         repos_fs = [f_map(f, lambda cr: cr.repo) for f in cleared_repos_fs]
@@ -147,6 +464,9 @@ class ClearRepo(CollectorService, PulpClientService, PulpRepositoryOperation):
         for f in to_await:
             f.result()
 
+        if self.args.batch_size > 0:
+            self.clear_state.all_done()
+
 
 def entry_point(cls=ClearRepo):
     with cls() as instance:
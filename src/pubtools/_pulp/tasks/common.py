@@ -1,10 +1,14 @@
 import collections
 import datetime
+import itertools
 import logging
 import sys
+import threading
+from concurrent.futures import Future
+from functools import partial
 
 import attr
-from more_executors.futures import f_flat_map, f_sequence
+from more_executors.futures import f_flat_map, f_return, f_sequence
 from pubtools.pulplib import (
     ErratumUnit,
     FileUnit,
@@ -14,8 +18,12 @@ from pubtools.pulplib import (
 )
 from pushsource import ErratumPushItem, FilePushItem, ModuleMdPushItem, RpmPushItem
 
+from pubtools._pulp.arguments import SplitAndExtend
+from pubtools._pulp.scheduler import PublishScheduler
 from pubtools._pulp.services import UdCacheClientService
 from pubtools._pulp.task import PulpTask
+from pubtools._pulp.ud import UdFlushCoordinator
+from pubtools._pulp.updater import ContentUpdater
 
 from ..hooks import pm
 
@@ -31,30 +39,96 @@ step = PulpTask.step
 class UdCache(UdCacheClientService):
     """Provide features to interact with UD cache."""
 
+    def __init__(self, *args, **kwargs):
+        self.__flusher_lock = threading.Lock()
+        self.__flusher = None
+        super(UdCache, self).__init__(*args, **kwargs)
+
+    @property
+    def ud_flusher(self):
+        """A UdFlushCoordinator used for all UD cache flushes during the task,
+        so that concurrent requests to flush the same object are combined.
+
+        Returns None if UD cache flush is not enabled.
+        """
+        with self.__flusher_lock:
+            if not self.__flusher:
+                client = self.udcache_client
+                if client:
+                    self.__flusher = UdFlushCoordinator(client)
+        return self.__flusher
+
+    def __exit__(self, *exc_details):
+        if self.__flusher:
+            LOG.info(
+                "UD cache flush: %s request(s) sent, %s duplicate request(s) saved",
+                self.__flusher.requested,
+                self.__flusher.saved,
+            )
+
+        super(UdCache, self).__exit__(*exc_details)
+
     @step("Flush UD cache")
     def flush_ud(self, repos, errata=None):
-        client = self.udcache_client
+        flusher = self.ud_flusher
         out = []
-        if not client:
+        if not flusher:
             LOG.info("UD cache flush is not enabled.")
             return out
 
+        # RHELDST-24551: UD can't flush cache of repos that have no eng product ID.
+        # Ensure this condition is met before flushing.
+        repos = [repo for repo in repos if repo.eng_product_id]
+
+        # Products are flushed only once all repos are flushed, since UD derives
+        # product content from the repos.
+        repo_fs = [flusher.flush_repo(repo.id) for repo in repos]
+        out.extend(repo_fs)
+
+        product_ids = []
         for repo in repos:
-            # RHELDST-24551: UD can't flush cache of repos that have no eng product ID.
-            # Ensure this condition is met before flushing.
-            if repo.eng_product_id:
-                out.append(client.flush_repo(repo.id))
-                out.append(client.flush_product(repo.eng_product_id))
+            if repo.eng_product_id not in product_ids:
+                product_ids.append(repo.eng_product_id)
+
+        repos_flushed = f_sequence(repo_fs)
+        out.extend(
+            [
+                f_flat_map(repos_flushed, partial(self.__flush_product, product_id))
+                for product_id in product_ids
+            ]
+        )
 
-        out.extend([client.flush_erratum(erratum.id) for erratum in (errata or [])])
+        out.extend([flusher.flush_erratum(erratum.id) for erratum in (errata or [])])
 
         return out
 
+    def __flush_product(self, product_id, _):
+        return self.ud_flusher.flush_product(product_id)
+
+    def flush_ud_for_repo(self, client, repo):
+        # Returns futures for flushing UD cache of a single repo via 'client'.
+        #
+        # RHELDST-24551: UD can't flush cache of repos that have no eng product ID.
+        # Ensure this condition is met before flushing.
+        if not repo.eng_product_id:
+            return []
+
+        repo_f = client.flush_repo(repo.id)
+        return [
+            repo_f,
+            f_flat_map(repo_f, lambda _: client.flush_product(repo.eng_product_id)),
+        ]
+
 
 class Publisher(UdCache):
     """Provides behavior relating to Pulp repo publish which can be shared by
     multiple tasks."""
 
+    def __init__(self, *args, **kwargs):
+        self.__scheduler_lock = threading.Lock()
+        self.__scheduler = None
+        super(Publisher, self).__init__(*args, **kwargs)
+
     def add_publisher_args(self, parser):
         group = parser.add_argument_group(
             "Publish options", "Options affecting the behavior of Pulp repo publishes."
@@ -69,16 +143,82 @@ class Publisher(UdCache):
             help="force publish of repos even if Pulp thinks nothing has changed",
             action="store_true",
         )
+        group.add_argument(
+            "--publish-concurrency",
+            help="max number of repos to publish at once (default: unlimited)",
+            type=int,
+            default=0,
+        )
+        group.add_argument(
+            "--publish-history",
+            help=(
+                "path to a file recording publish durations per repo, used to "
+                "start the longest publishes first"
+            ),
+            default=None,
+        )
+        group.add_argument(
+            "--publish-priority",
+            help=(
+                "comma-separated patterns of repo IDs to publish before any others "
+                "(e.g. '*-security-*')"
+            ),
+            type=str,
+            action=SplitAndExtend,
+            split_on=",",
+        )
+        group.add_argument(
+            "--publish-pipeline",
+            help=(
+                "set cdn_published and flush UD cache for each repo as soon as that "
+                "repo is published, rather than after all repos are published"
+            ),
+            action="store_true",
+        )
+
+    @property
+    def publish_scheduler(self):
+        """A scheduler for publishes shared throughout the task, instantiated on
+        demand.
+
+        May return None if no publish scheduling options were provided, in which
+        case all publishes should simply be started at once.
+        """
+        args = self.args
+        if not (
+            getattr(args, "publish_concurrency", None)
+            or getattr(args, "publish_history", None)
+            or getattr(args, "publish_priority", None)
+        ):
+            return None
+
+        with self.__scheduler_lock:
+            if not self.__scheduler:
+                self.__scheduler = PublishScheduler(
+                    concurrency=args.publish_concurrency,
+                    history_path=args.publish_history,
+                    priority=args.publish_priority,
+                )
+        return self.__scheduler
 
     @step("Publish", skipped_value=[])
     def publish(self, repos):
         out = []
 
         publish_opts = PublishOptions(force=self.args.force, clean=self.args.clean)
-        for repo in repos:
+
+        def do_publish(repo):
             LOG.info("Publishing %s", repo.id)
-            f = repo.publish(publish_opts)
-            out.append(f)
+            return repo.publish(publish_opts)
+
+        scheduler = self.publish_scheduler
+        if scheduler:
+            out = scheduler.schedule(repos, do_publish)
+            f_sequence(out).add_done_callback(lambda _: scheduler.save_history())
+            return out
+
+        for repo in repos:
+            out.append(do_publish(repo))
 
         return out
 
@@ -93,15 +233,15 @@ class Publisher(UdCache):
     def set_cdn_published(self, units, pulp_client):
         now = self.cdn_published_value()
         out = []
-        for unit in units or []:
-            out.append(pulp_client.update_content(attr.evolve(unit, cdn_published=now)))
+        units = [attr.evolve(unit, cdn_published=now) for unit in units or []]
 
-        if out:
+        if units:
             LOG.info(
                 "Setting cdn_published = %s on %s unit(s)",
                 now,
-                len(out),
+                len(units),
             )
+            out.append(ContentUpdater(pulp_client).update(units))
         return out
 
     def publish_with_cache_flush(
@@ -116,6 +256,11 @@ class Publisher(UdCache):
         pulp_client = pulp_client or self.pulp_client
         out = []
 
+        if getattr(self.args, "publish_pipeline", False):
+            return self.publish_with_cache_flush_pipelined(
+                repos, units, pulp_client, errata
+            )
+
         # publish the repos found
         publish_fs = self.publish(repos)
 
@@ -137,6 +282,112 @@ class Publisher(UdCache):
 
         return out
 
+    def publish_with_cache_flush_pipelined(self, repos, units, pulp_client, errata):
+        # Like publish_with_cache_flush, but each repo has cdn_published set on its
+        # units and UD cache flushed as soon as that repo's publish completes,
+        # rather than waiting for all repos to be published.
+        repos = list(repos)
+
+        publish_fs = self.publish(repos)
+        if not publish_fs:
+            # Publish step was skipped; later steps proceed for every repo as
+            # if it had been published.
+            publish_fs = [f_return() for _ in repos]
+
+        published_fs = self.set_cdn_published_pipelined(
+            publish_fs, repos, units, pulp_client
+        )
+
+        # errata are flushed only after the hook below
+        pulp_flushed = Future()
+        out = self.flush_ud_pipelined(published_fs, repos, errata, pulp_flushed)
+
+        # wait for the publishes and their cdn_published updates to complete
+        try:
+            f_sequence(published_fs).result()
+
+            # hook implementation(s) may now flush pulp-derived caches and datastores
+            pm.hook.task_pulp_flush()
+        except Exception as ex:
+            pulp_flushed.set_exception(ex)
+            raise
+
+        pulp_flushed.set_result(None)
+        return out
+
+    @step("Set cdn_published")
+    def set_cdn_published_pipelined(self, publish_fs, repos, units, pulp_client):
+        # Like set_cdn_published, but sets cdn_published on the units of each repo
+        # as soon as the corresponding publish in publish_fs completes.
+        #
+        # Returns a future per repo, resolved once the repo is published and its
+        # units are updated. Units not in any of the repos are updated once all
+        # repos are published, tracked by one additional future.
+        #
+        # A unit in several repos has cdn_published set once the first of those
+        # repos is published.
+        now = self.cdn_published_value()
+        if units:
+            LOG.info(
+                "Setting cdn_published = %s on %s unit(s)",
+                now,
+                len(units),
+            )
+
+        units_by_repo = collections.defaultdict(list)
+        for unit in units:
+            for repo_id in unit.repository_memberships or []:
+                units_by_repo[repo_id].append(unit)
+
+        updater = ContentUpdater(pulp_client)
+        lock = threading.Lock()
+        update_fs = {}
+
+        def set_published(units, _):
+            with lock:
+                new_units = [unit for unit in units if id(unit) not in update_fs]
+                if new_units:
+                    update_f = updater.update(
+                        [attr.evolve(unit, cdn_published=now) for unit in new_units]
+                    )
+                    for unit in new_units:
+                        update_fs[id(unit)] = update_f
+                return f_sequence([update_fs[id(unit)] for unit in units])
+
+        out = [
+            f_flat_map(publish_f, partial(set_published, units_by_repo[repo.id]))
+            for (repo, publish_f) in zip(repos, publish_fs)
+        ]
+        out.append(f_flat_map(f_sequence(publish_fs), partial(set_published, units)))
+        return out
+
+    @step("Flush UD cache")
+    def flush_ud_pipelined(self, published_fs, repos, errata, pulp_flushed):
+        # Like flush_ud, but flushes each repo as soon as the corresponding future
+        # in published_fs completes. Errata are flushed once all of published_fs
+        # and pulp_flushed have completed.
+        flusher = self.ud_flusher
+        if not flusher:
+            LOG.info("UD cache flush is not enabled.")
+            return []
+
+        def flush_repo(repo, _):
+            return f_sequence(self.flush_ud_for_repo(flusher, repo))
+
+        def flush_errata(_):
+            return f_sequence(
+                [flusher.flush_erratum(erratum.id) for erratum in errata or []]
+            )
+
+        out = [
+            f_flat_map(published_f, partial(flush_repo, repo))
+            for (repo, published_f) in zip(repos, published_fs)
+        ]
+        out.append(
+            f_flat_map(f_sequence(list(published_fs) + [pulp_flushed]), flush_errata)
+        )
+        return out
+
 
 class PulpRepositoryOperation(UdCache, PulpTask):
     def __init__(self):
@@ -191,11 +442,13 @@ class PulpRepositoryOperation(UdCache, PulpTask):
         return [f_flat_map(f, self.record_repo_action) for f in repo_fs]
 
     def record_repo_action(self, repo):
-        push_items = []
-        for task in repo.tasks:
-            repo_id = None if self.task_state == "DELETED" else repo.repo.id
-            push_items.extend(self.push_items_for_task(task, repo_id))
-        return self.collector.update_push_items(push_items)
+        # Push items are generated as they're recorded, so that they don't all
+        # need to exist at once.
+        repo_id = None if self.task_state == "DELETED" else repo.repo.id
+        push_items = itertools.chain.from_iterable(
+            [self.push_items_for_task(task, repo_id) for task in repo.tasks]
+        )
+        return self.update_push_items_chunked(push_items)
 
     @step("Publish")
     def publish(self, repo_fs, clean=False):
@@ -205,12 +458,11 @@ class PulpRepositoryOperation(UdCache, PulpTask):
         ]
 
     def push_items_for_task(self, task, repo_id):
-        out = []
+        # Generates push items for the units in a task.
         for unit in task.units:
             push_item = self.push_item_for_unit(unit, repo_id)
             if push_item:
-                out.append(push_item)
-        return out
+                yield push_item
 
     def push_item_for_unit(self, unit, repo_id):
         for unit_type, fn in [
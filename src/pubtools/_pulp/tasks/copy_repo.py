@@ -1,10 +1,12 @@
 import logging
+import os
 from collections import namedtuple
 from functools import partial
 from itertools import chain
 
 import attr
-from more_executors.futures import f_map, f_sequence, f_proxy
+from more_executors import Executors
+from more_executors.futures import f_flat_map, f_map, f_return, f_sequence, f_proxy
 from pubtools.pulplib import (
     ContainerImageRepository,
     Criteria,
@@ -17,8 +19,8 @@ from pubtools.pulplib import (
     YumRepoMetadataFileUnit,
 )
 
-
 from pubtools._pulp.arguments import SplitAndExtend
+from pubtools._pulp.scheduler import RepoLockScheduler
 from pubtools._pulp.services import CollectorService, PulpClientService
 from pubtools._pulp.task import PulpTask
 from pubtools._pulp.tasks.common import PulpRepositoryOperation
@@ -73,6 +75,12 @@ CONTENT_TYPES = (
     ContentType(("package_langpacks",)),
 )
 
+# Max number of units copied by a single copy when using --diff.
+DIFF_COPY_CHUNK_SIZE = int(os.getenv("PUBTOOLS_PULP_DIFF_COPY_CHUNK_SIZE") or "2000")
+
+# Max number of repo pairs compared at once when using --diff.
+DIFF_THREADS = int(os.getenv("PUBTOOLS_PULP_DIFF_THREADS") or "4")
+
 
 @attr.s(slots=True)
 class RepoCopy(object):
@@ -87,9 +95,8 @@ class RepoCopy(object):
 
 class CopyRepo(CollectorService, PulpClientService, PulpRepositoryOperation):
     @property
-    def content_type_criteria(self):
-        # Only return non-None if there were really any types given.
-        # Otherwise, return None to let library defaults apply
+    def content_types(self):
+        # Returns the requested ContentTypes, or None if no types were given.
         out = None
 
         def str_to_content_type(content_type_id):
@@ -109,26 +116,36 @@ class CopyRepo(CollectorService, PulpClientService, PulpRepositoryOperation):
             content_types = set(
                 map(lambda x: x.replace("srpm", "rpm"), self.args.content_type)
             )
-            content_types = [
-                str_to_content_type(t.lower().strip()) for t in content_types
-            ]
-            criteria = []
-            in_matcher = []  # to aggregate content types for Criteria.with_field()
+            out = sorted(
+                [str_to_content_type(t.lower().strip()) for t in content_types]
+            )
+        return out
 
-            for item in sorted(content_types):
-                if item.klass:
-                    criteria.append(
-                        Criteria.with_unit_type(item.klass, unit_fields=item.fields)
-                    )
-                else:
-                    in_matcher.extend(item.content_type_ids)
-            if in_matcher:
+    @property
+    def content_type_criteria(self):
+        # Only return non-None if there were really any types given.
+        # Otherwise, return None to let library defaults apply
+        content_types = self.content_types
+        if content_types is None:
+            return None
+
+        criteria = []
+        in_matcher = []  # to aggregate content types for Criteria.with_field()
+
+        for item in content_types:
+            if item.klass:
                 criteria.append(
-                    Criteria.with_field("content_type_id", Matcher.in_(in_matcher))
+                    Criteria.with_unit_type(item.klass, unit_fields=item.fields)
                 )
+            else:
+                in_matcher.extend(item.content_type_ids)
 
-            out = criteria
-        return out
+        if in_matcher:
+            criteria.append(
+                Criteria.with_field("content_type_id", Matcher.in_(in_matcher))
+            )
+
+        return criteria
 
     @property
     def repo_pairs(self):
@@ -155,6 +172,16 @@ class CopyRepo(CollectorService, PulpClientService, PulpRepositoryOperation):
             action=SplitAndExtend,
             split_on=",",
         )
+        self.parser.add_argument(
+            "--diff",
+            help=(
+                "copy only those units missing from the destination repo; "
+                "requires --content-type, and applies to those content types "
+                "which correspond to a unit type (e.g. rpm, iso), other content "
+                "is copied as usual"
+            ),
+            action="store_true",
+        )
         self.parser.add_argument(
             "repopairs",
             help="repository pair(s) (source, destination) to be copied. e.g. repo-A,repo-B repo-C,repo-D",
@@ -202,33 +229,152 @@ class CopyRepo(CollectorService, PulpClientService, PulpRepositoryOperation):
 
         return [
             (found_repos_map[repo_id_src], found_repos_map[repo_id_dest])
-            for repo_id_src, repo_id_dest in self.repo_pairs
+            for repo_id_src, repo_id_dest in sorted(self.repo_pairs)
         ]
 
     @step("Copy content")
     def copy_content(self, repo_pairs):
+        # Copies lock the destination repo in Pulp, so copies into the same
+        # destination (whether for different pairs or different content types)
+        # are run one at a time, while copies into distinct destinations are
+        # run concurrently.
+        scheduler = RepoLockScheduler()
+
+        if self.args.diff:
+            return self.copy_content_diff(repo_pairs, scheduler)
+
         fts = []
         criteria = self.content_type_criteria
 
+        for src_repo, dest_repo in repo_pairs:
+            copy_fs = [
+                self.schedule_copy(scheduler, src_repo, dest_repo, item)
+                for item in criteria or [None]
+            ]
+            fts.append(self.repo_copy(copy_fs, dest_repo))
+
+        return fts
+
+    def schedule_copy(self, scheduler, src_repo, dest_repo, criteria):
+        # Copies from src_repo to dest_repo once no other copy holds dest_repo,
+        # returning a future for the list of copy tasks.
+        return scheduler.schedule(
+            [dest_repo.id],
+            partial(
+                self.pulp_client.copy_content, src_repo, dest_repo, criteria=criteria
+            ),
+        )
+
+    def repo_copy(self, copy_fs, dest_repo):
+        # Given futures for lists of copy tasks into dest_repo, returns a future
+        # for a logged RepoCopy once all are completed.
         def repo_copy(copy_tasks, repo):
             tasks = list(chain.from_iterable(copy_tasks))
             return RepoCopy(tasks=tasks, repo=repo)
 
-        for src_repo, dest_repo in repo_pairs:
-            one_pair_copies = []
-            for item in criteria or [None]:
-                tasks_f = self.pulp_client.copy_content(
-                    src_repo, dest_repo, criteria=item
-                )
-                one_pair_copies.append(tasks_f)
+        f = f_map(f_sequence(copy_fs), partial(repo_copy, repo=dest_repo))
+        return f_map(f, self.log_copy)
+
+    def copy_content_diff(self, repo_pairs, scheduler):
+        # Like copy_content, but copying only the units missing from each
+        # destination repo.
+        content_types = self.content_types
+
+        diff_types = [item for item in content_types if item.klass]
+        other_ids = []
+        for item in content_types:
+            if not item.klass:
+                other_ids.extend(item.content_type_ids)
+
+        fts = []
+        with Executors.thread_pool(
+            name="pubtools-pulp-copy-diff", max_workers=DIFF_THREADS
+        ) as executor:
+            for src_repo, dest_repo in repo_pairs:
+                one_pair_copies = []
+                for item in diff_types:
+                    # Resolves to a list of futures, one per chunk of copied units.
+                    copies_f = executor.submit(
+                        self.copy_missing, scheduler, src_repo, dest_repo, item
+                    )
+                    tasks_f = f_map(
+                        f_flat_map(copies_f, f_sequence),
+                        lambda tasks: list(chain.from_iterable(tasks)),
+                    )
+                    one_pair_copies.append(tasks_f)
+
+                if other_ids:
+                    # No unit keys for these, so they're copied as usual.
+                    criteria = Criteria.with_field(
+                        "content_type_id", Matcher.in_(other_ids)
+                    )
+                    one_pair_copies.append(
+                        self.schedule_copy(scheduler, src_repo, dest_repo, criteria)
+                    )
 
-            f = f_map(f_sequence(one_pair_copies), partial(repo_copy, repo=dest_repo))
-            f = f_map(f, self.log_copy)
-            fts.append(f)
+                fts.append(self.repo_copy(one_pair_copies, dest_repo))
 
         return fts
 
+    def copy_missing(self, scheduler, src_repo, dest_repo, content_type):
+        # Copies units of content_type from src_repo to dest_repo, if they're
+        # not already in dest_repo.
+        #
+        # Blocks while searching both repos, returning a list of futures for
+        # the copy tasks.
+        klass = content_type.klass
+        fields = content_type.fields
+        type_id = content_type.content_type_ids[0]
+        criteria = Criteria.with_unit_type(klass, unit_fields=fields)
+
+        def unit_key(unit):
+            return tuple([getattr(unit, field) for field in fields])
+
+        dest_keys = set()
+        for unit in dest_repo.search_content(criteria):
+            dest_keys.add(unit_key(unit))
+
+        out = []
+        skipped = 0
+        missing = 0
+        chunk = []
+
+        def copy_chunk():
+            copy_crit = Criteria.and_(
+                Criteria.with_unit_type(klass, unit_fields=fields),
+                Criteria.with_field("unit_id", Matcher.in_(chunk)),
+            )
+            out.append(self.schedule_copy(scheduler, src_repo, dest_repo, copy_crit))
+
+        for unit in src_repo.search_content(criteria):
+            if unit_key(unit) in dest_keys:
+                skipped += 1
+                continue
+
+            missing += 1
+            chunk.append(unit.unit_id)
+            if len(chunk) >= DIFF_COPY_CHUNK_SIZE:
+                copy_chunk()
+                chunk = []
+
+        if chunk:
+            copy_chunk()
+
+        LOG.info(
+            "%s => %s: copying %s %s(s), skipped %s already present",
+            src_repo.id,
+            dest_repo.id,
+            missing,
+            type_id,
+            skipped,
+        )
+
+        return out or [f_return([])]
+
     def run(self):
+        if self.args.diff and not self.args.content_type:
+            self.parser.error("--diff requires --content-type")
+
         # Get a list of repo pairs we'll be dealing with.
         # This is blocking so we'll fail early on missing/bad repos.
         repo_pairs = self.get_repos()
@@ -241,7 +387,16 @@ class CopyRepo(CollectorService, PulpClientService, PulpRepositoryOperation):
         to_await = self.record_push_items(repo_copies_fs, "PUSHED")
 
         # Don't need the repo copying tasks for anything more.
-        repos_fs = [f_proxy(f_map(f, lambda cr: cr.repo)) for f in repo_copies_fs]
+        # A repo may be the destination of several pairs, but is only published
+        # and flushed once, after all copies into that repo have completed.
+        copies_by_dest = {}
+        for (_, dest_repo), f in zip(repo_pairs, repo_copies_fs):
+            copies_by_dest.setdefault(dest_repo.id, []).append(f)
+
+        repos_fs = [
+            f_proxy(f_map(f_sequence(fs), lambda crs: crs[0].repo))
+            for fs in copies_by_dest.values()
+        ]
 
         # Now move repos into the desired state:
         # They should be published.
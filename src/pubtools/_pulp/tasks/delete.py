@@ -1,4 +1,6 @@
+import itertools
 import logging
+import os
 import re
 import sys
 from functools import partial
@@ -29,6 +31,27 @@ MODULEMD_REGEX = re.compile(r"^[-.+\w]+:[-.+\w]+:\d+(:[-.+\w]+){0,2}$")
 
 ALL_REPOS_INDICATOR = "*"
 
+# Repos which are only removed from when explicitly requested, even if
+# ALL_REPOS_INDICATOR is used.
+EXPLICIT_REPO_PREFIX = "all-rpm-content-"
+
+# Max number of units looked up by a single search; searches for more units
+# are split into several searches.
+SEARCH_CHUNK_SIZE = int(os.getenv("PUBTOOLS_PULP_DELETE_SEARCH_CHUNK_SIZE") or "500")
+
+
+def f_flatten(f):
+    # Given a Future[list[Future[X]]], returns a Future[list[X]] which
+    # resolves once all of the inner futures have resolved.
+    return f_flat_map(f, f_sequence)
+
+
+def f_concat(fs):
+    # Given a list of Future[list[X]], returns a Future[list[X]] with the
+    # concatenated lists.
+    return f_map(f_sequence(fs), lambda lists: [x for sub in lists for x in sub])
+
+
 @attr.s
 class ClearedRepo(object):
     """Represents a single repo where contents were removed."""
@@ -80,9 +103,9 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
         self.parser.add_argument(
             "--repo",
             help="remove content from these comma-seperated repositories. If "
-                 "'%s' is used, the package will be removed from all repos, "
-                 "excluding all-rpm-content-* repos. These may be added "
-                 "separately." % ALL_REPOS_INDICATOR,
+            "'%s' is used, the package will be removed from all repos, "
+            "excluding all-rpm-content-* repos. These may be added "
+            "separately." % ALL_REPOS_INDICATOR,
             type=str,
             action=SplitAndExtend,
             split_on=",",
@@ -150,6 +173,11 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
 
         rpms_info = [RpmInfoItem(filename=rpm, sha256sum=None) for rpm in rpms]
 
+        # Each of the steps below only submits work and returns futures, so
+        # that deletion of standalone files and of each advisory's content all
+        # proceed concurrently; the only waiting is done here, once everything
+        # has been submitted.
+
         # delete files
         file_f = self._delete_standalone_files(
             repo_names, signing_keys, rpms_info, files, modules
@@ -160,7 +188,7 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
             file_fs = self.delete_from_advisories(advisories, repo_names)
 
         # wait for the futures to resolve
-        # file_f returns a list of futures for content removal on each repo
+        # file_f resolves to the repos cleared by content removal
         # file_fs is a list of file_f from deletion of set of rpms and modules in
         # each advisory
         file_fs.append(file_f)
@@ -182,7 +210,13 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
                 f.result()
 
     def _delete_standalone_files(
-        self, repo_names, signing_keys=None, rpms_info=None, files=None, modules=None
+        self,
+        repo_names,
+        signing_keys=None,
+        rpms_info=None,
+        files=None,
+        modules=None,
+        unit_repos=None,
     ):
         rpm_f = f_return([])
         file_f = f_return([])
@@ -194,20 +228,22 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
 
         # delete rpms
         if rpms_info:
-            rpm_f = self.delete_rpms(repo_names, rpms_info, signing_keys)
+            rpm_f = self.delete_rpms(
+                repo_names, rpms_info, signing_keys, unit_repos=unit_repos
+            )
 
         # delete modules
         if modules:
-            module_f = self.delete_modules(repo_names, modules, signing_keys)
-
-        fs = rpm_f.result() + file_f.result() + module_f.result()
+            module_f = self.delete_modules(
+                repo_names, modules, signing_keys, unit_repos=unit_repos
+            )
 
-        return f_sequence(fs)
+        # Each of the above resolves to a list of futures for content removal on
+        # each repo; return a future for the cleared repos once all are done.
+        return f_concat([f_flatten(f) for f in (rpm_f, file_f, module_f)])
 
-    @step("Delete advisories")
+    @step("Delete advisories", skipped_value=[])
     def delete_from_advisories(self, advisory_ids, repos):
-        out = []
-
         # get advisory from pulp
         advisories = self.get_advisories(advisory_ids)
 
@@ -216,44 +252,86 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
         # repository_memberships
         advisory_map = self.process_advisories(advisories, repos)
 
-        # delete packages and modules
-        for _, advisory_info in advisory_map.items():
-            verified_repos, rpms_info, modules = advisory_info
+        # combine packages and modules from all advisories
+        all_repos, rpms_info, modules, unit_repos = self.plan_advisories(advisory_map)
+        if not (rpms_info or modules):
+            return []
 
-            out.append(
-                self._delete_standalone_files(
-                    verified_repos, rpms_info=rpms_info, modules=modules
-                )
+        # delete packages and modules
+        return [
+            self._delete_standalone_files(
+                all_repos, rpms_info=rpms_info, modules=modules, unit_repos=unit_repos
             )
+        ]
 
-        # return fs
-        return out
+    def plan_advisories(self, advisory_map):
+        """Combine the packages and modules of every advisory in advisory_map,
+        so that they can be looked up and removed together.
+
+        Returns a tuple of:
+        - all repos from which content may be removed
+        - RpmInfoItems for all packages
+        - NSVCA of all modules
+        - a dict mapping each RPM filename and module NSVCA to the repos
+          from which it should be removed
+        """
+        all_repos = set()
+        rpms_info = []
+        modules = []
+        unit_repos = {}
+        seen_rpms = set()
+
+        for _, advisory_info in sorted(advisory_map.items()):
+            verified_repos, advisory_rpms, advisory_modules = advisory_info
+            all_repos.update(verified_repos)
 
-    @step("Delete modules")
-    def delete_modules(self, repos, module_names, signing_keys=None):
+            for rpm_info in advisory_rpms:
+                key = (rpm_info.filename, rpm_info.sha256sum)
+                if key not in seen_rpms:
+                    seen_rpms.add(key)
+                    rpms_info.append(rpm_info)
+                unit_repos.setdefault(rpm_info.filename, set()).update(verified_repos)
+
+            for module in advisory_modules:
+                if module not in unit_repos:
+                    modules.append(module)
+                unit_repos.setdefault(module, set()).update(verified_repos)
+
+        return sorted(all_repos), rpms_info, modules, unit_repos
+
+    @step("Delete modules", skipped_value=f_return([]))
+    def delete_modules(self, repos, module_names, signing_keys=None, unit_repos=None):
         # get modules from Pulp
         mods_f = self.get_modules(module_names)
 
         # map modules to repos
-        f = f_map(mods_f, partial(self.map_to_repo, repos=repos, unit_attr="nsvca"))
+        f = f_map(
+            mods_f,
+            partial(
+                self.map_to_repo, repos=repos, unit_attr="nsvca", unit_repos=unit_repos
+            ),
+        )
         repo_map_f = f_map(f, self.log_units)
 
         # remove packages in the modules from all the provided repos,
         # after establishing that the modules are present in one of the
         # provided repos in the previous step
         unit_map_f = f_map(f, lambda map: map[1])
-        artifact_cleared_repos_f = f_map(
+        artifact_cleared_repos_f = f_flat_map(
             unit_map_f,
             lambda unit_map: self.remove_mod_artifacts(
-                unit_map.values(), repos=repos, signing_keys=signing_keys
+                unit_map.values(),
+                repos=repos,
+                signing_keys=signing_keys,
+                unit_repos=unit_repos,
             ),
         )
 
-        # hold for rpms in the artifacts to be removed before removing modules
-        # wait for artifact_f to resolve for f_zip to resolve and return repo_map_f
-        # to remove_modules in next step
+        # hold for rpms in the artifacts to be removed before removing modules;
+        # f_zip resolves only once the artifacts are removed, then passes
+        # repo_map_f on to remove_modules in next step
         repo_map_f = f_map(
-            f_zip(repo_map_f, f_sequence(artifact_cleared_repos_f.result())),
+            f_zip(repo_map_f, f_flatten(artifact_cleared_repos_f)),
             lambda t: t[0],
         )
 
@@ -262,7 +340,7 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
 
         # collect items
         f = f_map(mod_cleared_repos_f, self.record_clears)
-        self.to_await.extend(f.result())
+        self.to_await.append(f_flatten(f))
 
         # return affected repos
         # gather all the affected repos by combining the list of cleared_repo
@@ -273,7 +351,7 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
             lambda cr_tuple: cr_tuple[0] + cr_tuple[1],
         )
 
-    @step("Delete files")
+    @step("Delete files", skipped_value=f_return([]))
     def delete_files(self, repos, file_names):
         # get files from Pulp
         files_f = self.get_files(file_names)
@@ -287,18 +365,26 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
 
         # collect items
         f = f_map(cleared_repos_f, self.record_clears)
-        self.to_await.extend(f.result())
+        self.to_await.append(f_flatten(f))
 
         # return affected repos
         return cleared_repos_f
 
-    @step("Delete RPMs")
-    def delete_rpms(self, repos, rpms_info, signing_keys=None):
+    @step("Delete RPMs", skipped_value=f_return([]))
+    def delete_rpms(self, repos, rpms_info, signing_keys=None, unit_repos=None):
         # get rpms from Pulp
         rpms_f = self.get_rpms(rpms_info, signing_keys)
 
         # map rpms to repos
-        f = f_map(rpms_f, partial(self.map_to_repo, repos=repos, unit_attr="filename"))
+        f = f_map(
+            rpms_f,
+            partial(
+                self.map_to_repo,
+                repos=repos,
+                unit_attr="filename",
+                unit_repos=unit_repos,
+            ),
+        )
         repo_map_f = f_map(f, self.log_units)
 
         # remove rpms from repos
@@ -306,7 +392,7 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
 
         # collect items
         f = f_map(cleared_repos_f, self.record_clears)
-        self.to_await.extend(f.result())
+        self.to_await.append(f_flatten(f))
 
         # return affected repos
         return cleared_repos_f
@@ -404,16 +490,19 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
 
         return verified_repos
 
-    @step("Remove artifacts from modules")
-    def remove_mod_artifacts(self, modules, repos, signing_keys):
+    @step("Remove artifacts from modules", skipped_value=f_return([]))
+    def remove_mod_artifacts(self, modules, repos, signing_keys, unit_repos=None):
+        # RPMs from all modules are deleted concurrently.
         out = []
         for item in modules:
             rpms = item.unit.artifacts_filenames
             if rpms:
+                # artifacts are removed from the same repos as their module
+                mod_repos = (unit_repos or {}).get(item.unit.nsvca, repos)
                 rpms_info = [RpmInfoItem(filename=rpm, sha256sum=None) for rpm in rpms]
-                out.extend(self.delete_rpms(repos, rpms_info, signing_keys).result())
+                out.append(self.delete_rpms(sorted(mod_repos), rpms_info, signing_keys))
 
-        return out
+        return f_concat(out)
 
     @step("Get advisories")
     def get_advisories(self, advisory_ids):
@@ -430,10 +519,9 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
     @step("Get RPMs")
     def get_rpms(self, rpms_info, signing_keys=None):
         rpm_names = [rpm_info.filename for rpm_info in rpms_info]
-        criteria = self.unit_criteria(
+        rpms_f = self.search_chunked(
             RpmUnit, self._rpm_search_criteria(rpms_info, signing_keys)
         )
-        rpms_f = self.search_content(criteria)
         rpms_f = f_map(
             rpms_f,
             partial(
@@ -447,8 +535,7 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
 
     @step("Get files")
     def get_files(self, file_names):
-        criteria = self.unit_criteria(FileUnit, self._file_search_criteria(file_names))
-        files_f = self.search_content(criteria)
+        files_f = self.search_chunked(FileUnit, self._file_search_criteria(file_names))
         files_f = f_map(
             files_f,
             partial(
@@ -462,10 +549,9 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
 
     @step("Get modules")
     def get_modules(self, module_names):
-        criteria = self.unit_criteria(
+        mods_f = self.search_chunked(
             ModulemdUnit, self._module_search_criteria(module_names)
         )
-        mods_f = self.search_content(criteria)
         mods_f = f_map(
             mods_f,
             partial(
@@ -552,6 +638,16 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
     def search_content(self, criteria):
         return self.pulp_client.search_content(criteria=criteria)
 
+    def search_chunked(self, unit_type, partial_crit):
+        # Search for units of unit_type matching any of partial_crit, using
+        # up to SEARCH_CHUNK_SIZE criteria per search.
+        fs = []
+        for i in range(0, len(partial_crit), SEARCH_CHUNK_SIZE):
+            chunk = partial_crit[i : i + SEARCH_CHUNK_SIZE]
+            fs.append(self.search_content(self.unit_criteria(unit_type, chunk)))
+
+        return f_concat([f_map(f, list) for f in fs])
+
     def log_missing_units(self, searched_units, unit_attr, unit_type, unit_names):
         found = []
 
@@ -571,22 +667,41 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
 
         return searched_units
 
-    def map_to_repo(self, units, repos, unit_attr):
+    def map_to_repo(self, units, repos, unit_attr, unit_repos=None):
+        # unit_repos optionally maps unit names to the repos from which those
+        # units should be removed; otherwise, units are removed from all repos.
         repo_map = {}
         unit_map = {}
         repos = sorted(repos)
+        requested = set(repos)
+        all_repos = ALL_REPOS_INDICATOR in requested
+
+        # Whether each repo seen in unit memberships can be removed from
+        # when using ALL_REPOS_INDICATOR.
+        allowed = {}
+
         for unit in sorted(units):
             unit_name = getattr(unit, unit_attr)
             unit_map.setdefault(unit_name, RemoveUnitItem(unit=unit, repos=[]))
-            if ALL_REPOS_INDICATOR in repos:
+            if all_repos:
                 for repo in unit.repository_memberships:
-                    if re.match("all-rpm-content-.*", repo) and repo not in repos:
+                    if repo not in allowed:
+                        allowed[repo] = (
+                            not repo.startswith(EXPLICIT_REPO_PREFIX)
+                            or repo in requested
+                        )
+                    if not allowed[repo]:
                         continue
                     repo_map.setdefault(repo, []).append(unit)
                     unit_map.get(unit_name).repos.append(repo)
             else:
-                for repo in repos:
-                    if repo not in unit.repository_memberships:
+                memberships = set(unit.repository_memberships or [])
+                if unit_repos is not None:
+                    for_unit = sorted(unit_repos.get(unit_name) or [])
+                else:
+                    for_unit = repos
+                for repo in for_unit:
+                    if repo not in memberships:
                         LOG.warning(
                             "%s is not present in %s",
                             unit_name,
@@ -605,15 +720,15 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
 
         return repo_map, unit_map
 
-    @step("Unassociate RPMs")
+    @step("Unassociate RPMs", skipped_value=[])
     def remove_rpms(self, repo_map):
         return self.delete_content(RpmUnit, repo_map, self._rpm_remove_crit)
 
-    @step("Unassociate files")
+    @step("Unassociate files", skipped_value=[])
     def remove_files(self, repo_map):
         return self.delete_content(FileUnit, repo_map, self._file_remove_crit)
 
-    @step("Unassociate modules")
+    @step("Unassociate modules", skipped_value=[])
     def remove_modules(self, repo_map):
         return self.delete_content(ModulemdUnit, repo_map, self._module_remove_crit)
 
@@ -709,18 +824,22 @@ class Delete(PulpClientService, CollectorService, Publisher, PulpTask):
         return [f_flat_map(f, self.record_cleared_repo) for f in cleared_repo_fs]
 
     def record_cleared_repo(self, cleared_repo):
-        push_items = []
-        for task in cleared_repo.tasks:
-            push_items.extend(self.push_items_for_task(task, cleared_repo.repo.id))
-        return self.collector.update_push_items(push_items)
+        # Push items are generated as they're recorded, so that they don't all
+        # need to exist at once.
+        push_items = itertools.chain.from_iterable(
+            [
+                self.push_items_for_task(task, cleared_repo.repo.id)
+                for task in cleared_repo.tasks
+            ]
+        )
+        return self.update_push_items_chunked(push_items)
 
     def push_items_for_task(self, task, repo):
-        out = []
+        # Generates push items for the units in a task.
         for unit in task.units:
             push_item = self.push_item_for_unit(unit, repo, "DELETED")
             if push_item:
-                out.append(push_item)
-        return out
+                yield push_item
 
     def push_item_for_unit(self, unit, dest, state):
         for unit_type, fn in [
@@ -1,10 +1,19 @@
 import logging
 import os
+import threading
+from collections import deque
 from datetime import datetime, timedelta
 
+try:
+    from time import monotonic
+except ImportError:  # pragma: no cover
+    from monotonic import monotonic
+
+from more_executors import Executors
 from pubtools.pulplib import Criteria, Matcher, RpmUnit
 
 from pubtools._pulp.services import PulpClientService
+from pubtools._pulp.state import StateFile
 from pubtools._pulp.task import PulpTask
 
 LOG = logging.getLogger("pubtools.pulp")
@@ -12,6 +21,73 @@ step = PulpTask.step
 
 UNASSOCIATE_BATCH_LIMIT = int(os.getenv("PULP_GC_UNASSOCIATE_BATCH_LIMIT", "10000"))
 
+# Max number of unassociate requests in flight at once, per repo.
+UNASSOCIATE_IN_FLIGHT = int(os.getenv("PULP_GC_UNASSOCIATE_IN_FLIGHT", "3"))
+
+# Matches all-rpm-content and the all-rpm-content-XX shards used by push.
+ARC_REPO_ID_REGEX = r"^all-rpm-content(-[0-9a-f]{2})?$"
+
+DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+
+class GcState(StateFile):
+    """Garbage collection state persisted between runs.
+
+    Besides resuming an interrupted run, this allows later runs to skip repos
+    which were recently cleaned.
+    """
+
+    def __init__(self, path=None):
+        super(GcState, self).__init__(path)
+
+        # Cutoff for cdn_published used by the current all-rpm-content cleanup,
+        # and IDs of repos for which that cleanup has completed.
+        self.arc_cutoff = None
+        self.arc_completed = set()
+
+        # For each repo, the cdn_published cutoff used when all-rpm-content
+        # cleanup was last completed.
+        self.arc_last_cutoffs = {}
+
+        self.load_file()
+
+    def load(self, raw):
+        if raw.get("arc_cutoff"):
+            self.arc_cutoff = datetime.strptime(raw["arc_cutoff"], DATETIME_FORMAT)
+        self.arc_completed = set(raw.get("arc_completed") or [])
+        for repo_id, value in (raw.get("arc_last_cutoffs") or {}).items():
+            self.arc_last_cutoffs[repo_id] = datetime.strptime(value, DATETIME_FORMAT)
+
+    def dump(self):
+        return {
+            "arc_cutoff": (
+                self.arc_cutoff.strftime(DATETIME_FORMAT) if self.arc_cutoff else None
+            ),
+            "arc_completed": sorted(self.arc_completed),
+            "arc_last_cutoffs": dict(
+                [
+                    (repo_id, value.strftime(DATETIME_FORMAT))
+                    for (repo_id, value) in self.arc_last_cutoffs.items()
+                ]
+            ),
+        }
+
+    def arc_repo_done(self, repo_id):
+        """Record that all-rpm-content cleanup has completed for a repo."""
+        with self.lock:
+            self.arc_completed.add(repo_id)
+            self.arc_last_cutoffs[repo_id] = self.arc_cutoff
+            self.save()
+
+    def arc_done(self):
+        """Record that all-rpm-content cleanup has completed for all repos,
+        so the next run doesn't resume this one.
+        """
+        with self.lock:
+            self.arc_cutoff = None
+            self.arc_completed = set()
+            self.save()
+
 
 class GarbageCollect(PulpClientService, PulpTask):
     """Perform garbage collection on Pulp data.
@@ -24,6 +100,10 @@ class GarbageCollect(PulpClientService, PulpTask):
     scheduled trigger.
     """
 
+    def __init__(self, *args, **kwargs):
+        super(GarbageCollect, self).__init__(*args, **kwargs)
+        self._gc_state = None
+
     def add_args(self):
         super(GarbageCollect, self).add_args()
 
@@ -41,6 +121,48 @@ class GarbageCollect(PulpClientService, PulpTask):
             default=30,
         )
 
+        self.parser.add_argument(
+            "--arc-parallelism",
+            help="max number of all-rpm-content repos to clean at once",
+            type=int,
+            default=4,
+        )
+
+        self.parser.add_argument(
+            "--gc-state-file",
+            help=(
+                "path of a file used to store garbage collection progress; "
+                "if given, an interrupted run will resume from where it stopped"
+            ),
+            default=None,
+        )
+
+        self.parser.add_argument(
+            "--arc-min-interval",
+            help=(
+                "with --gc-state-file, skip all-rpm-content repos which were "
+                "cleaned within this many hours"
+            ),
+            type=float,
+            default=0,
+        )
+
+        self.parser.add_argument(
+            "--gc-full",
+            help=(
+                "clean all repos, ignoring progress and the time repos were "
+                "last cleaned from --gc-state-file"
+            ),
+            action="store_true",
+        )
+
+    @property
+    def gc_state(self):
+        """Garbage collection state, loaded on demand from --gc-state-file."""
+        if self._gc_state is None:
+            self._gc_state = GcState(self.args.gc_state_file)
+        return self._gc_state
+
     def run(self):
         self.delete_temp_repos()
         self.clean_all_rpm_content()
@@ -82,49 +204,189 @@ class GarbageCollect(PulpClientService, PulpTask):
         # Clear out old all-rpm-content
         LOG.info("Start old all-rpm-content deletion")
         arc_threshold = self.args.arc_threshold
+        state = self.gc_state
+
+        # all-rpm-content and all of its shards are found with a single search.
         clean_repos = list(
             self.pulp_client.search_repository(
-                Criteria.with_field("id", "all-rpm-content")
+                Criteria.with_field("id", Matcher.regex(ARC_REPO_ID_REGEX))
             )
         )
         if not clean_repos:
             LOG.info("No repos found for cleaning.")
             return
-        arc_repo = clean_repos[0]
+
+        if self.args.gc_full:
+            LOG.info("Performing full all-rpm-content cleanup")
+            state.arc_cutoff = datetime.utcnow() - timedelta(days=arc_threshold)
+            state.arc_completed = set()
+        elif state.arc_cutoff and state.arc_completed:
+            # Resuming an interrupted run. Keep using the same cutoff so that
+            # all repos are cleaned consistently.
+            LOG.info(
+                "Resuming all-rpm-content cleanup, %s repo(s) already cleaned",
+                len(state.arc_completed),
+            )
+        else:
+            state.arc_cutoff = datetime.utcnow() - timedelta(days=arc_threshold)
+            state.arc_completed = set()
+
+        clean_repos = sorted(
+            [repo for repo in clean_repos if repo.id not in state.arc_completed],
+            key=lambda repo: repo.id,
+        )
+
+        if not self.args.gc_full and self.args.arc_min_interval:
+            clean_repos = self.recently_cleaned_filter(clean_repos)
 
         search_criteria = Criteria.and_(
             Criteria.with_unit_type(RpmUnit, unit_fields=["unit_id"]),
-            Criteria.with_field(
-                "cdn_published",
-                Matcher.less_than(datetime.utcnow() - timedelta(days=arc_threshold)),
-            ),
+            Criteria.with_field("cdn_published", Matcher.less_than(state.arc_cutoff)),
         )
 
         LOG.info("Collecting unit batches for deletion")
-        units = list(arc_repo.search_content(criteria=search_criteria))
-        if not units:
+        removed = self.clean_repos(clean_repos, search_criteria)
+        state.arc_done()
+        if not removed:
             LOG.info("No all-rpm-content found older than %s", arc_threshold)
-            return
 
-        unit_batches = [
-            units[i : i + UNASSOCIATE_BATCH_LIMIT]
-            for i in range(0, len(units), UNASSOCIATE_BATCH_LIMIT)
-        ]
-        for batch in unit_batches:
+    def recently_cleaned_filter(self, repos):
+        """Returns those of 'repos' which weren't cleaned within --arc-min-interval
+        hours of the current cutoff, according to --gc-state-file.
+
+        Units only become eligible for removal as the cutoff moves past their
+        cdn_published date, so a repo cleaned recently can only have a small
+        number of newly eligible units. Skipping those repos allows GC to run
+        frequently, cleaning each repo only once per interval.
+        """
+        state = self.gc_state
+        min_interval = timedelta(hours=self.args.arc_min_interval)
+
+        out = []
+        skipped = []
+        for repo in repos:
+            last_cutoff = state.arc_last_cutoffs.get(repo.id)
+            if last_cutoff and state.arc_cutoff - last_cutoff < min_interval:
+                skipped.append(repo.id)
+            else:
+                out.append(repo)
+
+        if skipped:
+            LOG.info(
+                "Skipping %s repo(s) cleaned within the last %s hour(s)",
+                len(skipped),
+                self.args.arc_min_interval,
+            )
+            LOG.debug("Skipped repo(s): %s", ", ".join(skipped))
+
+        return out
+
+    def clean_repos(self, repos, criteria):
+        """Remove units matching 'criteria' from each of 'repos', cleaning
+        up to --arc-parallelism repos at once.
+
+        Returns the total number of removed units.
+        """
+        state = self.gc_state
+        lock = threading.Lock()
+        counts = {"repos": 0, "removed": 0}
+
+        def clean_repo(repo):
+            LOG.debug("%s: cleaning started", repo.id)
+            removed = self.remove_units(repo, criteria)
+            state.arc_repo_done(repo.id)
+            with lock:
+                counts["repos"] += 1
+                counts["removed"] += removed
+                LOG.info(
+                    "%s: cleaning completed, removed %s unit(s) (%s of %s repo(s))",
+                    repo.id,
+                    removed,
+                    counts["repos"],
+                    len(repos),
+                )
+
+        with Executors.thread_pool(
+            name="pubtools-pulp-gc", max_workers=max(self.args.arc_parallelism, 1)
+        ) as exc:
+            fs = [exc.submit(clean_repo, repo) for repo in repos]
+            for f in fs:
+                f.result()
+
+        return counts["removed"]
+
+    def remove_units(self, repo, criteria):
+        """Remove all units matching 'criteria' from 'repo'.
+
+        Units are removed in batches as soon as enough units have been found
+        by the search, with up to UNASSOCIATE_IN_FLIGHT batches being removed
+        at once. This means the full set of matching units is never held
+        in memory.
+
+        Returns the number of removed units.
+        """
+        total = 0
+        while True:
+            # Pulp pages through search results by offset, so removing units
+            # from the repo while paging may cause some matching units to be
+            # skipped. Hence, search again until nothing more is found.
+            (found, removed) = self._remove_units_pass(repo, criteria)
+            total += removed
+            if not found or not removed:
+                return total
+
+    def _remove_units_pass(self, repo, criteria):
+        start = monotonic()
+        in_flight = deque()
+        batch = []
+        counts = {"found": 0, "removed": 0}
+
+        def await_removal():
+            tasks = in_flight.popleft().result()
+            for task in tasks:
+                if task.repo_id == repo.id:
+                    for unit in task.units:
+                        LOG.info("Old all-rpm-content deleted: %s", unit.name)
+                    counts["removed"] += len(task.units)
+
+            elapsed = monotonic() - start
+            LOG.info(
+                "%s: removed %s of %s unit(s) found so far (%.1f unit(s)/sec)",
+                repo.id,
+                counts["removed"],
+                counts["found"],
+                counts["removed"] / elapsed if elapsed else 0.0,
+            )
+
+        def submit_removal(units):
+            while len(in_flight) >= max(UNASSOCIATE_IN_FLIGHT, 1):
+                await_removal()
+
             LOG.info("Submitting batch for deletion")
             deletion_criteria = Criteria.and_(
                 Criteria.with_unit_type(RpmUnit),
                 Criteria.with_field(
                     "unit_id",
-                    Matcher.in_([unit.unit_id for unit in batch]),
+                    Matcher.in_([unit.unit_id for unit in units]),
                 ),
             )
             LOG.debug("Submitting batch for deletion")
-            deletion_task = arc_repo.remove_content(criteria=deletion_criteria).result()
-            for task in deletion_task:
-                if task.repo_id == "all-rpm-content":
-                    for unit in task.units:
-                        LOG.info("Old all-rpm-content deleted: %s", unit.name)
+            in_flight.append(repo.remove_content(criteria=deletion_criteria))
+
+        for unit in repo.search_content(criteria=criteria):
+            counts["found"] += 1
+            batch.append(unit)
+            if len(batch) >= UNASSOCIATE_BATCH_LIMIT:
+                submit_removal(batch)
+                batch = []
+
+        if batch:
+            submit_removal(batch)
+
+        while in_flight:
+            await_removal()
+
+        return (counts["found"], counts["removed"])
 
 
 def entry_point():
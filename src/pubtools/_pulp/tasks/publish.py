@@ -4,10 +4,16 @@ import re
 from argparse import ArgumentTypeError
 from datetime import datetime
 
+try:
+    from time import monotonic
+except ImportError:  # pragma: no cover
+    from monotonic import monotonic
+
 from pubtools.pulplib import Criteria, Matcher
 
 from pubtools._pulp.task import PulpTask
 from pubtools._pulp.services import PulpClientService
+from pubtools._pulp.state import StateFile
 from pubtools._pulp.tasks.common import Publisher
 
 step = PulpTask.step
@@ -32,6 +38,43 @@ def publish_date(str_date):
     )
 
 
+class WaveState(StateFile):
+    """Progress of publishing repos in waves, persisted between runs.
+
+    Repos from completed waves are not published again. Progress is only
+    resumed when publishing with the same repo IDs and filters as the
+    interrupted run.
+    """
+
+    def __init__(self, path=None, request=None):
+        super(WaveState, self).__init__(path, request)
+
+        # IDs of repos published by completed waves.
+        self.published = set()
+
+        self.load_file()
+
+    def load(self, raw):
+        self.published = set(raw.get("published") or [])
+
+    def dump(self):
+        return {"published": sorted(self.published)}
+
+    def wave_done(self, repo_ids):
+        """Record that a wave publishing the given repos has completed."""
+        with self.lock:
+            self.published.update(repo_ids)
+            self.save()
+
+    def all_done(self):
+        """Record that all waves have completed, so the next run doesn't resume
+        this one.
+        """
+        with self.lock:
+            self.published = set()
+            self.save()
+
+
 class Publish(PulpClientService, Publisher, PulpTask):
     """Publish one or more Pulp repositories to the endpoints defined by their distributors.
 
@@ -69,6 +112,29 @@ class Publish(PulpClientService, Publisher, PulpTask):
             type=re.compile,
         )
 
+        group = self.parser.add_argument_group(
+            "Wave options",
+            "Options for publishing a large number of repos in waves.",
+        )
+
+        group.add_argument(
+            "--wave-size",
+            help=(
+                "publish at most this many repos at once, flushing caches after "
+                "each wave of repos is published"
+            ),
+            type=int,
+            default=0,
+        )
+        group.add_argument(
+            "--wave-state-file",
+            help=(
+                "with --wave-size, path of a file used to store publish progress; "
+                "if given, an interrupted run will resume from where it stopped"
+            ),
+            default=None,
+        )
+
     def _sanitize_repo_ids_args(self):
         repo_ids = []
         for item in self.args.repo_ids:
@@ -79,6 +145,13 @@ class Publish(PulpClientService, Publisher, PulpTask):
     def run(self):
         LOG.debug("Begin publishing repositories")
 
+        if self.args.wave_size > 0:
+            self._sanitize_repo_ids_args()
+            state = WaveState(self.args.wave_state_file, self.wave_request())
+            self.publish_waves(self.check_repo_ids(state.published), state)
+            LOG.info("Publishing repositories completed")
+            return
+
         # get repos applying filters
         repos = self.check_repos()
 
@@ -120,6 +193,110 @@ class Publish(PulpClientService, Publisher, PulpTask):
 
         return out
 
+    @step("Check repos")
+    def check_repo_ids(self, published=None):
+        # Like check_repos, but returns only the IDs of the repos to be published,
+        # rather than loading all the repos at once.
+        #
+        # 'published' holds IDs of repos already published by an interrupted run.
+        # Those repos may no longer match the filters, so if nothing is found
+        # it's not an error; the run was interrupted after its last wave.
+        #
+        # Distributors matching the filters are streamed from Pulp, but all the
+        # IDs are collected before anything is published. Publishing updates
+        # last_publish, which would otherwise change the results of a
+        # --published-before search while paging through them.
+        self._sanitize_repo_ids_args()
+        repo_ids = sorted(set(self._filter_repos(self.args.repo_ids)))
+
+        if not (self.args.published_before or self.args.repo_url_regex):
+            # Repos were requested explicitly, bail out if any don't exist.
+            found_repo_ids = [
+                repo.id
+                for repo in self.pulp_client.search_repository(
+                    Criteria.with_id(repo_ids)
+                )
+            ]
+            missing = sorted(set(repo_ids) - set(found_repo_ids))
+            if missing:
+                self.fail("Requested repo(s) don't exist: %s", ", ".join(missing))
+
+        if not repo_ids and not published:
+            self.fail("No repo(s) found to publish")
+
+        return repo_ids
+
+    def publish_waves(self, repo_ids, state):
+        """Publish the repos with the given IDs in waves of up to --wave-size
+        repos, waiting for each wave to be published and caches flushed before
+        starting the next.
+
+        This bounds the number of publish tasks given to Pulp at once, so that
+        republishing a large number of repos doesn't prevent other tasks from
+        being processed in the meantime.
+
+        Progress is recorded onto 'state', a WaveState.
+        """
+        if state.published:
+            LOG.info(
+                "Resuming publish, %s repo(s) already published",
+                len(state.published),
+            )
+        pending = [repo_id for repo_id in repo_ids if repo_id not in state.published]
+
+        wave_size = self.args.wave_size
+        waves = [pending[i : i + wave_size] for i in range(0, len(pending), wave_size)]
+
+        start = monotonic()
+        published = 0
+        for idx, wave_ids in enumerate(waves, 1):
+            LOG.info(
+                "Publishing wave %s of %s: %s repo(s)", idx, len(waves), len(wave_ids)
+            )
+
+            repos = list(self.pulp_client.search_repository(Criteria.with_id(wave_ids)))
+            for f in self.publish_with_cache_flush(repos):
+                f.result()
+
+            state.wave_done(wave_ids)
+            published += len(wave_ids)
+
+            elapsed = monotonic() - start
+            LOG.info(
+                "Published wave %s of %s, %s of %s repo(s) (%.1f repo(s)/min)",
+                idx,
+                len(waves),
+                published,
+                len(pending),
+                published * 60.0 / elapsed if elapsed else 0.0,
+                extra={
+                    "event": {
+                        "type": "publish-wave-end",
+                        "wave": idx,
+                        "waves": len(waves),
+                        "published": published,
+                        "total": len(pending),
+                    }
+                },
+            )
+
+        state.all_done()
+
+    def wave_request(self):
+        # Describes the repos requested for publishing in waves, so progress
+        # of an interrupted run is only resumed for the same request.
+        published_before = self.args.published_before
+        url_regex = self.args.repo_url_regex
+        return {
+            "repo_ids": sorted(set(self.args.repo_ids)),
+            "published_before": (
+                published_before.strftime("%Y-%m-%dT%H:%M:%SZ")
+                if published_before
+                else None
+            ),
+            "repo_url_regex": url_regex.pattern if url_regex else None,
+        }
+
     def fail(self, *args, **kwargs):
         LOG.error(*args, **kwargs)
         sys.exit(30)
@@ -77,6 +77,47 @@ class Push(
             "--source", action="append", help="Source(s) of content to be pushed"
         )
 
+        self.parser.add_argument(
+            "--task-derived-state",
+            action="store_true",
+            help=(
+                "Update state of items from the results of completed Pulp upload "
+                "and copy tasks rather than searching Pulp after every task; "
+                "remaining searches are batched (with --pre-push, uploaded units "
+                "are not looked up at all)"
+            ),
+        )
+
+        self.parser.add_argument(
+            "--incremental-publish",
+            action="store_true",
+            help=(
+                "Publish each repo as soon as all items for that repo are in place, "
+                "rather than waiting for all items in the push"
+            ),
+        )
+
+        self.parser.add_argument(
+            "--validate-repos",
+            action="store_true",
+            help=(
+                "Look up all Pulp repos needed by the push in bulk before uploading "
+                "any content, failing if any are missing"
+            ),
+        )
+
+        self.parser.add_argument(
+            "--modulemd-dests",
+            help=(
+                "Comma-separated list of all repos receiving modulemds in this "
+                "push; RPMs for other repos are associated without waiting for "
+                "all items to be loaded"
+            ),
+            type=str,
+            action=SplitAndExtend,
+            split_on=",",
+        )
+
     def run(self):
         # Push workflow.
         #
@@ -110,6 +151,7 @@ class Push(
                 pulp_client=self.caching_pulp_client,
                 pre_push=self.args.pre_push,
                 allow_unsigned=self.args.allow_unsigned,
+                task_derived_state=self.args.task_derived_state,
                 update_push_items=collect_phase.in_queue.put,
                 publish_with_cache_flush=self.publish_with_cache_flush,
             )
@@ -120,7 +162,13 @@ class Push(
         # Load push items from pushsource library.
         # As the first phase, this does not have an input queue as it obtains
         # its inputs from pushsource library.
-        add_phase(LoadPushItems, in_queue=None, source_urls=self.args.source)
+        add_phase(
+            LoadPushItems,
+            in_queue=None,
+            source_urls=self.args.source,
+            modulemd_dests=self.args.modulemd_dests,
+            validate_repos=self.args.validate_repos,
+        )
 
         # Ensure we have checksums for each push item. Potentially involves
         # reading content for push over NFS.
@@ -155,7 +203,7 @@ class Push(
             else:
                 # Ensure all repos are published once the desired content is present
                 # and do any post push pushitems actions.
-                add_phase(Publish)
+                add_phase(Publish, incremental=self.args.incremental_publish)
                 add_phase(PostPushActions)
 
         # We've connected up all phases of the push, now we just need to
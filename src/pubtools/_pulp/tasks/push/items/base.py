@@ -9,6 +9,7 @@ from more_executors.futures import f_map, f_flat_map, f_return, f_sequence
 from pubtools.pulplib import Unit, Criteria
 
 from ..copy import CopyOperation, asserting_all_copied_ok
+from ..upload import asserting_uploaded_ok
 
 
 # A mapping between PushItem classes and the PulpPushItem wrappers
@@ -20,6 +21,10 @@ LOG = logging.getLogger("pubtools.pulp")
 
 MAX_RETRIES = int(os.getenv("PUBTOOLS_MAX_COPY_RETRIES") or "5")
 
+# When item state is derived from task results, this fraction of the derived
+# items is still verified by searching Pulp.
+TASK_STATE_VERIFY_RATIO = float(os.getenv("PUBTOOLS_TASK_STATE_VERIFY_RATIO") or "0")
+
 
 def supports_type(pushitem_type):
     """Decorator used to define which PulpPushItem subclass implements support
@@ -33,6 +38,14 @@ def supports_type(pushitem_type):
     return fn
 
 
+def content_changed(client, change_f):
+    """Let 'client' know about a change to content made via a repository object,
+    if the client caches searches. Returns 'change_f'.
+    """
+    track = getattr(client, "track_content_change", None)
+    return track(change_f) if track else change_f
+
+
 class State(object):
     """Possible states of a push item in Pulp with respect to our workflow.
 
@@ -73,6 +86,8 @@ class UploadContext(object):
     client = attr.ib(default=None)
     random = attr.ib(default=None)
     uploads_by_key = attr.ib(default=attr.Factory(dict))
+    task_state = attr.ib(default=False)
+    refresher = attr.ib(default=None)
 
 
 @attr.s(frozen=True, slots=True)
@@ -113,6 +128,17 @@ class PulpPushItem(object):
         """
         return ""  # pragma: no cover
 
+    @property
+    def expected_upload_repos(self):
+        """IDs of the repos this item may be uploaded to, if that can be
+        determined before querying Pulp; empty otherwise. At least one of
+        these repos must exist for the upload to succeed.
+
+        Used to validate the existence of repos needed by a push before any
+        uploads start.
+        """
+        return ()
+
     @classmethod
     def for_item(cls, pushsource_item, **kwargs):
         """Given a pushsource.PushItem, returns an instance of a PulpPushItem wrapper
@@ -210,7 +236,105 @@ class PulpPushItem(object):
         return f_map(units_f, matcher)
 
     @classmethod
-    def associated_items_single_batch(cls, pulp_client, items, copy_options):
+    def items_with_copied_state(cls, pulp_client, items, copied_units_by_dest):
+        """Update state for a batch of items from the units reported by completed
+        copy tasks, rather than searching Pulp for every item.
+
+        copied_units_by_dest should be a dict mapping each destination repo ID to
+        the units which copy tasks reported as copied into that repo.
+
+        Items whose state can't be fully derived from the copy tasks (i.e. those
+        still missing some repos) are refreshed using a single Pulp query, along
+        with a random sample of the other items as controlled by
+        PUBTOOLS_TASK_STATE_VERIFY_RATIO.
+
+        Returns a Future[list] of updated items, in the same order as 'items'.
+        """
+        added_repos = [set() for _ in items]
+
+        for dest_repo_id, units in copied_units_by_dest.items():
+            idx = [
+                i
+                for (i, item) in enumerate(items)
+                if dest_repo_id in item.missing_pulp_repos
+            ]
+            matched = cls.match_items_units([items[i] for i in idx], units)
+            for i, matched_item in zip(idx, matched):
+                if matched_item.pulp_unit:
+                    added_repos[i].add(dest_repo_id)
+
+        out = []
+        verify_idx = []
+        for i, item in enumerate(items):
+            repos = sorted(set(item.in_pulp_repos) | added_repos[i])
+            item = item.with_unit(
+                attr.evolve(item.pulp_unit, repository_memberships=repos)
+            )
+            out.append(item)
+
+            if item.missing_pulp_repos or random.random() < TASK_STATE_VERIFY_RATIO:
+                verify_idx.append(i)
+
+        LOG.debug(
+            "State derived from copy tasks for %s item(s), verifying %s",
+            len(items),
+            len(verify_idx),
+        )
+
+        if not verify_idx:
+            return f_return(out)
+
+        def merge_verified(verified):
+            for i, item in zip(verify_idx, verified):
+                out[i] = item
+            return out
+
+        verified_f = cls.items_with_pulp_state_single_batch(
+            pulp_client, [out[i] for i in verify_idx]
+        )
+        return f_map(verified_f, lambda verified: merge_verified(list(verified)))
+
+    @classmethod
+    def items_with_units_resolved(cls, pulp_client, items):
+        """Resolve any units not yet fully known for a batch of items using a
+        single Pulp query. Returns a Future[list] of updated items, in the same
+        order as 'items'.
+
+        When state is derived from task results (--task-derived-state), units
+        may be missing fields which are only known to Pulp, such as unit_id.
+        Resolving those also verifies that each derived item really exists in
+        all the desired repos.
+
+        It is mandatory that all provided items are of the same unit_type.
+        The caller is responsible for ensuring this.
+        """
+        idx = [
+            i
+            for (i, item) in enumerate(items)
+            if item.unit_type
+            and item.pulp_unit is not None
+            and item.pulp_unit.unit_id is None
+        ]
+        if not idx:
+            return f_return(items)
+
+        LOG.debug("Resolving %s unit(s) in Pulp", len(idx))
+
+        def merge_resolved(resolved):
+            out = list(items)
+            for i, item in zip(idx, asserting_all_copied_ok(list(resolved))):
+                out[i] = item
+            return out
+
+        resolved_f = cls.items_with_pulp_state_single_batch(
+            pulp_client, [items[i] for i in idx]
+        )
+        return f_map(resolved_f, merge_resolved)
+
+    @classmethod
+    def associated_items_single_batch(
+        cls, pulp_client, items, copy_options, task_state=False
+    ):
         """Associate a single batch of items into destination repos.
 
         This generator yields instances of Future[list[<associated-items>]].
@@ -221,6 +345,10 @@ class PulpPushItem(object):
         target repos in Pulp. A fatal error occurs if this can't be done
         for any item in the batch. A retry mechanism is in place for those
         items that weren't possible to copy due to race conditions.
+
+        If task_state is True, the state of copied items is derived from
+        the units reported by copy tasks (see items_with_copied_state) rather
+        than by searching Pulp for all of them.
         """
         retries = 0
         unit_type = items[0].unit_type
@@ -250,11 +378,25 @@ class PulpPushItem(object):
             for f in copy_results:
                 f.add_done_callback(log_copy_done)
 
+            # A helper to gather what the (completed) copies claim to have copied.
+            def copied_units_by_dest():
+                out = {}
+                for f in copy_results:
+                    units = out.setdefault(copy_opers[f].dest_repo_id, [])
+                    for task in f.result():
+                        units.extend(task.units)
+                return out
+
             # A helper to refresh the state of each item in Pulp and make sure they
             # were copied OK.
             def refresh_after_copy(_):
                 # Get an up-to-date version of all the copy items.
-                f = cls.items_with_pulp_state_single_batch(pulp_client, copy_items)
+                if task_state:
+                    f = cls.items_with_copied_state(
+                        pulp_client, copy_items, copied_units_by_dest()
+                    )
+                else:
+                    f = cls.items_with_pulp_state_single_batch(pulp_client, copy_items)
 
                 asserting_all_copied_ok_maybe_fatal = partial(
                     asserting_all_copied_ok, fatal=retries >= MAX_RETRIES
@@ -458,20 +600,42 @@ class PulpPushItem(object):
         at least one Pulp repo, as expected after a successful upload.
         """
 
-        # Helper to verify that we've really got into at least one repo as a result
-        # of the upload.
-        def asserting_uploaded_ok(item):
-            if not item.in_pulp_repos:
-                msg = (
-                    "Fatal error: item supposedly uploaded successfully, "
-                    "but remains missing from Pulp: %s"
-                ) % item.pushsource_item
-                raise RuntimeError(msg)
-            return item
-
         out = self.with_pulp_refreshed(pulp_client)
         return f_map(out, asserting_uploaded_ok)
 
+    def with_uploaded_state(self, repo_id):
+        """Returns a copy of this item with state derived from a successful upload
+        into the given repo, without querying Pulp; or None if the state can't be
+        derived for this item.
+
+        The derived unit might lack fields which are only known to Pulp, most
+        notably unit_id. Those are resolved by the Associate phase (see
+        items_with_units_resolved); in pre-push mode, they're never resolved,
+        as nothing after the upload makes use of them.
+
+        Subclasses MAY override this to support deriving state after upload.
+        """
+        return None
+
+    def with_state_after_upload(self, ctx, repo):
+        """Returns a Future with a copy of this item with state updated after a
+        successful upload into 'repo'.
+
+        If the upload context requests task-derived state and this item supports
+        it, Pulp is not queried. Otherwise, if the upload context has a refresher,
+        the Pulp query is batched with those of other uploaded items. Otherwise,
+        this is the same as with_pulp_refreshed_after_upload.
+        """
+        if ctx.task_state:
+            out = self.with_uploaded_state(repo.id)
+            if out:
+                return f_return(out)
+
+        if ctx.refresher:
+            return ctx.refresher.refresh(self)
+
+        return self.with_pulp_refreshed_after_upload(ctx.client)
+
     def ensure_uploaded(self, ctx, repo_f=None):
         """Ensure that this item is uploaded into at least one Pulp repo.
 
@@ -515,15 +679,21 @@ class PulpPushItem(object):
                 repo_id = ctx.random.choice(self.pushsource_item.dest)
                 repo_f = ctx.client.get_repository(repo_id)
 
-            upload_f = f_flat_map(repo_f, self.upload_to_repo)
+            # The upload future resolves to the repo uploaded into, which allows
+            # state to be derived for any items sharing this upload.
+            upload_f = f_flat_map(
+                repo_f,
+                lambda repo: f_map(
+                    content_changed(ctx.client, self.upload_to_repo(repo)),
+                    lambda _: repo,
+                ),
+            )
 
             if upload_key:
                 # Cache this for later uploads having the same key
                 ctx.uploads_by_key[upload_key] = upload_f
 
-        return f_flat_map(
-            upload_f, lambda _: self.with_pulp_refreshed_after_upload(ctx.client)
-        )
+        return f_flat_map(upload_f, partial(self.with_state_after_upload, ctx))
 
     def ensure_uptodate(self, client):
         """Ensure that this item is up-to-date in Pulp.
@@ -59,13 +59,30 @@ class PulpErratumPushItem(PulpPushItem):
                 self.pushsource_item.name,
             )
             raise ErratumPushItemException
-        year = int(name_match.group(1))
-        if not any([r[0] <= year <= r[1] for r in self.CONTENT_SPLIT_RANGES]):
+        if not self.in_split_range(name_match):
             LOG.warning(
                 "%s was not in a valid date range for repo content splitting, using the default.",
                 self.pushsource_item.name,
             )
-            year = "0000"
+        return self.erratum_content_repo(name_match)
+
+    @property
+    def expected_upload_repos(self):
+        # Whether the erratum should go to all-rpm-content is only known once
+        # Pulp is queried, so either that or the repo for the erratum's year is
+        # acceptable. Unlike upload_repo, this doesn't log about bad names,
+        # since that will happen at upload time.
+        name_match = self.ADVISORY_PATTERN.match(self.pushsource_item.name)
+        if name_match:
+            return (self.erratum_content_repo(name_match), "all-rpm-content")
+        return ()
+
+    def in_split_range(self, name_match):
+        year = int(name_match.group(1))
+        return any([r[0] <= year <= r[1] for r in self.CONTENT_SPLIT_RANGES])
+
+    def erratum_content_repo(self, name_match):
+        year = int(name_match.group(1)) if self.in_split_range(name_match) else "0000"
         return "all-erratum-content-%s" % year
 
     @property
@@ -31,6 +31,13 @@ class PulpRpmPushItem(PulpPushItem):
         # Split RPMs into different repos by checksum
         return "all-rpm-content-%s" % self.pushsource_item.sha256sum[0:2]
 
+    @property
+    def expected_upload_repos(self):
+        # Only known if we already have a checksum.
+        if self.pushsource_item.sha256sum:
+            return (self.upload_repo,)
+        return ()
+
     @property
     def unit_type(self):
         return RpmUnit
@@ -138,6 +145,30 @@ class PulpRpmPushItem(PulpPushItem):
             "unit_id",
         ]
 
+    def with_uploaded_state(self, repo_id):
+        # A successful upload of an RPM results in a unit with known key fields
+        # and cdn_path, present in the upload repo, so that's what we use here.
+        # unit_id is not known until Pulp is queried.
+        if self.pulp_unit:
+            # The unit already existed (e.g. as an orphan); Pulp keeps the
+            # existing unit and adds it to the repo.
+            repos = sorted(set(self.in_pulp_repos) | set([repo_id]))
+            unit = attr.evolve(self.pulp_unit, repository_memberships=repos)
+        else:
+            (n, v, r) = self.rpm_nvr
+            arch = self.pushsource_item.name.rsplit(".", 2)[-2]
+            unit = RpmUnit(
+                name=n,
+                version=v,
+                release=r,
+                arch=arch,
+                content_type_id="srpm" if arch == "src" else "rpm",
+                sha256sum=self.pushsource_item.sha256sum,
+                cdn_path=self.cdn_path,
+                repository_memberships=[repo_id],
+            )
+        return self.with_unit(unit)
+
     def ensure_uploaded(self, ctx, repo_f=None):
         # Overridden to force our desired upload repo.
         return super(PulpRpmPushItem, self).ensure_uploaded(ctx, ctx.upload_repo)
@@ -1,5 +1,8 @@
 import logging
 from collections import defaultdict
+from functools import partial
+
+from more_executors.futures import f_flat_map
 from pubtools.pulplib import CopyOptions
 
 from .base import Phase
@@ -27,12 +30,22 @@ class Associate(Phase):
     # so we'll avoid marking it as started until then
     STARTUP_TYPE = constants.STARTUP_TYPE_NOTIFY
 
-    def __init__(self, context, pulp_client, pre_push, allow_unsigned, in_queue, **_):
+    def __init__(
+        self,
+        context,
+        pulp_client,
+        pre_push,
+        allow_unsigned,
+        in_queue,
+        task_derived_state=False,
+        **_
+    ):
         super(Associate, self).__init__(
             context, in_queue=in_queue, name="Associate items in Pulp"
         )
         self.pulp_client = pulp_client
         self.pre_push = pre_push
+        self.task_derived_state = task_derived_state
         self.copy_options = CopyOptions(require_signed_rpms=not allow_unsigned)
 
         # Used later for scheduling of rpm vs modulemd items.
@@ -52,6 +65,13 @@ class Associate(Phase):
         # repos.
 
         item_info = self.context.item_info
+        if item_info.modulemd_dests_known.is_set() and not (
+            set(item.pushsource_item.dest) & item_info.modulemd_dests
+        ):
+            # We know in advance that no modulemds go to any of this item's
+            # repos, so there's nothing to wait for.
+            return False
+
         if not item_info.items_known.is_set():
             # We don't know all the items yet => we have no choice but to do
             # the safe thing and assume we might see more modulemds, so delay
@@ -78,6 +98,15 @@ class Associate(Phase):
                 for dest in item.pushsource_item.dest:
                     self.modulemd_yielded_per_dest[dest] += 1
 
+    def split_delayed(self, items):
+        """Splits previously delayed items into those which can be handled now,
+        and those which must still be delayed."""
+        ready = []
+        delayed = []
+        for item in items:
+            (delayed if self.delay_item(item) else ready).append(item)
+        return (ready, delayed)
+
     def iter_for_associate(self):
         """A special batched iterator for this phase which ensures that RPMs
         cannot be processed until after all modulemds in the same repo.
@@ -92,21 +121,57 @@ class Associate(Phase):
 
         yield_later = []
 
-        for batch in self.iter_input_batched():
-            yield_now = []
+        if constants.COPY_COALESCE_WINDOW <= 0:
+            batches = self.iter_input_batched()
+        else:
+            # Gather up more items per batch so that each (src, dest, unit_type)
+            # needs fewer copy tasks; the resulting copies are then fanned back
+            # out to each item by associated_items_single_batch.
+            batches = self.iter_input_batched(
+                batch_size=constants.COPY_COALESCE_SIZE,
+                window=constants.COPY_COALESCE_WINDOW,
+            )
+
+        counts_known = False
+
+        for batch in batches:
+            # If we've just learned how many modulemds to expect, some delayed
+            # RPMs may be ready now.
+            item_info = self.context.item_info
+            was_counts_known = counts_known
+            counts_known = item_info.items_known.is_set()
+            recheck = counts_known and not was_counts_known
 
+            yield_now = []
             for item in batch:
                 if self.delay_item(item):
                     yield_later.append(item)
                 else:
                     yield_now.append(item)
 
-            LOG.debug("associate: %s now, %s later", len(yield_now), len(yield_later))
-
-            if yield_now:
+            # Released RPMs may make this larger than usual, so split it up
+            # if needed.
+            chunk_size = max(len(batch), self.default_batch_size)
+            while True:
+                if recheck and yield_later:
+                    (ready, yield_later) = self.split_delayed(yield_later)
+                    yield_now.extend(ready)
+                if not yield_now:
+                    break
+
+                LOG.debug(
+                    "associate: %s now, %s later", len(yield_now), len(yield_later)
+                )
                 self.notify_started()
-                yield yield_now
-                self.record_yielded(yield_now)
+                chunk = yield_now[:chunk_size]
+                yield_now = yield_now[chunk_size:]
+                yield chunk
+                self.record_yielded(chunk)
+
+                # The modulemds just handled may be the last ones which some
+                # delayed RPMs were waiting for, so check again right away
+                # rather than waiting for more input.
+                recheck = any(isinstance(item, PulpModuleMdPushItem) for item in chunk)
 
         # OK, everything other than RPMs have been seen already.
         # By this point we know that modulemds are all in the right repos (noting
@@ -125,9 +190,19 @@ class Associate(Phase):
         self.notify_started()
 
     def run(self):
+        # With task-derived state, units derived from upload tasks are resolved
+        # here, so that later phases see units with unit_id even if some of
+        # them (e.g. publish) are skipped.
+        resolve = partial(PulpPushItem.items_with_units_resolved, self.pulp_client)
+
         for batch in self.iter_for_associate():
             for items in PulpPushItem.items_by_type(batch):
                 for associated_f in PulpPushItem.associated_items_single_batch(
-                    self.pulp_client, items, self.copy_options
+                    self.pulp_client,
+                    items,
+                    self.copy_options,
+                    task_state=self.task_derived_state,
                 ):
+                    if self.task_derived_state:
+                        associated_f = f_flat_map(associated_f, resolve)
                     self.put_future_outputs(associated_f)
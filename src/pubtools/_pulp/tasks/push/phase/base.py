@@ -177,10 +177,15 @@ class Phase(object):
         for items in self.iter_input_batched(batch_size=1):
             yield items[0]
 
-    def iter_input_batched(self, batch_size=None):
+    def iter_input_batched(self, batch_size=None, window=None):
         """Get an iterable over this phase's input queue, yielding items in batches
         of the specified size.
 
+        If window is provided, each batch keeps gathering input for at least
+        this many seconds after its first input arrives, unless the batch fills
+        up sooner. This allows inputs arriving in quick succession to be
+        coalesced into a single batch.
+
         Stops iteration if the queue receives FINISHED (and does not yield that value,
         but yields the batch leading up to it).
 
@@ -211,9 +216,16 @@ class Phase(object):
 
             extend_batch()
 
+            if window:
+                # The window starts from the arrival of the first input.
+                start_time = monotonic()
+                timeout = max(timeout, window)
+
             while not batch_ready():
                 try:
-                    extend_batch(timeout)
+                    # Only wait for whatever remains of the timeout, so the
+                    # batch is ready within one timeout of it starting.
+                    extend_batch(max(start_time + timeout - monotonic(), 0))
                 except Empty:
                     # batch_ready() will now be true
                     pass
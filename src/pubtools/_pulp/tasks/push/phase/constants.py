@@ -112,3 +112,26 @@ OUT_BATCH_TIMEOUT = float(os.getenv("PUBTOOLS_PULP_OUT_BATCH_TIMEOUT") or "10.0"
 
 OUT_MAX_FUTURES = int(os.getenv("PUBTOOLS_PULP_OUT_MAX_FUTURES") or "10")
 """Max number of pending futures in output buffer."""
+
+
+COPY_COALESCE_WINDOW = float(os.getenv("PUBTOOLS_PULP_COPY_COALESCE_WINDOW") or "0")
+"""How long, in seconds, the associate phase may wait for more items after
+receiving some items to be copied, so that copies between the same pair of
+repos can be combined into a single Pulp copy task.
+
+Set to 0 (the default) to disable coalescing, in which case items are
+associated in batches as they arrive.
+"""
+
+COPY_COALESCE_SIZE = int(os.getenv("PUBTOOLS_PULP_COPY_COALESCE_SIZE") or BATCH_SIZE)
+"""Max number of items which can be combined by COPY_COALESCE_WINDOW."""
+
+
+UPLOAD_REFRESH_TIMEOUT = float(
+    os.getenv("PUBTOOLS_PULP_UPLOAD_REFRESH_TIMEOUT") or "0.5"
+)
+"""How long, in seconds, uploaded items may wait to be combined into a single
+Pulp query when refreshing their state after upload.
+
+Set to 0 to disable batching and refresh each uploaded item separately.
+"""
@@ -76,9 +76,37 @@ class ItemInfo(object):
         self.items_count = 0
         """How many items are in the push, in total."""
 
+        self.item_count_per_dest = defaultdict(int)
+        """How many items (of any type) exist per destination in the push."""
+
         self.modulemd_count_per_dest = defaultdict(int)
         """How many modulemd items exist per destination in the push."""
 
+        self.modulemd_dests = set()
+        """Destinations which may have modulemd items in the push.
+
+        Only meaningful once modulemd_dests_known is True.
+        """
+
+        self.modulemd_dests_known = Event()
+        """An event which becomes True if modulemd_dests is known in advance
+        of items_known.
+        """
+
+        self.repos_validated = None
+        """If not None, a Future resolved once all Pulp repos needed by the push
+        have been found to exist. Uploads should not start until then.
+        """
+
+    def set_modulemd_dests(self, dests):
+        """Declare, in advance, the destinations which may have modulemd items.
+
+        Any modulemd item later added with a destination outside of 'dests'
+        is an error.
+        """
+        self.modulemd_dests = set(dests)
+        self.modulemd_dests_known.set()
+
     def add_item(self, item):
         """Record an item on this object.
 
@@ -87,8 +115,21 @@ class ItemInfo(object):
         """
         self.items_count += 1
 
+        for dest in getattr(item.pushsource_item, "dest", None) or []:
+            self.item_count_per_dest[dest] += 1
+
         if isinstance(item.pushsource_item, ModuleMdPushItem):
-            for dest in item.pushsource_item.dest:
+            dests = item.pushsource_item.dest
+
+            if self.modulemd_dests_known.is_set():
+                unexpected = sorted(set(dests) - self.modulemd_dests)
+                if unexpected:
+                    raise RuntimeError(
+                        "Modulemd destination(s) not declared in advance: %s (%s)"
+                        % (", ".join(unexpected), item.pushsource_item.name)
+                    )
+
+            for dest in dests:
                 self.modulemd_count_per_dest[dest] += 1
 
 
@@ -1,10 +1,13 @@
 import logging
+from concurrent.futures import Future
+
 import attr
 
 from pushsource import Source
 
 from .base import Phase
 from ..items import PulpPushItem
+from ..repos import RepoResolver
 
 
 LOG = logging.getLogger("pubtools.pulp")
@@ -27,7 +30,17 @@ class LoadPushItems(Phase):
     - populates item_info on the context.
     """
 
-    def __init__(self, context, source_urls, allow_unsigned, pre_push, **_):
+    def __init__(
+        self,
+        context,
+        source_urls,
+        allow_unsigned,
+        pre_push,
+        modulemd_dests=None,
+        validate_repos=False,
+        pulp_client=None,
+        **_
+    ):
         super(LoadPushItems, self).__init__(
             context,
             name="Load push items",
@@ -42,6 +55,11 @@ class LoadPushItems(Phase):
         self._source_urls = source_urls
         self._allow_unsigned = allow_unsigned
         self._pre_push = pre_push
+        self._modulemd_dests = modulemd_dests
+        self._resolver = None
+        if validate_repos:
+            self._resolver = RepoResolver(pulp_client)
+            context.item_info.repos_validated = Future()
 
     def check_signed(self, item):
         if item.supports_signing and not item.is_signed and not self._allow_unsigned:
@@ -91,12 +109,20 @@ class LoadPushItems(Phase):
             yield pulp_item
 
     def run(self):
+        # Let later phases know where modulemds are going before loading items,
+        # if we've been told.
+        item_info = self.context.item_info
+        if self._modulemd_dests is not None:
+            item_info.set_modulemd_dests(self._modulemd_dests)
+
         for pulp_item in self.filtered_items:
             # Since there is no input queue, increment our input count explicitly.
             self.progress_info.incr_in()
 
             # Also record the item on the context.
             self.context.item_info.add_item(pulp_item)
+            if self._resolver:
+                self._resolver.add_item(pulp_item)
 
             self.check_signed(pulp_item)
             self.put_output(pulp_item)
@@ -105,3 +131,9 @@ class LoadPushItems(Phase):
 
         # We know by now that there are no more items to add onto the context.
         self.context.item_info.items_known.set()
+
+        if self._resolver:
+            # Ensure every needed repo exists before anything is uploaded.
+            # If this raises, the push fails without uploads having started.
+            self._resolver.resolve()
+            item_info.repos_validated.set_result(True)
@@ -1,6 +1,10 @@
 import logging
+import os
+from collections import defaultdict
 
 import attr
+from more_executors import Executors
+from more_executors.futures import f_map, f_sequence
 from pubtools.pulplib import Criteria, ErratumUnit
 
 from .base import Phase
@@ -9,6 +13,8 @@ from . import constants
 
 LOG = logging.getLogger("pubtools.pulp")
 
+PUBLISH_THREADS = int(os.getenv("PUBTOOLS_PULP_PUBLISH_THREADS") or "4")
+
 
 class Publish(Phase):
     """Publish phase.
@@ -36,15 +42,168 @@ class Publish(Phase):
     STARTUP_TYPE = constants.STARTUP_TYPE_NOTIFY
 
     def __init__(
-        self, context, pulp_client, publish_with_cache_flush, in_queue, **kwargs
+        self,
+        context,
+        pulp_client,
+        publish_with_cache_flush,
+        in_queue,
+        incremental=False,
+        **kwargs
     ):
         super(Publish, self).__init__(
             context, in_queue=in_queue, name="Publish and cache flush", **kwargs
         )
         self.pulp_client = pulp_client
         self.publish_with_cache_flush = publish_with_cache_flush
+        self.incremental = incremental
+
+    def pushed_items(self, items):
+        """Returns copies of the given items marked as PUSHED, after updating
+        them in pushcollector."""
+        out = [
+            attr.evolve(
+                item, pushsource_item=attr.evolve(item.pushsource_item, state="PUSHED")
+            )
+            for item in items
+        ]
+        self.update_push_items(out)
+        return out
+
+    def publish_repos(self, repo_ids, set_cdn_published, errata_units):
+        """Publish the given repos, including cache flushes and setting
+        cdn_published on the given units. Blocks until complete."""
+        # Locate all the repos for publish.
+        repo_fs = self.pulp_client.search_repository(Criteria.with_id(sorted(repo_ids)))
+        publish_fs = self.publish_with_cache_flush(
+            repo_fs, set_cdn_published, errata=errata_units
+        )
+        for f in publish_fs:
+            f.result()
+
+    def run_incremental(self):
+        # Like run, but without the synchronization point: each repo is published
+        # as soon as every item destined for that repo has arrived, and items are
+        # considered pushed once all their repos are published.
+        item_info = self.context.item_info
+        arrived_per_dest = defaultdict(int)
+        publish_f_by_repo = {}
+        handled_units = set()
+        pending_items = []
+        late_items = []
+        done_fs = []
+
+        def start_publish(executor, repo_ids, items):
+            self.notify_started()
+
+            set_cdn_published = set()
+            errata_units = set()
+            for item in items:
+                unit = item.pulp_unit
+                if unit in handled_units:
+                    continue
+                if hasattr(unit, "cdn_published") and unit.cdn_published is None:
+                    set_cdn_published.add(unit)
+                    handled_units.add(unit)
+                if isinstance(unit, ErratumUnit) and all(
+                    r in publish_f_by_repo or r in repo_ids
+                    for r in item.publish_pulp_repos
+                ):
+                    # Errata are flushed only along with the last of their repos.
+                    errata_units.add(unit)
+                    handled_units.add(unit)
+
+            LOG.info("Publishing repo(s) incrementally: %s", ", ".join(repo_ids))
+            publish_f = executor.submit(
+                self.publish_repos, repo_ids, set_cdn_published, errata_units
+            )
+            for repo_id in repo_ids:
+                publish_f_by_repo[repo_id] = publish_f
+
+        def complete_items(items):
+            # Returns those items which aren't yet complete, after arranging for
+            # the others to be output once their publishes are done.
+            out = []
+            by_repos = defaultdict(list)
+            for item in items:
+                repos = tuple(item.publish_pulp_repos)
+                if all(r in publish_f_by_repo for r in repos):
+                    by_repos[repos].append(item)
+                else:
+                    out.append(item)
+
+            for repos, items_for_repos in by_repos.items():
+                fs = list(set(publish_f_by_repo[r] for r in repos))
+                done_fs.append(
+                    f_map(f_sequence(fs), lambda _, out=items_for_repos: out)
+                )
+            return out
+
+        def put_done_outputs(block):
+            for f in done_fs[:]:
+                if block or f.done():
+                    for item in self.pushed_items(f.result()):
+                        self.put_output(item)
+                    done_fs.remove(f)
+
+        with Executors.thread_pool(
+            max_workers=PUBLISH_THREADS, name="pubtools-pulp-publish"
+        ) as executor:
+            for batch in self.iter_input_batched():
+                for item in batch:
+                    for dest in item.pushsource_item.dest:
+                        arrived_per_dest[dest] += 1
+
+                    if any(r in publish_f_by_repo for r in item.publish_pulp_repos):
+                        # A repo was published before this item arrived (e.g. a
+                        # repo containing an erratum being updated), so it needs
+                        # publishing again at the end.
+                        late_items.append(item)
+                    else:
+                        pending_items.append(item)
+
+                if item_info.items_known.is_set():
+                    ready = sorted(
+                        dest
+                        for (dest, count) in arrived_per_dest.items()
+                        if dest not in publish_f_by_repo
+                        and count >= item_info.item_count_per_dest[dest]
+                    )
+                    if ready:
+                        start_publish(
+                            executor,
+                            ready,
+                            [
+                                item
+                                for item in pending_items
+                                if set(ready).intersection(item.publish_pulp_repos)
+                            ],
+                        )
+                        pending_items = complete_items(pending_items)
+
+                put_done_outputs(block=False)
+
+            # Everything has arrived, so publish whatever remains.
+            final_repos = set()
+            for item in pending_items:
+                final_repos.update(
+                    r for r in item.publish_pulp_repos if r not in publish_f_by_repo
+                )
+            for item in late_items:
+                final_repos.update(item.publish_pulp_repos)
+
+            if final_repos:
+                start_publish(executor, sorted(final_repos), pending_items + late_items)
+            complete_items(pending_items + late_items)
+
+            # If there's no items at all we should still notify
+            self.notify_started()
+
+            put_done_outputs(block=True)
 
     def run(self):
+        if self.incremental:
+            return self.run_incremental()
+
         # At the time we run, it is the case that all items exist with the desired
         # state, in the desired repos. Now we need to publish affected repos.
         #
@@ -54,15 +213,14 @@ class Publish(Phase):
         # repos before we start publish of *any* repos to increase the chance that
         # all of them land at once.
         #
-        # TODO: once exodus is live, consider refactoring this to not be a
-        # synchronization point (or make it optional?) as the above motivation goes
-        # away - the CDN origin supports near-atomic update.
+        # The synchronization point may be avoided by using incremental mode
+        # (see run_incremental), as the CDN origin supports near-atomic update.
         all_repo_ids = set()
         set_cdn_published = set()
         errata_units = set()
-        all_items = []
+        all_items = list(self.iter_input())
 
-        for item in self.iter_input():
+        for item in all_items:
             all_repo_ids.update(item.publish_pulp_repos)
 
             # any unit which supports cdn_published but hasn't had it set yet should
@@ -74,34 +232,16 @@ class Publish(Phase):
             if isinstance(unit, ErratumUnit):
                 errata_units.add(unit)
 
-            all_items.append(item)
-
         # From a user's point of view, this is the point at which we are
         # starting publishes.
         self.notify_started()
 
-        # Locate all the repos for publish.
-        repo_fs = self.pulp_client.search_repository(
-            Criteria.with_id(sorted(all_repo_ids))
-        )
-
-        # Start publishing them, including cache flushes.
-        publish_fs = self.publish_with_cache_flush(
-            repo_fs, set_cdn_published, errata=errata_units
-        )
-
-        # Then wait for publishes to finish.
-        for f in publish_fs:
-            f.result()
+        # Publish all the repos, including cache flushes, and wait for that
+        # to finish.
+        self.publish_repos(all_repo_ids, set_cdn_published, errata_units)
 
         # At this stage we consider all items to be fully "pushed".
-        pushed_items = [
-            attr.evolve(
-                item, pushsource_item=attr.evolve(item.pushsource_item, state="PUSHED")
-            )
-            for item in all_items
-        ]
-        self.update_push_items(pushed_items)
+        pushed_items = self.pushed_items(all_items)
 
         # Mark as done for accurate progress logs.
         # Note we don't keep track of exactly which items got published through each
@@ -1,7 +1,11 @@
 import logging
 
+import attr
+
 from .base import Phase
+from . import constants
 from ..items import State
+from ..upload import UploadRefresher
 
 
 LOG = logging.getLogger("pubtools.pulp")
@@ -30,12 +34,39 @@ class Upload(Phase):
     # a significant event.
     UPDATES_PUSH_ITEMS = True
 
-    def __init__(self, context, pulp_client, pre_push, in_queue, **kwargs):
+    def __init__(
+        self,
+        context,
+        pulp_client,
+        pre_push,
+        in_queue,
+        task_derived_state=False,
+        **kwargs
+    ):
         super(Upload, self).__init__(
             context, in_queue=in_queue, name="Upload items to Pulp", **kwargs
         )
         self.pulp_client = pulp_client
         self.pre_push = pre_push
+        self.task_derived_state = task_derived_state
+        self.refresher = None
+        if constants.UPLOAD_REFRESH_TIMEOUT > 0:
+            # Refreshes are done as soon as every output future could be waiting
+            # on one, since no more uploads would be started until then.
+            self.refresher = UploadRefresher(
+                pulp_client,
+                timeout=constants.UPLOAD_REFRESH_TIMEOUT,
+                batch_size=min(self.default_batch_size, self.out_writer.max_futures),
+            )
+
+    def new_upload_context(self, item):
+        """Returns a new upload context for the given item."""
+        ctx = item.upload_context(self.pulp_client)
+        if self.task_derived_state:
+            ctx = attr.evolve(ctx, task_state=True)
+        if self.refresher:
+            ctx = attr.evolve(ctx, refresher=self.refresher)
+        return ctx
 
     def run(self):
         """Yields push items with item uploaded if needed, such that the item will
@@ -48,6 +79,14 @@ class Upload(Phase):
 
         upload_context = {}
 
+        repos_validated = self.context.item_info.repos_validated
+        if repos_validated:
+            # Nothing can be uploaded (or passed on to be associated) until we know
+            # that every repo needed by the push exists.
+            self.context.interruptible(
+                repos_validated.result, msg="waiting for repo validation"
+            )()
+
         for item in self.iter_input():
             if item.pulp_state in [State.IN_REPOS, State.PARTIAL, State.NEEDS_UPDATE]:
                 # This item is already in Pulp.
@@ -65,14 +104,12 @@ class Upload(Phase):
                         upload_context[item_type] = {}
                     if item.upload_repo not in upload_context[item_type]:
                         upload_context[item_type][item.upload_repo] = (
-                            item.upload_context(self.pulp_client)
+                            self.new_upload_context(item)
                         )
                     ctx = upload_context[item_type][item.upload_repo]
                 else:
                     if item_type not in upload_context:
-                        upload_context[item_type] = item.upload_context(
-                            self.pulp_client
-                        )
+                        upload_context[item_type] = self.new_upload_context(item)
                     ctx = upload_context[item_type]
                 uploading += 1
                 self.put_future_output(item.ensure_uploaded(ctx))
@@ -0,0 +1,78 @@
+"""Supporting code for resolving Pulp repos needed by a push."""
+
+import logging
+import os
+
+from pubtools.pulplib import Criteria
+
+LOG = logging.getLogger("pubtools.pulp")
+
+# Max number of repo IDs to look up in a single search.
+RESOLVE_BATCH_SIZE = int(os.getenv("PUBTOOLS_PULP_RESOLVE_BATCH_SIZE") or "1000")
+
+
+class RepoResolver(object):
+    """Collects the IDs of all Pulp repos needed by a push, then looks them up
+    with a few bulk searches.
+
+    This allows a push with a bad destination to fail before any content is
+    uploaded, and saves a request per repo when the repos are later needed.
+    """
+
+    def __init__(self, pulp_client, batch_size=RESOLVE_BATCH_SIZE):
+        self.pulp_client = pulp_client
+        self.batch_size = batch_size
+        self.repo_ids = set()
+        # Each element is a tuple of repo IDs, at least one of which must exist.
+        self.repo_choices = set()
+
+    def add_item(self, item):
+        """Record the repos needed by a push item."""
+        self.repo_ids.update(item.pushsource_item.dest or [])
+
+        upload_repos = tuple(item.expected_upload_repos)
+        if len(upload_repos) == 1:
+            self.repo_ids.add(upload_repos[0])
+        elif upload_repos:
+            self.repo_choices.add(upload_repos)
+
+    def resolve(self):
+        """Look up all recorded repos in Pulp.
+
+        Returns a dict of repos by ID. Raises if any repos are missing, with
+        an error listing all of them. Where an item may use one of several
+        repos, only one of them needs to exist.
+
+        If the Pulp client supports it, the found repos are also preloaded into
+        the client's cache.
+        """
+        repo_ids = sorted(self.repo_ids.union(*self.repo_choices))
+        found = {}
+
+        for i in range(0, len(repo_ids), self.batch_size):
+            batch = repo_ids[i : i + self.batch_size]
+            for repo in self.pulp_client.search_repository(
+                Criteria.with_id(batch)
+            ).result():
+                found[repo.id] = repo
+
+        missing = [repo_id for repo_id in self.repo_ids if repo_id not in found]
+        missing.extend(
+            [
+                " or ".join(choice)
+                for choice in self.repo_choices
+                if not any(repo_id in found for repo_id in choice)
+            ]
+        )
+        missing.sort()
+        if missing:
+            raise RuntimeError(
+                "Repo(s) needed by push are missing from Pulp: %s" % ", ".join(missing)
+            )
+
+        preload = getattr(self.pulp_client, "preload_repositories", None)
+        if preload:
+            preload(found.values())
+
+        LOG.info("Found all %s Pulp repo(s) needed by push", len(found))
+        return found
@@ -0,0 +1,124 @@
+"""Supporting code for upload operations in Pulp."""
+
+import logging
+import threading
+from concurrent.futures import Future
+
+LOG = logging.getLogger("pubtools.pulp")
+
+
+def asserting_uploaded_ok(item):
+    """Given an item which has allegedly just been uploaded:
+
+    - raises if the item is not present in any Pulp repo, or...
+    - returns the item if it's present in at least one repo
+    """
+    if not item.in_pulp_repos:
+        msg = (
+            "Fatal error: item supposedly uploaded successfully, "
+            "but remains missing from Pulp: %s"
+        ) % item.pushsource_item
+        raise RuntimeError(msg)
+    return item
+
+
+class UploadRefresher(object):
+    """Refreshes the state of items after upload, combining the Pulp queries for
+    many items into a single search per content type.
+
+    Items are collected for up to 'timeout' seconds (or until 'batch_size' items
+    are pending) and then refreshed together.
+    """
+
+    def __init__(self, pulp_client, timeout, batch_size):
+        self.pulp_client = pulp_client
+        self.timeout = timeout
+        self.batch_size = batch_size
+
+        self._lock = threading.Lock()
+        self._pending = []
+        self._timer = None
+
+    def refresh(self, item):
+        """Returns a Future with a copy of 'item', with state refreshed from Pulp
+        and asserted to be present in at least one Pulp repo.
+        """
+        out = Future()
+
+        timer = None
+        with self._lock:
+            self._pending.append((item, out))
+            if len(self._pending) >= self.batch_size:
+                (pending, timer) = self._take_pending()
+            else:
+                pending = []
+                if not self._timer:
+                    self._timer = threading.Timer(self.timeout, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+
+        self._join_timer(timer)
+        self._refresh_batch(pending)
+        return out
+
+    def flush(self):
+        """Immediately start refreshing any pending items."""
+        with self._lock:
+            (pending, timer) = self._take_pending()
+        self._join_timer(timer)
+        self._refresh_batch(pending)
+
+    def _take_pending(self):
+        # Must be called with lock held.
+        # Returns pending items and the cancelled timer, if any.
+        timer = self._timer
+        if timer:
+            timer.cancel()
+            self._timer = None
+        out = self._pending
+        self._pending = []
+        return (out, timer)
+
+    @staticmethod
+    def _join_timer(timer):
+        # Wait for a cancelled timer's thread to exit, unless we're running
+        # within that thread.
+        if timer and timer is not threading.current_thread():
+            timer.join()
+
+    def _refresh_batch(self, pending):
+        # Items can only be matched against units together if they're of
+        # the same class, so group by that.
+        by_type = {}
+        for item, item_f in pending:
+            by_type.setdefault(type(item), []).append((item, item_f))
+
+        for klass, group in by_type.items():
+            LOG.debug("Refreshing %s %s item(s) after upload", len(group), klass)
+            items = [item for (item, _) in group]
+            fs = [item_f for (_, item_f) in group]
+            refreshed_f = klass.items_with_pulp_state_single_batch(
+                self.pulp_client, items
+            )
+            refreshed_f.add_done_callback(lambda f, fs=fs: self._resolve_futures(f, fs))
+
+    def _resolve_futures(self, refreshed_f, fs):
+        try:
+            items = list(refreshed_f.result())
+        except Exception as ex:  # pylint: disable=broad-except
+            for item_f in fs:
+                item_f.set_exception(ex)
+            return
+
+        for item, item_f in zip(items, fs):
+            try:
+                item_f.set_result(asserting_uploaded_ok(item))
+            except Exception as ex:  # pylint: disable=broad-except
+                item_f.set_exception(ex)
+
+        # Nobody must be left waiting, even if fewer items came back than
+        # were requested.
+        for item_f in fs[len(items) :]:
+            item_f.set_exception(
+                RuntimeError("Item was not returned when refreshed after upload")
+            )
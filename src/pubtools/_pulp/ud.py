@@ -34,17 +34,20 @@ class UdCacheClient(object):
                 used within this class (e.g. "verify", "auth").
         """
         self._url = url
+        self._max_sleep = max_retry_sleep
         self._tls = threading.local()
+        self._session_attrs = kwargs
+        self._executor = self._new_executor()
 
+    def _new_executor(self):
         retry_args = {
-            "max_sleep": max_retry_sleep,
+            "max_sleep": self._max_sleep,
             "max_attempts": UdCacheClient._ATTEMPTS,
             "sleep": UdCacheClient._SLEEP,
             "exponent": UdCacheClient._EXPONENT,
         }
 
-        self._session_attrs = kwargs
-        self._executor = (
+        return (
             Executors.thread_pool(name="ud-client", max_workers=self._REQUEST_THREADS)
             .with_map(self._check_http_response)
             .with_retry(**retry_args)
@@ -130,3 +133,70 @@ class UdCacheClient(object):
                 A future resolved when flush has completed
         """
         return self._flush_object("erratum", erratum_id)
+
+
+class UdFlushCoordinator(object):
+    """Wraps a :class:`UdCacheClient` to avoid redundant flush requests within a task.
+
+    Provides the same flush methods as the client, but:
+
+    - a request to flush an object while an earlier flush of that object is still
+      in progress returns the future of the earlier request rather than sending
+      a new request; once a flush has completed, a later request for the same
+      object sends a new flush, since the object may have changed since then
+    - the coordinator tracks which flushes have completed successfully, so
+      callers can check whether an object has been flushed
+    - counts of requests sent and saved are kept for reporting
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._flushed = set()
+        self.requested = 0
+        self.saved = 0
+
+    def _flush(self, object_type, object_id, flush_fn):
+        key = (object_type, object_id)
+        with self._lock:
+            existing = self._pending.get(key)
+            if existing:
+                self.saved += 1
+                return existing
+
+            self.requested += 1
+            out = flush_fn(object_id)
+            self._pending[key] = out
+
+        # Not under lock, since the callback may be invoked immediately.
+        out.add_done_callback(lambda f: self._on_done(key, f))
+        return out
+
+    def _on_done(self, key, flush_f):
+        with self._lock:
+            if self._pending.get(key) is flush_f:
+                del self._pending[key]
+            if not flush_f.exception():
+                self._flushed.add(key)
+
+    def is_flushed(self, object_type, object_id):
+        """Returns True if a flush of the given object has completed successfully.
+
+        Arguments:
+            object_type (str)
+                One of "repo", "eng-product", "erratum".
+            object_id (str, int)
+                ID of the object.
+        """
+        with self._lock:
+            return (object_type, object_id) in self._flushed
+
+    def flush_product(self, product_id):
+        return self._flush("eng-product", product_id, self._client.flush_product)
+
+    def flush_repo(self, repo_id):
+        return self._flush("repo", repo_id, self._client.flush_repo)
+
+    def flush_erratum(self, erratum_id):
+        return self._flush("erratum", erratum_id, self._client.flush_erratum)
@@ -0,0 +1,166 @@
+import asyncio
+import base64
+import logging
+import os
+import ssl
+import threading
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from more_executors.futures import f_map
+
+from pubtools._pulp.ud import UdCacheClient
+
+LOG = logging.getLogger("pubtools.pulp")
+
+
+class AsyncUdCacheClient(UdCacheClient):
+    # Client for flushing UD cache, using asyncio and aiohttp for requests.
+    #
+    # Provides the same API as UdCacheClient, but rather than a small pool of
+    # threads blocking on requests and retry sleeps, all requests are handled by
+    # a single event loop thread, with many requests in flight at once over a
+    # pool of keepalive connections.
+    #
+    # Requires aiohttp to be installed.
+
+    # Max number of flush requests in flight at once.
+    _CONCURRENCY = int(os.environ.get("UDCACHE_ASYNC_CONCURRENCY", "200"))
+    # Max number of seconds to keep idle connections open.
+    _KEEPALIVE = float(os.environ.get("UDCACHE_ASYNC_KEEPALIVE", "30.0"))
+
+    def __init__(
+        self,
+        url,
+        max_retry_sleep=UdCacheClient._MAX_SLEEP,
+        concurrency=_CONCURRENCY,
+        **kwargs
+    ):
+        """Create a new UD cache flush client.
+
+        Arguments:
+            url (str)
+                Base URL of UD cache flushing API.
+            max_retry_sleep (float)
+                Max number of seconds to sleep between retries.
+            concurrency (int)
+                Max number of flush requests in flight at once.
+            kwargs
+                Supports the same "auth", "cert" and "verify" arguments as
+                requests.Session.
+        """
+        if aiohttp is None:
+            raise RuntimeError(
+                "aiohttp must be installed to use async UD cache flush "
+                "(install pubtools-pulp[udcache-async])"
+            )
+
+        super(AsyncUdCacheClient, self).__init__(
+            url, max_retry_sleep=max_retry_sleep, **kwargs
+        )
+        self._concurrency = concurrency
+
+        self._http_session = None
+        self._semaphore = None
+        self._loop = asyncio.new_event_loop()
+        self._loop_ready = threading.Event()
+        self._thread = threading.Thread(
+            name="ud-client-async", target=self._run_loop, daemon=True
+        )
+        self._thread.start()
+        self._loop_ready.wait()
+
+    def _new_executor(self):
+        # Requests are run on the event loop rather than an executor.
+        return None
+
+    def __exit__(self, *exc_details):
+        if not self._loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self._close(), self._loop).result()
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._semaphore = asyncio.Semaphore(self._concurrency)
+        self._loop.call_soon(self._loop_ready.set)
+        self._loop.run_forever()
+
+    async def _close(self):
+        if self._http_session:
+            await self._http_session.close()
+            self._http_session = None
+
+    def _new_session(self):
+        ssl_context = None
+        verify = self._session_attrs.get("verify", True)
+        cert = self._session_attrs.get("cert")
+
+        if isinstance(verify, str):
+            ssl_context = ssl.create_default_context(cafile=verify)
+        elif verify:
+            ssl_context = ssl.create_default_context()
+        else:
+            ssl_context = False
+
+        if cert:
+            if isinstance(cert, tuple):
+                ssl_context.load_cert_chain(*cert)
+            else:
+                ssl_context.load_cert_chain(cert)
+
+        headers = {}
+        auth = self._session_attrs.get("auth")
+        if auth:
+            credentials = base64.b64encode(("%s:%s" % auth).encode("utf-8"))
+            headers["Authorization"] = "Basic " + credentials.decode("ascii")
+
+        connector = aiohttp.TCPConnector(
+            limit=self._concurrency,
+            keepalive_timeout=self._KEEPALIVE,
+            ssl=ssl_context,
+        )
+        return aiohttp.ClientSession(
+            connector=connector, headers=headers, raise_for_status=True
+        )
+
+    async def _get_async(self, url):
+        if not self._http_session:
+            self._http_session = self._new_session()
+
+        sleep = min(self._SLEEP, self._max_sleep)
+        attempt = 1
+        while True:
+            try:
+                async with self._semaphore:
+                    async with self._http_session.get(url) as response:
+                        await response.read()
+                return
+            except Exception:  # pylint: disable=broad-except
+                if attempt >= self._ATTEMPTS:
+                    raise
+
+            LOG.debug("Retrying %s in %s seconds", url, sleep)
+            await asyncio.sleep(sleep)
+            sleep = min(sleep * self._EXPONENT, self._max_sleep)
+            attempt += 1
+
+    def _flush_object(self, object_type, object_id):
+        url = os.path.join(
+            self._url, "internal/rcm/flush-cache", object_type, str(object_id)
+        )
+
+        LOG.info("Invalidating %s %s", object_type, object_id)
+
+        out = asyncio.run_coroutine_threadsafe(self._get_async(url), self._loop)
+
+        # Wrap with logging on failure
+        out = f_map(
+            out, error_fn=lambda ex: self._on_failure(object_type, object_id, ex)
+        )
+
+        return out
@@ -0,0 +1,144 @@
+import logging
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future
+
+from pubtools._pulp.scheduler import BoundedStarter
+
+LOG = logging.getLogger("pubtools.pulp")
+
+# Max number of unit updates to have in flight at once.
+UPDATE_CONCURRENCY = int(os.getenv("PUBTOOLS_PULP_UPDATE_CONCURRENCY") or "20")
+
+# Number of times a failed subset of units will be retried.
+UPDATE_RETRIES = int(os.getenv("PUBTOOLS_PULP_UPDATE_RETRIES") or "2")
+
+# Progress is logged each time this many units have been updated.
+UPDATE_PROGRESS_INTERVAL = int(
+    os.getenv("PUBTOOLS_PULP_UPDATE_PROGRESS_INTERVAL") or "1000"
+)
+
+
+class UpdateJob(object):
+    # Tracks the state of a single call to ContentUpdater.update.
+    def __init__(self, units, retries):
+        self.units = units
+        self.total = len(units)
+        self.retries = retries
+        self.pending = len(units)
+        self.updated = 0
+        self.failed = []
+        self.errors = []
+        self.out = Future()
+
+
+class ContentUpdater(object):
+    """Updates mutable fields on many Pulp units with bounded concurrency.
+
+    Pulp's API only allows a single unit to be updated per request, so this
+    class does not reduce the number of requests, but it does:
+
+    - keep at most 'concurrency' updates in flight at once, so that a large
+      number of updates doesn't flood the Pulp client's request queue
+    - submit units grouped by content type
+    - log progress periodically during large updates
+    - retry only those units which failed to update, up to 'retries' times
+
+    An updater may be shared between threads; the concurrency limit applies
+    across all calls to :meth:`update`.
+    """
+
+    def __init__(
+        self,
+        pulp_client,
+        concurrency=UPDATE_CONCURRENCY,
+        retries=UPDATE_RETRIES,
+        progress_interval=UPDATE_PROGRESS_INTERVAL,
+    ):
+        self.pulp_client = pulp_client
+        self.concurrency = max(concurrency, 1)
+        self.retries = retries
+        self.progress_interval = progress_interval
+
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._starter = BoundedStarter(
+            self._lock,
+            self._take_next,
+            lambda item: self._start(*item),
+            concurrency=self.concurrency,
+        )
+
+    def update(self, units):
+        """Update the given units (already holding the desired field values) in Pulp.
+
+        Returns a Future resolved with None once all units are updated, or failing
+        with the first encountered error if any units still failed to update after
+        retries.
+        """
+        job = UpdateJob(list(units), self.retries)
+        if not job.units:
+            job.out.set_result(None)
+            return job.out
+
+        self._enqueue(job, job.units)
+        self._starter.start_more()
+        return job.out
+
+    def _enqueue(self, job, units):
+        # Units are submitted grouped by type, since Pulp handles updates to
+        # a single type more efficiently than an interleaving of many types.
+        units = sorted(units, key=lambda unit: unit.content_type_id)
+        with self._lock:
+            self._queue.extend([(job, unit) for unit in units])
+
+    def _take_next(self):
+        return self._queue.popleft() if self._queue else None
+
+    def _start(self, job, unit):
+        try:
+            update_f = self.pulp_client.update_content(unit)
+        except Exception as ex:  # pylint: disable=broad-except
+            update_f = Future()
+            update_f.set_exception(ex)
+
+        update_f.add_done_callback(lambda f: self._on_done(job, unit, f))
+
+    def _on_done(self, job, unit, update_f):
+        retry = []
+        finished = False
+        with self._lock:
+            self._starter.finished()
+            job.pending -= 1
+
+            exception = update_f.exception()
+            if exception:
+                job.failed.append(unit)
+                job.errors.append(exception)
+            else:
+                job.updated += 1
+                if self.progress_interval and (
+                    job.updated % self.progress_interval == 0
+                ):
+                    LOG.info("Updated %s of %s unit(s)", job.updated, job.total)
+
+            if not job.pending and job.failed and job.retries:
+                retry = job.failed
+                job.failed = []
+                job.errors = []
+                job.retries -= 1
+                job.pending = len(retry)
+            elif not job.pending:
+                finished = True
+
+        if retry:
+            LOG.warning("Retrying update of %s unit(s)", len(retry))
+            self._enqueue(job, retry)
+        elif finished:
+            if job.errors:
+                job.out.set_exception(job.errors[0])
+            else:
+                job.out.set_result(None)
+
+        self._starter.start_more()
@@ -1,5 +1,8 @@
+import json
 import sys
 
+import pytest
+from mock import patch
 from more_executors.futures import f_return
 
 from pubtools.pulplib import (
@@ -14,7 +17,7 @@ from pubtools.pulplib import (
 )
 
 import pubtools._pulp.tasks.clear_repo
-from pubtools._pulp.tasks.clear_repo import ClearRepo
+from pubtools._pulp.tasks.clear_repo import BatchedClear, ClearRepo
 from pubtools._pulp.ud import UdCacheClient
 
 
@@ -351,3 +354,241 @@ def test_clear_repo_multiple_content_types(command_tester, fake_collector, monke
             "build": None,
         },
     ]
+
+
+def test_clear_repo_batched(command_tester, fake_collector, monkeypatch, tmpdir):
+    """Clearing a repo in batches removes all content, one batch per task."""
+
+    # Make throughput reported in logs stable.
+    monkeypatch.setattr(pubtools._pulp.tasks.clear_repo, "monotonic", lambda: 0)
+
+    repo = FileRepository(
+        id="some-filerepo",
+        eng_product_id=123,
+        relative_url="some/publish/url",
+        mutable_urls=["mutable1", "mutable2"],
+    )
+
+    files = [
+        FileUnit(path="file%s.txt" % i, size=i, sha256sum=("%s" % i) * 64)
+        for i in range(0, 5)
+    ]
+
+    state_path = str(tmpdir.join("clear-state.json"))
+
+    with FakeClearRepo() as task_instance:
+        fakepulp = task_instance.pulp_client_controller
+        fakepulp.insert_repository(repo)
+        fakepulp.insert_units(repo, files)
+
+        # It should run with expected output.
+        command_tester.test(
+            task_instance.main,
+            [
+                "test-clear-repo",
+                "--pulp-url",
+                "https://pulp.example.com/",
+                # More than a page of results from the fake.
+                "--batch-size",
+                "4",
+                "--clear-state-file",
+                state_path,
+                "some-filerepo",
+            ],
+        )
+
+        # The repo should now be empty.
+        repo = fakepulp.client.get_repository("some-filerepo").result()
+        assert list(repo.search_content()) == []
+
+        # It should have published the repo once.
+        assert [h.repository.id for h in fakepulp.publish_history] == ["some-filerepo"]
+
+    # It should record that it removed all the files.
+    assert sorted([pi["filename"] for pi in fake_collector.items]) == [
+        "file%s.txt" % i for i in range(0, 5)
+    ]
+
+    # Progress should no longer be stored once everything completed.
+    with open(state_path) as f:
+        assert json.load(f)["repos"] == {}
+
+
+def test_clear_repo_batched_resume(
+    command_tester, fake_collector, monkeypatch, tmpdir, caplog
+):
+    """Clearing in batches resumes from progress stored by an interrupted run,
+    with push items recorded for all batches removed by either run."""
+
+    # Make throughput reported in logs stable.
+    monkeypatch.setattr(pubtools._pulp.tasks.clear_repo, "monotonic", lambda: 0)
+
+    repos = [
+        FileRepository(id="repo1", relative_url="repo1/url"),
+        FileRepository(id="repo2", relative_url="repo2/url"),
+    ]
+
+    state_path = str(tmpdir.join("clear-state.json"))
+    args = [
+        "test-clear-repo",
+        "--pulp-url",
+        "https://pulp.example.com/",
+        "--batch-size",
+        "1",
+        "--clear-state-file",
+        state_path,
+        "repo1",
+        "repo2",
+    ]
+
+    with FakeClearRepo() as task_instance:
+        fakepulp = task_instance.pulp_client_controller
+        for repo in repos:
+            fakepulp.insert_repository(repo)
+
+        fakepulp.insert_units(
+            repos[0], [FileUnit(path="one.txt", size=1, sha256sum="1" * 64)]
+        )
+        fakepulp.insert_units(
+            repos[1],
+            [
+                FileUnit(path="file%s.txt" % i, size=i, sha256sum=("%s" % i) * 64)
+                for i in range(2, 5)
+            ],
+        )
+
+        # Interrupt the first run while removing the second batch from repo2.
+        remove = BatchedClear._remove
+        repo2_batches = []
+
+        def interrupted_remove(self, units):
+            if self.repo.id == "repo2":
+                repo2_batches.append(units)
+                if len(repo2_batches) == 2:
+                    raise RuntimeError("simulated interruption")
+            return remove(self, units)
+
+        with patch.object(BatchedClear, "_remove", interrupted_remove):
+            with patch("sys.argv", args):
+                with pytest.raises(RuntimeError):
+                    task_instance.main()
+
+    # Push items should have been recorded for the batches which completed,
+    # and those batches stored as progress.
+    first_recorded = sorted([pi["filename"] for pi in fake_collector.items])
+    assert first_recorded == sorted(
+        ["one.txt", repo2_batches[0][0].path],
+    )
+    with open(state_path) as f:
+        assert json.load(f)["repos"] == {
+            "repo1": {"batches": 1, "removed": 1, "done": True},
+            "repo2": {"batches": 1, "removed": 1, "done": False},
+        }
+
+    with FakeClearRepo() as task_instance:
+        # Use the same Pulp state as the interrupted run.
+        task_instance.pulp_client_controller = fakepulp
+
+        # A unit was added to repo1 since it was cleared, so we can see whether
+        # it's searched again.
+        fakepulp.insert_units(
+            repos[0], [FileUnit(path="new.txt", size=1, sha256sum="a" * 64)]
+        )
+
+        # It should run with expected output, ignoring that of the first run.
+        caplog.clear()
+        first_published = len(fakepulp.publish_history)
+        command_tester.test(task_instance.main, args)
+
+        # repo1 wasn't cleared again, while repo2 was.
+        repo1 = fakepulp.client.get_repository("repo1").result()
+        repo2 = fakepulp.client.get_repository("repo2").result()
+        assert [u.path for u in repo1.search_content()] == ["new.txt"]
+        assert list(repo2.search_content()) == []
+
+        # Both repos should still be published.
+        published = fakepulp.publish_history[first_published:]
+        assert sorted([h.repository.id for h in published]) == ["repo1", "repo2"]
+
+    # Across both runs, every removed file was recorded exactly once.
+    assert sorted([pi["filename"] for pi in fake_collector.items]) == [
+        "file2.txt",
+        "file3.txt",
+        "file4.txt",
+        "one.txt",
+    ]
+
+
+def test_clear_repo_negative_batch_size(capsys):
+    """A negative --batch-size is rejected."""
+
+    with FakeClearRepo() as task_instance:
+        args = [
+            "test-clear-repo",
+            "--pulp-url",
+            "https://pulp.example.com/",
+            "--batch-size",
+            "-1",
+            "some-filerepo",
+        ]
+        with patch("sys.argv", args):
+            with pytest.raises(SystemExit) as excinfo:
+                task_instance.main()
+
+    assert excinfo.value.code == 2
+    assert "invalid batch_size value: '-1'" in capsys.readouterr().err
+
+
+def test_clear_repo_batched_other_request(
+    command_tester, fake_collector, monkeypatch, tmpdir
+):
+    """Clearing in batches ignores progress stored by a run for other repos."""
+
+    # Make throughput reported in logs stable.
+    monkeypatch.setattr(pubtools._pulp.tasks.clear_repo, "monotonic", lambda: 0)
+
+    repo = FileRepository(id="repo1", relative_url="repo1/url")
+
+    state_path = str(tmpdir.join("clear-state.json"))
+    with open(state_path, "w") as f:
+        json.dump(
+            {
+                "request": {"repo": ["repo1", "repo2"], "content_type": None},
+                "repos": {"repo1": {"batches": 1, "removed": 1, "done": True}},
+            },
+            f,
+        )
+
+    with FakeClearRepo() as task_instance:
+        fakepulp = task_instance.pulp_client_controller
+        fakepulp.insert_repository(repo)
+        fakepulp.insert_units(
+            repo, [FileUnit(path="new.txt", size=1, sha256sum="a" * 64)]
+        )
+
+        # It should run with expected output.
+        command_tester.test(
+            task_instance.main,
+            [
+                "test-clear-repo",
+                "--pulp-url",
+                "https://pulp.example.com/",
+                "--batch-size",
+                "10",
+                "--clear-state-file",
+                state_path,
+                "repo1",
+            ],
+        )
+
+        # repo1 was cleared again, since the stored progress was for a run
+        # clearing other repos.
+        repo = fakepulp.client.get_repository("repo1").result()
+        assert list(repo.search_content()) == []
+
+    # Progress should now be stored for this run's request.
+    with open(state_path) as f:
+        assert json.load(f) == {
+            "request": {"repo": ["repo1"], "content_type": None},
+            "repos": {},
+        }
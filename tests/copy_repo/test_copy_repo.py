@@ -1,3 +1,7 @@
+from concurrent.futures import Future
+
+import pytest
+from mock import patch
 from more_executors.futures import f_return
 from pubtools.pulplib import (
     Client,
@@ -539,3 +543,238 @@ def test_copy_repo_criteria(command_tester):
             ]
         )
         assert criteria == expected_criteria
+
+
+def test_copy_repo_diff(command_tester, fake_collector, monkeypatch):
+    """Copying with --diff copies only the units missing from destination."""
+
+    # Use small chunks so that multiple copies are needed.
+    monkeypatch.setattr(pubtools._pulp.tasks.copy_repo, "DIFF_COPY_CHUNK_SIZE", 2)
+
+    repoA = FileRepository(id="some-filerepo", relative_url="some/publish/url")
+    repoB = FileRepository(id="another-filerepo", relative_url="another/publish/url")
+
+    files = [
+        FileUnit(path="file%s.txt" % i, size=i, sha256sum=("%s" % i) * 64)
+        for i in range(0, 5)
+    ]
+
+    with FakeCopyRepo() as task_instance:
+        fakepulp = task_instance.pulp_client_controller
+        fakepulp.insert_repository(repoA)
+        fakepulp.insert_repository(repoB)
+        fakepulp.insert_units(repoA, files)
+        # Destination already has some of the files.
+        fakepulp.insert_units(repoB, files[1:3])
+
+        copies = []
+        copy_content = fakepulp.client.copy_content
+
+        def spy_copy(*args, **kwargs):
+            copies.append(kwargs.get("criteria"))
+            return copy_content(*args, **kwargs)
+
+        monkeypatch.setattr(fakepulp.client, "copy_content", spy_copy)
+
+        # It should run with expected output.
+        command_tester.test(
+            task_instance.main,
+            [
+                "test-copy-repo",
+                "--pulp-url",
+                "https://pulp.example.com/",
+                "--content-type",
+                "iso",
+                "--diff",
+                "some-filerepo,another-filerepo",
+            ],
+        )
+
+        # It should have copied the 3 missing files in 2 chunks.
+        assert len(copies) == 2
+
+        # Destination should now have all the files.
+        dest = fakepulp.client.get_repository("another-filerepo").result()
+        assert sorted([unit.path for unit in dest.search_content()]) == [
+            "file0.txt",
+            "file1.txt",
+            "file2.txt",
+            "file3.txt",
+            "file4.txt",
+        ]
+
+    # It should record only the copied files as pushed.
+    assert sorted([pi["filename"] for pi in fake_collector.items]) == [
+        "file0.txt",
+        "file3.txt",
+        "file4.txt",
+    ]
+
+
+def test_copy_repo_diff_requires_content_type(capsys):
+    """Copying with --diff fails if no content types are given."""
+
+    with FakeCopyRepo() as task_instance:
+        args = [
+            "test-copy-repo",
+            "--pulp-url",
+            "https://pulp.example.com/",
+            "--diff",
+            "some-filerepo,another-filerepo",
+        ]
+        with patch("sys.argv", args):
+            with pytest.raises(SystemExit) as excinfo:
+                task_instance.main()
+
+    assert excinfo.value.code == 2
+    assert "--diff requires --content-type" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize(
+    "extra_args, pairs, copy_count",
+    [
+        (
+            ["--content-type", "rpm,erratum,modulemd_defaults"],
+            [("src1", "dest1")],
+            3,
+        ),
+        (
+            ["--content-type", "iso", "--diff"],
+            [("src1", "dest1"), ("src2", "dest1")],
+            2,
+        ),
+    ],
+    ids=["content-types", "diff"],
+)
+def test_copy_repo_one_copy_per_dest(extra_args, pairs, copy_count):
+    """Copies into the same destination repo run one after another."""
+
+    repos = [
+        FileRepository(id=repo_id, relative_url="%s/publish/url" % repo_id)
+        for repo_id in ["src1", "src2", "dest1"]
+    ]
+    files = [FileUnit(path="file.txt", size=1, sha256sum="a" * 64)]
+
+    with FakeCopyRepo() as task_instance:
+        fakepulp = task_instance.pulp_client_controller
+        for repo in repos:
+            fakepulp.insert_repository(repo)
+        fakepulp.insert_units(repos[0], files)
+        fakepulp.insert_units(repos[1], files)
+
+        pending = []
+
+        def held_copy(src_repo, dest_repo, criteria=None):
+            f = Future()
+            pending.append(f)
+            return f
+
+        args = ["test-copy-repo", "--pulp-url", "https://pulp.example.com/"]
+        args.extend(extra_args)
+        args.extend(["%s,%s" % pair for pair in pairs])
+
+        with patch("sys.argv", args):
+            with patch.object(fakepulp.client, "copy_content", held_copy):
+                repo_pairs = task_instance.get_repos()
+                copies = task_instance.copy_content(repo_pairs)
+
+                # Only one copy should be started at a time, the next
+                # starting as each completes.
+                for _ in range(copy_count):
+                    assert len([f for f in pending if not f.done()]) == 1
+                    pending[-1].set_result([])
+
+        assert len(pending) == copy_count
+        for copy in copies:
+            assert copy.result().tasks == []
+
+
+def test_copy_repo_multiple_pairs(command_tester, fake_collector, monkeypatch):
+    """Copying several pairs sharing a destination repo merges criteria where
+    possible and publishes each destination repo once."""
+
+    repos = [
+        YumRepository(
+            id=repo_id,
+            relative_url="%s/publish/url" % repo_id,
+            mutable_urls=["repomd.xml"],
+        )
+        for repo_id in ["src1", "src2", "dest1", "dest2"]
+    ]
+
+    with FakeCopyRepo() as task_instance:
+        fakepulp = task_instance.pulp_client_controller
+        for repo in repos:
+            fakepulp.insert_repository(repo)
+
+        fakepulp.insert_units(
+            repos[0],
+            [
+                RpmUnit(
+                    name="bash",
+                    version="1.23",
+                    release="1.test8",
+                    arch="x86_64",
+                    sha256sum="a" * 64,
+                    md5sum="b" * 32,
+                    signing_key="aabbcc",
+                ),
+                ErratumUnit(id="RHSA-2021:0672"),
+            ],
+        )
+        fakepulp.insert_units(repos[1], [ErratumUnit(id="RHSA-2021:0673")])
+
+        copies = []
+        copy_content = fakepulp.client.copy_content
+
+        def spy_copy(src_repo, dest_repo, criteria=None):
+            copies.append((src_repo.id, dest_repo.id, str(criteria)))
+            return copy_content(src_repo, dest_repo, criteria=criteria)
+
+        monkeypatch.setattr(fakepulp.client, "copy_content", spy_copy)
+
+        # It should run with expected output.
+        command_tester.test(
+            task_instance.main,
+            [
+                "test-copy-repo",
+                "--pulp-url",
+                "https://pulp.example.com/",
+                "--content-type",
+                "rpm",
+                "--content-type",
+                "erratum",
+                "--content-type",
+                "modulemd_defaults",
+                "src1,dest1",
+                "src2,dest1",
+                "src1,dest2",
+            ],
+        )
+
+        # There should be one copy per content type for each pair.
+        assert len(copies) == 9
+        assert sorted(set([c[2] for c in copies])) == [
+            "(content_type_id IN ['erratum'])",
+            "(content_type_id IN ['modulemd_defaults'])",
+            "(content_type_id IN ['rpm', 'srpm'])",
+        ]
+
+        # Each destination should have been published once.
+        assert sorted([h.repository.id for h in fakepulp.publish_history]) == [
+            "dest1",
+            "dest2",
+        ]
+
+        dest1 = fakepulp.client.get_repository("dest1").result()
+        assert sorted([u.unit_id for u in dest1.search_content()]) == sorted(
+            [u.unit_id for u in fakepulp.client.search_content()]
+        )
+
+    assert sorted([(pi["dest"], pi["filename"]) for pi in fake_collector.items]) == [
+        ("dest1", "RHSA-2021:0672"),
+        ("dest1", "RHSA-2021:0673"),
+        ("dest1", "bash-1.23-1.test8.x86_64.rpm"),
+        ("dest2", "RHSA-2021:0672"),
+        ("dest2", "bash-1.23-1.test8.x86_64.rpm"),
+    ]
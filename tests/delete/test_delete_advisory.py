@@ -1,3 +1,5 @@
+import pytest
+from mock import patch
 from more_executors.futures import f_return
 
 from pubtools.pulplib import (
@@ -16,6 +18,7 @@ from pubtools.pulplib import (
 
 from pubtools._pulp.ud import UdCacheClient
 
+from pubtools._pulp.tasks import delete
 from pubtools._pulp.tasks.delete import Delete
 
 
@@ -621,3 +624,134 @@ def test_advisory_not_found(command_tester):
                 "RHSA-1111:22",
             ],
         )
+
+
+@pytest.mark.parametrize("chunk_size, rpm_searches", [(500, 1), (2, 2)])
+def test_delete_multiple_advisories_combined(
+    fake_collector, monkeypatch, chunk_size, rpm_searches
+):
+    """Content of multiple advisories is searched and removed together, keeping
+    the usual steps for RPMs and modules"""
+
+    monkeypatch.setattr(delete, "SEARCH_CHUNK_SIZE", chunk_size)
+
+    repo = YumRepository(id="some-yumrepo", relative_url="some/publish/url")
+
+    def rpm(name):
+        return RpmUnit(
+            name=name,
+            version="1.23",
+            release="1.test8",
+            arch="x86_64",
+            filename="%s-1.23-1.test8_x86_64.rpm" % name,
+            sha256sum="a" * 64,
+            md5sum="b" * 32,
+            signing_key="aabbcc",
+        )
+
+    def package(name):
+        return ErratumPackage(
+            name=name,
+            version="1.23",
+            release="1.test8",
+            arch="x86_64",
+            filename="%s-1.23-1.test8_x86_64.rpm" % name,
+            sha256sum="a" * 64,
+            md5sum="b" * 32,
+        )
+
+    units = [
+        rpm("bash"),
+        rpm("dash"),
+        rpm("zsh"),
+        rpm("crash"),
+        ModulemdUnit(
+            name="mymod",
+            stream="s1",
+            version=123,
+            context="a1c2",
+            arch="s390x",
+            artifacts=["crash-0:1.23-1.test8_x86_64"],
+        ),
+        ErratumUnit(
+            id="RHSA-1111:22",
+            pkglist=[
+                ErratumPackageCollection(
+                    name="collection-0",
+                    packages=[package("bash"), package("dash")],
+                    module=ErratumModule(
+                        name="mymod",
+                        stream="s1",
+                        version="123",
+                        context="a1c2",
+                        arch="s390x",
+                    ),
+                )
+            ],
+        ),
+        ErratumUnit(
+            id="RHBA-1001:22",
+            pkglist=[
+                ErratumPackageCollection(
+                    name="collection-1",
+                    packages=[package("dash"), package("zsh")],
+                )
+            ],
+        ),
+    ]
+
+    with FakeDeleteAdvisory() as task_instance:
+        task_instance.pulp_client_controller.insert_repository(repo)
+        task_instance.pulp_client_controller.insert_units(repo, units)
+
+        searches = []
+        search_content = task_instance.search_content
+
+        def spy_search(criteria):
+            searches.append(criteria)
+            return search_content(criteria)
+
+        removed = []
+        log_remove = task_instance.log_remove
+
+        def spy_log_remove(removed_repo):
+            removed.append(removed_repo.repo.id)
+            return log_remove(removed_repo)
+
+        args = [
+            "test-delete",
+            "--pulp-url",
+            "https://pulp.example.com/",
+            "--repo",
+            "some-yumrepo",
+            "--advisory",
+            "RHSA-1111:22,RHBA-1001:22",
+        ]
+        with patch("sys.argv", args):
+            with patch.object(task_instance, "search_content", spy_search):
+                with patch.object(task_instance, "log_remove", spy_log_remove):
+                    task_instance.main()
+
+        # Advisories, modules and the module's artifacts should each have been
+        # found with a single search, and RPMs from all advisories in as many
+        # searches as needed for the chunk size.
+        assert len(searches) == 3 + rpm_searches
+
+        # There should have been one removal of RPMs from all advisories, one
+        # of the module's artifacts and one of modules.
+        assert removed == ["some-yumrepo", "some-yumrepo", "some-yumrepo"]
+
+        # Every RPM and module should have been removed, with only the
+        # advisories remaining in the repo.
+        repo = task_instance.pulp_client.get_repository("some-yumrepo").result()
+        assert sorted([u.content_type_id for u in repo.search_content()]) == [
+            "erratum",
+            "erratum",
+        ]
+        assert sorted([item["filename"] for item in fake_collector.items]) == [
+            "bash-1.23-1.test8.x86_64.rpm",
+            "crash-1.23-1.test8.x86_64.rpm",
+            "dash-1.23-1.test8.x86_64.rpm",
+            "mymod:s1:123:a1c2:s390x",
+            "zsh-1.23-1.test8.x86_64.rpm",
+        ]
@@ -1,3 +1,6 @@
+from concurrent.futures import Future
+
+from mock import patch
 from more_executors.futures import f_return
 from pubtools.pulplib import (
     Client,
@@ -11,7 +14,7 @@ from pubtools.pulplib import (
     YumRepository,
 )
 
-from pubtools._pulp.tasks.delete import Delete, entry_point
+from pubtools._pulp.tasks.delete import Delete, RemoveUnitItem, entry_point
 from pubtools._pulp.ud import UdCacheClient
 
 
@@ -1041,3 +1044,237 @@ def test_delete_rpms_with_all_repos(command_tester, fake_collector, monkeypatch)
     # ... unless specified as an extra --repo arg.
     result4 = list(r_arc_2.search_content(search_criteria).result())
     assert len(result4) == 1
+
+
+def test_delete_module_artifacts_concurrently():
+    """RPMs from each module are deleted without waiting on other modules."""
+
+    modules = [
+        RemoveUnitItem(
+            unit=ModulemdUnit(
+                name=name,
+                stream="s1",
+                version=123,
+                context="a1c2",
+                arch="x86_64",
+                artifacts=["%s-0:1.23-1.test8_x86_64" % name],
+            ),
+            repos=["some-yumrepo"],
+        )
+        for name in ("mod1", "mod2")
+    ]
+
+    pending = []
+
+    def delete_rpms(repos, rpms_info, signing_keys):
+        pending.append(Future())
+        return pending[-1]
+
+    with FakeDeletePackages() as task_instance:
+        args = ["", "--pulp-url", "https://pulp.example.com/"]
+        with patch("sys.argv", args):
+            assert task_instance.args
+
+        with patch.object(task_instance, "delete_rpms", delete_rpms):
+            out = task_instance.remove_mod_artifacts(
+                modules, repos=["some-yumrepo"], signing_keys=None
+            )
+
+        # Deletion should have started for both modules, without waiting
+        # for either of them to complete.
+        assert len(pending) == 2
+        assert not out.done()
+
+        pending[1].set_result(["cleared2"])
+        pending[0].set_result(["cleared1"])
+
+        # The result combines the deletions from all modules.
+        assert out.result() == ["cleared1", "cleared2"]
+
+
+def test_delete_rpms_skip_unassociate(fake_collector):
+    """Deleting RPMs with unassociate skipped leaves repos untouched"""
+
+    repo = YumRepository(id="some-yumrepo", relative_url="some/publish/url")
+    rpm = RpmUnit(
+        name="bash",
+        version="1.23",
+        release="1.test8",
+        arch="x86_64",
+        filename="bash-1.23-1.test8_x86_64.rpm",
+        sha256sum="a" * 64,
+        md5sum="b" * 32,
+        signing_key="aabbcc",
+        unit_id="rpm1",
+    )
+
+    with FakeDeletePackages() as task_instance:
+        task_instance.pulp_client_controller.insert_repository(repo)
+        task_instance.pulp_client_controller.insert_units(repo, [rpm])
+
+        args = [
+            "test-delete",
+            "--pulp-url",
+            "https://pulp.example.com/",
+            "--repo",
+            "some-yumrepo",
+            "--file",
+            "bash-1.23-1.test8_x86_64.rpm",
+            "--signing-key",
+            "aabbcc",
+            "--skip",
+            "unassociate-rpms",
+        ]
+        with patch("sys.argv", args):
+            task_instance.main()
+
+        # Nothing was removed or recorded, and there was nothing to publish.
+        repo = task_instance.pulp_client.get_repository("some-yumrepo").result()
+        assert len(list(repo.search_content())) == 1
+        assert fake_collector.items == []
+        assert task_instance.pulp_client_controller.publish_history == []
+
+
+def test_delete_files_skip_unassociate(fake_collector):
+    """Deleting files with unassociate skipped leaves repos untouched"""
+
+    repo = FileRepository(id="some-filerepo", relative_url="some/publish/url")
+    unit = FileUnit(path="hello.iso", size=123, sha256sum="a" * 64, unit_id="file1")
+
+    with FakeDeletePackages() as task_instance:
+        task_instance.pulp_client_controller.insert_repository(repo)
+        task_instance.pulp_client_controller.insert_units(repo, [unit])
+
+        args = [
+            "test-delete",
+            "--pulp-url",
+            "https://pulp.example.com/",
+            "--repo",
+            "some-filerepo",
+            "--file",
+            "hello.iso",
+            "--skip",
+            "unassociate-files",
+        ]
+        with patch("sys.argv", args):
+            task_instance.main()
+
+        # Nothing was removed or recorded, and there was nothing to publish.
+        repo = task_instance.pulp_client.get_repository("some-filerepo").result()
+        assert len(list(repo.search_content())) == 1
+        assert fake_collector.items == []
+        assert task_instance.pulp_client_controller.publish_history == []
+
+
+def test_delete_modules_skip_unassociate(fake_collector):
+    """Deleting modules with unassociate skipped still removes their artifacts,
+    but leaves the modules in place"""
+
+    repo = YumRepository(id="some-yumrepo", relative_url="some/publish/url")
+    rpm = RpmUnit(
+        name="bash",
+        version="1.23",
+        release="1.test8",
+        arch="x86_64",
+        filename="bash-1.23-1.test8_x86_64.rpm",
+        sha256sum="a" * 64,
+        md5sum="b" * 32,
+        signing_key="aabbcc",
+        unit_id="rpm1",
+    )
+    module = ModulemdUnit(
+        name="mymod",
+        stream="s1",
+        version=123,
+        context="a1c2",
+        arch="x86_64",
+        artifacts=["bash-0:1.23-1.test8_x86_64"],
+        unit_id="module1",
+    )
+
+    with FakeDeletePackages() as task_instance:
+        task_instance.pulp_client_controller.insert_repository(repo)
+        task_instance.pulp_client_controller.insert_units(repo, [rpm, module])
+
+        args = [
+            "test-delete",
+            "--pulp-url",
+            "https://pulp.example.com/",
+            "--repo",
+            "some-yumrepo",
+            "--file",
+            "mymod:s1:123:a1c2:x86_64",
+            "--signing-key",
+            "aabbcc",
+            "--skip",
+            "unassociate-modules",
+        ]
+        with patch("sys.argv", args):
+            task_instance.main()
+
+        # Only the module remains.
+        repo = task_instance.pulp_client.get_repository("some-yumrepo").result()
+        assert [unit.unit_id for unit in repo.search_content()] == ["module1"]
+
+        # Only the artifact was recorded as deleted.
+        assert [item["filename"] for item in fake_collector.items] == [
+            "bash-1.23-1.test8.x86_64.rpm"
+        ]
+
+        # The repo was still published, since the artifact was removed.
+        assert [
+            hist.repository.id
+            for hist in task_instance.pulp_client_controller.publish_history
+        ] == ["some-yumrepo"]
+
+
+def test_delete_skip_modules_keeps_rpms(fake_collector):
+    """Skipping deletion of modules still deletes requested RPMs"""
+
+    repo = YumRepository(id="some-yumrepo", relative_url="some/publish/url")
+    rpm = RpmUnit(
+        name="bash",
+        version="1.23",
+        release="1.test8",
+        arch="x86_64",
+        filename="bash-1.23-1.test8_x86_64.rpm",
+        sha256sum="a" * 64,
+        md5sum="b" * 32,
+        signing_key="aabbcc",
+        unit_id="rpm1",
+    )
+    module = ModulemdUnit(
+        name="mymod",
+        stream="s1",
+        version=123,
+        context="a1c2",
+        arch="x86_64",
+        unit_id="module1",
+    )
+
+    with FakeDeletePackages() as task_instance:
+        task_instance.pulp_client_controller.insert_repository(repo)
+        task_instance.pulp_client_controller.insert_units(repo, [rpm, module])
+
+        args = [
+            "test-delete",
+            "--pulp-url",
+            "https://pulp.example.com/",
+            "--repo",
+            "some-yumrepo",
+            "--file",
+            "bash-1.23-1.test8_x86_64.rpm,mymod:s1:123:a1c2:x86_64",
+            "--signing-key",
+            "aabbcc",
+            "--skip",
+            "delete-modules",
+        ]
+        with patch("sys.argv", args):
+            task_instance.main()
+
+        # Only the module remains.
+        repo = task_instance.pulp_client.get_repository("some-yumrepo").result()
+        assert [unit.unit_id for unit in repo.search_content()] == ["module1"]
+        assert [item["filename"] for item in fake_collector.items] == [
+            "bash-1.23-1.test8.x86_64.rpm"
+        ]
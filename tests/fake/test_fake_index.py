@@ -0,0 +1,151 @@
+import attr
+import pytest
+from pubtools.pulplib import (
+    Criteria,
+    ErratumUnit,
+    FakeController,
+    FileRepository,
+    FileUnit,
+    Matcher,
+    RpmUnit,
+    YumRepository,
+)
+
+from pubtools._pulp.services.fakeindex import IndexedFakeController
+
+
+def populate(controller):
+    yum_repo = YumRepository(id="yum-repo")
+    file_repo = FileRepository(id="file-repo")
+    controller.insert_repository(yum_repo)
+    controller.insert_repository(file_repo)
+
+    controller.insert_units(
+        yum_repo,
+        [
+            RpmUnit(
+                name="rpm%s" % i,
+                version="1",
+                release="1",
+                arch="noarch",
+                filename="rpm%s-1-1.noarch.rpm" % i,
+                sha256sum="%s" % i * 64,
+            )
+            for i in range(0, 5)
+        ]
+        + [ErratumUnit(id="RHBA-0000:%s" % i) for i in range(0, 3)],
+    )
+    controller.insert_units(
+        file_repo,
+        [
+            FileUnit(path="file%s" % i, size=1, sha256sum="%s" % i * 64)
+            for i in range(0, 5)
+        ],
+    )
+    # An orphan which can be found by searching content.
+    controller.insert_units(
+        None,
+        [FileUnit(path="orphan", size=1, sha256sum="a" * 64)],
+    )
+
+
+CRITERIA = [
+    Criteria.with_field("sha256sum", "1" * 64),
+    Criteria.with_field("sha256sum", Matcher.in_(["2" * 64, "3" * 64, "x"])),
+    Criteria.with_field("filename", "rpm4-1-1.noarch.rpm"),
+    Criteria.and_(
+        Criteria.with_unit_type(FileUnit), Criteria.with_field("path", "orphan")
+    ),
+    Criteria.and_(
+        Criteria.with_unit_type(ErratumUnit),
+        Criteria.with_id(["RHBA-0000:1", "RHBA-0000:2"]),
+    ),
+    Criteria.with_field("filename", None),
+    Criteria.and_(
+        Criteria.with_unit_type(RpmUnit),
+        Criteria.with_field("sha256sum", Matcher.in_(["1" * 64, "2" * 64])),
+    ),
+    Criteria.and_(
+        Criteria.with_field("filename", "rpm1-1-1.noarch.rpm"),
+        Criteria.with_field("sha256sum", "2" * 64),
+    ),
+    Criteria.or_(
+        Criteria.with_field("sha256sum", "0" * 64),
+        Criteria.with_field("filename", "rpm3-1-1.noarch.rpm"),
+    ),
+    # Not indexable; falls back to scanning.
+    Criteria.or_(
+        Criteria.with_field("sha256sum", "0" * 64),
+        Criteria.with_field("name", "rpm3"),
+    ),
+    Criteria.with_field("name", Matcher.regex("rpm")),
+    Criteria.true(),
+]
+
+
+def unit_ids(units):
+    return sorted([unit.unit_id for unit in units])
+
+
+@pytest.mark.parametrize("criteria", CRITERIA)
+def test_search_same_as_fake(criteria):
+    """Indexed fake gives the same search results as the plain fake."""
+    plain = FakeController()
+    indexed = IndexedFakeController()
+    populate(plain)
+    populate(indexed)
+
+    expected = list(plain.client.search_content(criteria))
+    actual = list(indexed.client.search_content(criteria))
+    assert unit_ids(actual) == unit_ids(expected)
+
+    for repo_id in ("yum-repo", "file-repo"):
+        expected = plain.client.get_repository(repo_id).search_content(criteria)
+        actual = indexed.client.get_repository(repo_id).search_content(criteria)
+        assert unit_ids(actual) == unit_ids(expected)
+
+
+def test_index_narrows_search():
+    """Index only yields candidates matching indexed fields."""
+    controller = IndexedFakeController()
+    populate(controller)
+
+    # pylint: disable=protected-access
+    index = controller._state.units_by_key
+
+    keys = index.candidate_keys(
+        Criteria.with_field("sha256sum", Matcher.in_(["1" * 64, "a" * 64]))
+    )
+    # It should have found the RPM and file with the checksum, and the orphan.
+    assert sorted([index[key].sha256sum for key in keys]) == [
+        "1" * 64,
+        "1" * 64,
+        "a" * 64,
+    ]
+
+    # Can't narrow on non-indexed fields.
+    assert index.candidate_keys(Criteria.with_field("name", "rpm1")) is None
+
+
+def test_index_follows_updates():
+    """Index is kept up-to-date as units are updated and removed."""
+    controller = IndexedFakeController()
+    populate(controller)
+    client = controller.client
+
+    crit = Criteria.and_(
+        Criteria.with_unit_type(FileUnit), Criteria.with_field("path", "file1")
+    )
+    [unit] = list(client.search_content(crit))
+
+    # Update a mutable field; the updated unit should be found.
+    client.update_content(attr.evolve(unit, cdn_path="/some/path")).result()
+    [unit] = list(client.search_content(crit))
+    assert unit.cdn_path == "/some/path"
+
+    # Remove it from the repo; it should no longer be found in the repo, but
+    # still exists as an orphan.
+    repo = client.get_repository("file-repo").result()
+    repo.remove_content(criteria=crit).result()
+    assert list(repo.search_content(crit)) == []
+    assert len(list(client.search_content(crit))) == 1
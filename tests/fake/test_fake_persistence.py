@@ -1,9 +1,21 @@
+import datetime
+import json
 import os
+import sys
 
+import attr
 from pubtools.pluggy import task_context
-from pubtools.pulplib import ModulemdDefaultsUnit, ModulemdUnit
+from pubtools.pulplib import (
+    Criteria,
+    FakeController,
+    FileRepository,
+    FileUnit,
+    ModulemdDefaultsUnit,
+    ModulemdUnit,
+)
 
-from pubtools._pulp.services.fakepulp import new_fake_controller
+from pubtools._pulp.services import fakepulp
+from pubtools._pulp.services.fakepulp import PersistentFake, new_fake_controller
 
 
 def new_fake_client(state_path):
@@ -93,3 +105,175 @@ def test_state_clean(tmpdir):
     # (And just to sanity check that this kind of test makes sense, see that
     # other non-default fields are present.)
     assert "id: all-rpm-content" in persisted_raw
+
+
+def test_state_persisted_jsonl(tmpdir, data_path):
+    """Fake client can save/load state in JSON lines format, appending only
+    changed units."""
+    state_path = str(tmpdir.join("state/pulpfake.jsonl"))
+    module_file = os.path.join(data_path, "sample-modules.yaml")
+
+    with task_context():
+        controller = new_fake_controller(state_path)
+        repo = controller.client.get_repository("all-iso-content")
+        controller.insert_units(
+            repo.result(),
+            [
+                FileUnit(
+                    path="some-file",
+                    size=1,
+                    sha256sum="a" * 64,
+                    cdn_published=datetime.datetime(2024, 1, 2, 3, 4, 5),
+                )
+            ],
+        )
+        repo = controller.client.get_repository("all-rpm-content")
+        repo.upload_modules(module_file).result()
+        units = sorted(controller.client.search_content(), key=repr)
+
+    with open(state_path) as f:
+        lines = f.readlines()
+
+    # One line per repo and unit.
+    assert len(lines) == 7 + 5
+
+    # Lines are written in a deterministic order.
+    keys = [(json.loads(line)["kind"], json.loads(line)["id"]) for line in lines]
+    assert keys == sorted(keys)
+
+    with task_context():
+        controller = new_fake_controller(state_path)
+
+        # Units round-tripped exactly.
+        assert sorted(controller.client.search_content(), key=repr) == units
+
+        # Now update one unit.
+        file_unit = [u for u in units if isinstance(u, FileUnit)][0]
+        controller.client.update_content(
+            attr.evolve(file_unit, cdn_path="/some/path")
+        ).result()
+
+    with open(state_path) as f:
+        new_lines = f.readlines()
+
+    # The file should have been appended to rather than rewritten.
+    assert new_lines[: len(lines)] == lines
+    assert len(new_lines) == len(lines) + 1
+
+    with task_context():
+        controller = new_fake_controller(state_path)
+        file_units = list(
+            controller.client.search_content(Criteria.with_unit_type(FileUnit))
+        )
+
+    # Update should have been reflected.
+    assert [u.cdn_path for u in file_units] == ["/some/path"]
+
+
+def test_state_jsonl_serializes_changes_only(tmpdir, monkeypatch):
+    """Fake client in JSON lines format only serializes changed repos and units
+    when saving state."""
+    state_path = str(tmpdir.join("pulpfake.jsonl"))
+
+    with task_context():
+        controller = new_fake_controller(state_path)
+        controller.insert_units(
+            controller.client.get_repository("all-iso-content").result(),
+            [
+                FileUnit(path="file%s" % i, size=i, sha256sum="%s" % i * 64)
+                for i in range(0, 5)
+            ],
+        )
+
+    serialized = []
+    serialize = fakepulp.serialize
+
+    def counting_serialize(value):
+        if attr.has(type(value)):
+            serialized.append(value)
+        return serialize(value)
+
+    monkeypatch.setattr(
+        "pubtools._pulp.services.fakepulp.serialize", counting_serialize
+    )
+
+    with task_context():
+        controller = new_fake_controller(state_path)
+
+    # Nothing changed, so nothing was serialized.
+    assert serialized == []
+
+    with task_context():
+        controller = new_fake_controller(state_path)
+        file_unit = list(
+            controller.client.search_content(Criteria.with_field("path", "file3"))
+        )[0]
+        controller.client.update_content(
+            attr.evolve(file_unit, cdn_path="/some/path")
+        ).result()
+
+    # Only the updated unit was serialized.
+    assert [unit.path for unit in serialized] == ["file3"]
+
+
+def test_state_export_yaml(tmpdir):
+    """Fake state in JSON lines format can be exported to YAML."""
+    state_path = str(tmpdir.join("pulpfake.jsonl"))
+    yaml_path = str(tmpdir.join("pulpfake.yaml"))
+
+    with task_context():
+        new_fake_client(state_path)
+
+    fake = PersistentFake(state_path)
+    fake.load()
+    fake.export_yaml(yaml_path)
+
+    exported = open(yaml_path, "rt").read()
+    assert "id: all-rpm-content" in exported
+
+
+def test_state_legacy_yaml(tmpdir):
+    """Fake loads state from legacy YAML path if there's no JSON lines state yet."""
+    state_path = str(tmpdir.join("pulpfake.jsonl"))
+    legacy_path = str(tmpdir.join("pulpfake.yaml"))
+
+    with task_context():
+        client = new_fake_client(legacy_path)
+        client.get_repository("all-rpm-content").result()
+
+    with task_context():
+        fake = PersistentFake(state_path, legacy_state_path=legacy_path)
+        fake.load()
+        fake.ctrl.insert_repository(FileRepository(id="new-repo"))
+
+    # It should have written new state in JSON lines format including
+    # the old state
+    with task_context():
+        client = new_fake_client(state_path)
+        repo_ids = [repo.id for repo in client.search_repository()]
+
+    assert "all-rpm-content" in repo_ids
+    assert "new-repo" in repo_ids
+
+
+def test_state_plain_fake_fallback(tmpdir, monkeypatch, caplog):
+    """Fake falls back to pulplib's plain fake if the extensions relying on
+    pulplib internals can't be loaded."""
+    state_path = str(tmpdir.join("pulpfake.jsonl"))
+
+    # Simulate the extensions being incompatible with pulplib.
+    monkeypatch.setitem(sys.modules, "pubtools._pulp.services.fakeindex", None)
+
+    with task_context():
+        controller = new_fake_controller(state_path)
+        controller.insert_repository(FileRepository(id="new-repo"))
+
+    assert type(controller) is FakeController
+    assert "using plain fake" in caplog.text
+
+    # State is persisted as usual.
+    with task_context():
+        client = new_fake_client(state_path)
+        repo_ids = [repo.id for repo in client.search_repository()]
+
+    assert "new-repo" in repo_ids
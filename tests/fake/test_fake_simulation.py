@@ -0,0 +1,149 @@
+import contextlib
+
+import pytest
+from pubtools.pulplib import (
+    Criteria,
+    Matcher,
+    PulpException,
+    TaskFailedException,
+    YumRepository,
+)
+
+from pubtools._pulp.services.fakesim import (
+    SimulatedFakeController,
+    SimulationProfile,
+    criteria_width,
+)
+
+
+@contextlib.contextmanager
+def new_controller(**kwargs):
+    # Yields a SimulatedFakeController with some repos, using a profile
+    # with the given values.
+    kwargs.setdefault("publish_latency", 0.1)
+    kwargs.setdefault("search_latency", 0.0)
+    kwargs.setdefault("search_latency_per_term", 0.0)
+
+    controller = SimulatedFakeController(SimulationProfile(**kwargs))
+    controller.insert_repository(YumRepository(id="repo1"))
+    controller.insert_repository(YumRepository(id="repo2"))
+    try:
+        yield controller
+    finally:
+        controller.simulation.shutdown()
+
+
+def publish_all(controller, repo_ids):
+    client = controller.client
+    repos = [client.get_repository(repo_id).result() for repo_id in repo_ids]
+    fs = [repo.publish() for repo in repos]
+    for f in fs:
+        f.result()
+
+
+def test_load_profile(tmpdir):
+    """Profile can be loaded from a file, with defaults for missing fields."""
+    path = tmpdir.join("profile.yaml")
+    path.write("workers: 8\npublish_failure_rate: 0.5\n")
+
+    profile = SimulationProfile.load(str(path))
+    assert profile.workers == 8
+    assert profile.publish_failure_rate == 0.5
+    assert profile.copy_latency == SimulationProfile().copy_latency
+
+    assert SimulationProfile.load("default") == SimulationProfile()
+
+
+def test_load_profile_unknown_fields(tmpdir):
+    """Loading a profile with unknown fields gives a meaningful error."""
+    path = tmpdir.join("profile.yaml")
+    path.write("workers: 8\nfoo: 1\nbar: 2\n")
+
+    with pytest.raises(ValueError) as excinfo:
+        SimulationProfile.load(str(path))
+
+    assert "Unknown field(s) in fake Pulp profile" in str(excinfo.value)
+    assert "bar, foo" in str(excinfo.value)
+
+
+def test_repo_lock():
+    """Tasks on the same repo wait for each other."""
+    with new_controller(workers=4) as controller:
+        publish_all(controller, ["repo1", "repo1"])
+
+        simulation = controller.simulation
+        assert simulation.task_count["publish"] == 2
+        assert simulation.lock_wait >= 0.05
+        assert simulation.worker_wait < 0.05
+
+
+def test_worker_pool():
+    """Tasks on different repos wait for a free worker."""
+    with new_controller(workers=1) as controller:
+        publish_all(controller, ["repo1", "repo2"])
+
+        simulation = controller.simulation
+        assert simulation.lock_wait < 0.05
+        assert simulation.worker_wait >= 0.05
+
+
+def test_parallel_tasks():
+    """Tasks on different repos can run at once given enough workers."""
+    with new_controller(workers=2) as controller:
+        publish_all(controller, ["repo1", "repo2"])
+
+        simulation = controller.simulation
+        assert simulation.lock_wait < 0.05
+        assert simulation.worker_wait < 0.05
+
+
+def test_task_failure():
+    """Tasks fail according to failure rate."""
+    with new_controller(publish_failure_rate=1.0) as controller:
+        repo = controller.client.get_repository("repo1").result()
+
+        exception = repo.publish().exception()
+        assert isinstance(exception, TaskFailedException)
+        assert "Simulated publish failure on repo1" in str(exception)
+
+        # Nothing was published.
+        assert controller.publish_history == []
+
+
+def test_search_failure():
+    """Searches fail according to failure rate."""
+    with new_controller(search_failure_rate=1.0) as controller:
+        exception = controller.client.search_content().exception()
+        assert isinstance(exception, PulpException)
+        assert controller.simulation.failure_count == 1
+
+
+def test_search_results():
+    """Searches give the same results as usual."""
+    with new_controller() as controller:
+        repo_ids = [
+            repo.id
+            for repo in controller.client.search_repository(
+                Criteria.with_id(["repo2", "other"])
+            )
+        ]
+        assert repo_ids == ["repo2"]
+
+
+def test_criteria_width():
+    """Width of criteria counts the values matched."""
+    assert criteria_width(Criteria.true()) == 1
+    assert criteria_width(Criteria.with_field("name", "foo")) == 1
+    assert criteria_width(Criteria.with_id(["a", "b", "c"])) == 3
+    assert (
+        criteria_width(
+            Criteria.or_(
+                Criteria.with_field("name", Matcher.in_(["a", "b"])),
+                Criteria.and_(
+                    Criteria.with_field("arch", "x86_64"),
+                    Criteria.with_field("version", "1"),
+                ),
+            )
+        )
+        == 4
+    )
@@ -1,4 +1,5 @@
 import datetime
+import json
 
 import pytest
 from mock import patch
@@ -321,3 +322,277 @@ def test_arc_garbage_collect_0items(mock_logger):
     updated_rpm = list(client.get_repository("all-rpm-content").search_content())
     assert len(updated_rpm) == 1
     mock_logger.info.assert_any_call("No all-rpm-content found older than %s", 30)
+
+
+def test_arc_garbage_collect_streaming(mock_logger, monkeypatch):
+    """removes batches of all-rpm-content while searching, logging progress"""
+    monkeypatch.setattr(gc_module, "UNASSOCIATE_BATCH_LIMIT", 4)
+    monkeypatch.setattr(gc_module, "UNASSOCIATE_IN_FLIGHT", 2)
+    repo = Repository(
+        id="all-rpm-content",
+        created=_get_created(7),
+    )
+    controller = _get_fake_controller(repo)
+    client = controller.client
+
+    all_rpm_content = client.get_repository("all-rpm-content").result()
+    old_rpms = [
+        RpmUnit(
+            cdn_published=datetime.datetime.utcnow() - datetime.timedelta(days=190),
+            arch="src",
+            filename="test-arc-old%02d-1.0-1.src.rpm" % i,
+            name="test-arc-old%02d" % i,
+            version="1.0",
+            release="1",
+            content_type_id="rpm",
+            unit_id="gc_arc_old%02d" % i,
+        )
+        for i in range(0, 10)
+    ]
+    controller.insert_units(all_rpm_content, old_rpms)
+
+    gc = GarbageCollect()
+    arg = ["", "--pulp-url", "http://some.url"]
+
+    with patch("sys.argv", arg):
+        with _patch_pulp_client(controller.client):
+            gc.main()
+
+    assert list(client.get_repository("all-rpm-content").search_content()) == []
+
+    # It should have logged progress as each batch was removed.
+    # The first removal is only awaited once the search has found all units,
+    # since up to two removals may be in flight.
+    progress = [
+        call.args[1:4]
+        for call in mock_logger.info.call_args_list
+        if "found so far" in call.args[0]
+    ]
+    assert progress == [
+        ("all-rpm-content", 4, 10),
+        ("all-rpm-content", 8, 10),
+        ("all-rpm-content", 10, 10),
+    ]
+
+
+def _old_rpms(prefix, count):
+    return [
+        RpmUnit(
+            cdn_published=datetime.datetime.utcnow() - datetime.timedelta(days=190),
+            arch="src",
+            filename="%s%02d-1.0-1.src.rpm" % (prefix, i),
+            name="%s%02d" % (prefix, i),
+            version="1.0",
+            release="1",
+            content_type_id="rpm",
+            unit_id="%s%02d" % (prefix, i),
+        )
+        for i in range(0, count)
+    ]
+
+
+def _arc_shards_controller():
+    repos = [
+        Repository(id=repo_id, created=_get_created(7))
+        for repo_id in [
+            "all-rpm-content",
+            "all-rpm-content-00",
+            "all-rpm-content-7f",
+            "all-rpm-content-ff",
+            "all-rpm-content-other",
+        ]
+    ]
+    controller = _get_fake_controller(*repos)
+    for repo in repos:
+        controller.insert_units(repo, _old_rpms(repo.id + "-rpm", 3))
+    return controller
+
+
+def _arc_unit_counts(controller):
+    client = controller.client
+    return dict(
+        [
+            (repo.id, len(list(client.get_repository(repo.id).search_content())))
+            for repo in controller.repositories
+        ]
+    )
+
+
+def test_arc_garbage_collect_shards(mock_logger):
+    """cleans all-rpm-content shards in parallel"""
+    controller = _arc_shards_controller()
+
+    gc = GarbageCollect()
+    arg = ["", "--pulp-url", "http://some.url", "--arc-parallelism", "2"]
+
+    with patch("sys.argv", arg):
+        with _patch_pulp_client(controller.client):
+            gc.main()
+
+    # It should have cleaned all-rpm-content and all shards, but not the
+    # other repo which only looks similar.
+    assert _arc_unit_counts(controller) == {
+        "all-rpm-content": 0,
+        "all-rpm-content-00": 0,
+        "all-rpm-content-7f": 0,
+        "all-rpm-content-ff": 0,
+        "all-rpm-content-other": 3,
+    }
+
+    completed = [
+        call.args[1:]
+        for call in mock_logger.info.call_args_list
+        if "cleaning completed" in call.args[0]
+    ]
+    assert sorted([c[0] for c in completed]) == [
+        "all-rpm-content",
+        "all-rpm-content-00",
+        "all-rpm-content-7f",
+        "all-rpm-content-ff",
+    ]
+    assert sorted([c[2] for c in completed]) == [1, 2, 3, 4]
+
+
+def test_arc_garbage_collect_resume(mock_logger, tmpdir):
+    """resumes an interrupted all-rpm-content cleanup using state file"""
+    controller = _arc_shards_controller()
+    state_path = str(tmpdir.join("gc-state.json"))
+    arg = [
+        "",
+        "--pulp-url",
+        "http://some.url",
+        "--arc-parallelism",
+        "1",
+        "--gc-state-file",
+        state_path,
+    ]
+
+    # Make cleaning of one shard fail.
+    real_remove = controller.client._do_unassociate
+
+    def fake_remove(repo_id, *args, **kwargs):
+        if repo_id == "all-rpm-content-7f":
+            raise RuntimeError("simulated error")
+        return real_remove(repo_id, *args, **kwargs)
+
+    with patch("sys.argv", arg):
+        with _patch_pulp_client(controller.client):
+            with patch.object(controller.client, "_do_unassociate", fake_remove):
+                with pytest.raises(RuntimeError):
+                    GarbageCollect().main()
+
+    # Progress on the other repos should have been saved.
+    with open(state_path) as f:
+        state = json.load(f)
+    assert state["arc_cutoff"]
+    assert state["arc_completed"] == [
+        "all-rpm-content",
+        "all-rpm-content-00",
+        "all-rpm-content-ff",
+    ]
+
+    # Since it was saved, resuming shouldn't try to clean those again.
+    mock_logger.reset_mock()
+    with patch("sys.argv", arg):
+        with _patch_pulp_client(controller.client):
+            GarbageCollect().main()
+
+    mock_logger.info.assert_any_call(
+        "Resuming all-rpm-content cleanup, %s repo(s) already cleaned", 3
+    )
+    completed = [
+        call.args[1]
+        for call in mock_logger.info.call_args_list
+        if "cleaning completed" in call.args[0]
+    ]
+    assert completed == ["all-rpm-content-7f"]
+    assert _arc_unit_counts(controller)["all-rpm-content-7f"] == 0
+
+    # Having completed, state is reset for the next run.
+    with open(state_path) as f:
+        state = json.load(f)
+    assert state["arc_completed"] == []
+    assert state["arc_cutoff"] is None
+
+
+def test_arc_garbage_collect_min_interval(mock_logger, tmpdir):
+    """skips all-rpm-content repos cleaned recently, unless --gc-full"""
+    controller = _arc_shards_controller()
+    state_path = str(tmpdir.join("gc-state.json"))
+    arg = [
+        "",
+        "--pulp-url",
+        "http://some.url",
+        "--gc-state-file",
+        state_path,
+        "--arc-min-interval",
+        "24",
+    ]
+
+    # Pretend some repos were cleaned recently and others long ago.
+    recent = datetime.datetime.utcnow() - datetime.timedelta(days=30, hours=1)
+    old = datetime.datetime.utcnow() - datetime.timedelta(days=32)
+    with open(state_path, "w") as f:
+        json.dump(
+            {
+                "arc_last_cutoffs": {
+                    "all-rpm-content": recent.strftime(gc_module.DATETIME_FORMAT),
+                    "all-rpm-content-00": recent.strftime(gc_module.DATETIME_FORMAT),
+                    "all-rpm-content-7f": old.strftime(gc_module.DATETIME_FORMAT),
+                }
+            },
+            f,
+        )
+
+    with patch("sys.argv", arg):
+        with _patch_pulp_client(controller.client):
+            GarbageCollect().main()
+
+    mock_logger.info.assert_any_call(
+        "Skipping %s repo(s) cleaned within the last %s hour(s)", 2, 24.0
+    )
+
+    # Only the repos not recently cleaned were cleaned.
+    assert _arc_unit_counts(controller) == {
+        "all-rpm-content": 3,
+        "all-rpm-content-00": 3,
+        "all-rpm-content-7f": 0,
+        "all-rpm-content-ff": 0,
+        "all-rpm-content-other": 3,
+    }
+
+    # Last cutoffs were updated for the cleaned repos.
+    with open(state_path) as f:
+        last_cutoffs = json.load(f)["arc_last_cutoffs"]
+    assert sorted(last_cutoffs.keys()) == [
+        "all-rpm-content",
+        "all-rpm-content-00",
+        "all-rpm-content-7f",
+        "all-rpm-content-ff",
+    ]
+    assert last_cutoffs["all-rpm-content-7f"] == last_cutoffs["all-rpm-content-ff"]
+    assert last_cutoffs["all-rpm-content-7f"] > last_cutoffs["all-rpm-content"]
+
+    # Running again immediately does nothing.
+    mock_logger.reset_mock()
+    with patch("sys.argv", arg):
+        with _patch_pulp_client(controller.client):
+            GarbageCollect().main()
+
+    mock_logger.info.assert_any_call(
+        "Skipping %s repo(s) cleaned within the last %s hour(s)", 4, 24.0
+    )
+
+    # But a full sweep cleans everything.
+    with patch("sys.argv", arg + ["--gc-full"]):
+        with _patch_pulp_client(controller.client):
+            GarbageCollect().main()
+
+    mock_logger.info.assert_any_call("Performing full all-rpm-content cleanup")
+    assert _arc_unit_counts(controller) == {
+        "all-rpm-content": 0,
+        "all-rpm-content-00": 0,
+        "all-rpm-content-7f": 0,
+        "all-rpm-content-ff": 0,
+        "all-rpm-content-other": 3,
+    }
@@ -1,3 +1,4 @@
+import json
 from datetime import datetime
 
 import pytest
@@ -5,6 +6,7 @@ from more_executors.futures import f_return
 
 from pubtools.pulplib import FakeController, Client, Distributor, Repository
 
+import pubtools._pulp.tasks.publish
 from pubtools._pulp.ud import UdCacheClient
 from pubtools._pulp.tasks.publish import Publish, entry_point
 
@@ -385,3 +387,224 @@ def test_publish_filtered_input_repos(command_tester):
     # provided repos that were published before 2019-08-11 and
     # has relative url matching '/unit/3/'is published
     assert [hist.repository.id for hist in fake_pulp.publish_history] == ["repo3"]
+
+
+def test_repo_publish_pipeline(command_tester):
+    """publishes repos with --publish-pipeline and flushes UD cache for each"""
+    with FakePublish() as fake_publish:
+        fake_pulp = fake_publish.pulp_client_controller
+        _add_repo(fake_pulp)
+
+        command_tester.test(
+            fake_publish.main,
+            [
+                "test-publish",
+                "--pulp-url",
+                "https://pulp.example.com",
+                "--udcache-url",
+                "https://ud.example.com/",
+                "--publish-pipeline",
+                "--repo-ids",
+                "repo1,repo2,repo4",
+            ],
+            compare_plaintext=False,
+            compare_jsonl=False,
+        )
+
+    # all pulp repos are published
+    assert sorted([hist.repository.id for hist in fake_pulp.publish_history]) == [
+        "repo1",
+        "repo2",
+        "repo4",
+    ]
+    # flushed the UD objects, except for repo4 which is missing an eng ID
+    assert sorted(fake_publish.udcache_client.flushed_repos) == ["repo1", "repo2"]
+
+
+def test_publish_waves(command_tester, monkeypatch, tmpdir):
+    """publishes filtered repos in waves, flushing UD cache after each wave"""
+
+    # Make throughput reported in logs stable.
+    monkeypatch.setattr(pubtools._pulp.tasks.publish, "monotonic", lambda: 0)
+
+    state_path = str(tmpdir.join("wave-state.json"))
+
+    with FakePublish() as fake_publish:
+        fake_pulp = fake_publish.pulp_client_controller
+        _add_repo(fake_pulp)
+
+        command_tester.test(
+            fake_publish.main,
+            [
+                "test-publish",
+                "--pulp-url",
+                "https://pulp.example.com",
+                "--udcache-url",
+                "https://ud.example.com/",
+                "--repo-url-regex",
+                "/unit/",
+                "--wave-size",
+                "3",
+                "--wave-state-file",
+                state_path,
+            ],
+        )
+
+    # all repos are published, in two waves
+    assert [hist.repository.id for hist in fake_pulp.publish_history] == [
+        "repo1",
+        "repo2",
+        "repo3",
+        "repo4",
+    ]
+    # flushed the UD objects, except for repo4 which is missing an eng ID
+    assert fake_publish.udcache_client.flushed_repos == ["repo1", "repo2", "repo3"]
+
+    # progress is no longer stored once everything completed
+    with open(state_path) as f:
+        assert json.load(f) == {
+            "published": [],
+            "request": {
+                "published_before": None,
+                "repo_ids": [],
+                "repo_url_regex": "/unit/",
+            },
+        }
+
+
+def test_publish_waves_resume(command_tester, monkeypatch, tmpdir):
+    """publishing in waves resumes from progress stored by an interrupted run"""
+
+    monkeypatch.setattr(pubtools._pulp.tasks.publish, "monotonic", lambda: 0)
+
+    state_path = str(tmpdir.join("wave-state.json"))
+    with open(state_path, "w") as f:
+        json.dump(
+            {
+                "published": ["repo1", "repo2"],
+                "request": {
+                    "published_before": "2019-09-11T00:00:00Z",
+                    "repo_ids": [],
+                    "repo_url_regex": None,
+                },
+            },
+            f,
+        )
+
+    with FakePublish() as fake_publish:
+        fake_pulp = fake_publish.pulp_client_controller
+        _add_repo(fake_pulp)
+
+        command_tester.test(
+            fake_publish.main,
+            [
+                "test-publish",
+                "--pulp-url",
+                "https://pulp.example.com",
+                "--published-before",
+                "2019-09-11",
+                "--wave-size",
+                "1",
+                "--wave-state-file",
+                state_path,
+            ],
+        )
+
+    # only those repos not published by the interrupted run are published
+    assert [hist.repository.id for hist in fake_pulp.publish_history] == [
+        "repo3",
+        "repo4",
+    ]
+
+
+def test_publish_waves_resume_all_published(command_tester, monkeypatch, tmpdir):
+    """resuming a run interrupted after its last wave succeeds, even though no
+    repos match the filters any more"""
+
+    monkeypatch.setattr(pubtools._pulp.tasks.publish, "monotonic", lambda: 0)
+
+    state_path = str(tmpdir.join("wave-state.json"))
+    with open(state_path, "w") as f:
+        json.dump(
+            {
+                "published": ["repo1", "repo2", "repo3", "repo4"],
+                "request": {
+                    "published_before": "2019-09-11T00:00:00Z",
+                    "repo_ids": [],
+                    "repo_url_regex": None,
+                },
+            },
+            f,
+        )
+
+    with FakePublish() as fake_publish:
+        # The repos published by the interrupted run no longer match
+        # --published-before, so no repos are found.
+        fake_pulp = fake_publish.pulp_client_controller
+
+        command_tester.test(
+            fake_publish.main,
+            [
+                "test-publish",
+                "--pulp-url",
+                "https://pulp.example.com",
+                "--published-before",
+                "2019-09-11",
+                "--wave-size",
+                "1",
+                "--wave-state-file",
+                state_path,
+            ],
+        )
+
+    # nothing more is published, and progress is no longer stored
+    assert fake_pulp.publish_history == []
+    with open(state_path) as f:
+        assert json.load(f)["published"] == []
+
+
+def test_publish_waves_other_request(command_tester, monkeypatch, tmpdir):
+    """publishing in waves ignores progress stored by a run with other filters"""
+
+    monkeypatch.setattr(pubtools._pulp.tasks.publish, "monotonic", lambda: 0)
+
+    state_path = str(tmpdir.join("wave-state.json"))
+    with open(state_path, "w") as f:
+        json.dump(
+            {
+                "published": ["repo1", "repo2"],
+                "request": {
+                    "published_before": "2019-09-10T00:00:00Z",
+                    "repo_ids": [],
+                    "repo_url_regex": None,
+                },
+            },
+            f,
+        )
+
+    with FakePublish() as fake_publish:
+        fake_pulp = fake_publish.pulp_client_controller
+        _add_repo(fake_pulp)
+
+        command_tester.test(
+            fake_publish.main,
+            [
+                "test-publish",
+                "--pulp-url",
+                "https://pulp.example.com",
+                "--published-before",
+                "2019-09-11",
+                "--wave-size",
+                "2",
+                "--wave-state-file",
+                state_path,
+            ],
+        )
+
+    # all matching repos are published, since stored progress was for
+    # another request
+    assert [hist.repository.id for hist in fake_pulp.publish_history] == [
+        "repo1",
+        "repo3",
+        "repo4",
+    ]
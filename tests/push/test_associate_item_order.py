@@ -187,3 +187,84 @@ def test_delay_if_pending_modules():
 
     # By contrast, the rpm for dest1 would be OK to handle immediately
     assert not phase.delay_item(rpm1)
+
+
+def test_no_delay_if_dest_has_no_modules():
+    """Associate should not delay processing an RPM before all items are known,
+    if modulemd destinations were declared in advance and don't include the
+    RPM's repos.
+    """
+    rpm1 = PulpRpmPushItem(pushsource_item=RpmPushItem(name="rpm", dest=["dest1"]))
+    rpm2 = PulpRpmPushItem(pushsource_item=RpmPushItem(name="rpm", dest=["dest2"]))
+    ctx = Context()
+    phase = Associate(
+        context=ctx,
+        pulp_client=None,
+        pre_push=None,
+        allow_unsigned=True,
+        in_queue=None,
+    )
+
+    ctx.item_info.set_modulemd_dests(["dest2"])
+
+    # Not setting items_known here.
+
+    # RPM going to a repo without modules can be handled immediately.
+    assert not phase.delay_item(rpm1)
+
+    # But RPM going to a repo with modules still has to wait.
+    assert phase.delay_item(rpm2)
+
+
+def test_associate_order_releases_rpms_after_modules():
+    """Associate phase releases RPMs as soon as modulemds for their repos are
+    done, once all items are known.
+    """
+
+    ctx = Context()
+    queue = ctx.new_queue(maxsize=10000)
+    phase = Associate(
+        context=ctx,
+        pulp_client=None,
+        pre_push=None,
+        allow_unsigned=True,
+        in_queue=queue,
+    )
+
+    rpms = [
+        PulpRpmPushItem(pushsource_item=RpmPushItem(name="rpm", dest=["mod-dest"]))
+        for _ in range(0, 10)
+    ]
+    modules = [
+        PulpModuleMdPushItem(
+            pushsource_item=ModuleMdPushItem(name="module", dest=["mod-dest"])
+        )
+        for _ in range(0, 5)
+    ]
+    files = [PulpFilePushItem(pushsource_item=None) for _ in range(0, 3)]
+
+    for item in rpms + modules + files:
+        ctx.item_info.add_item(item)
+    ctx.item_info.items_known.set()
+
+    got_ids = []
+    batches = phase.iter_for_associate()
+
+    # RPMs arrive first, and have to wait.
+    queue.put(rpms)
+    queue.put(modules)
+    got_ids.extend([id(item) for item in next(batches)])
+
+    # Then after modules are done, RPMs are released straight away, without
+    # waiting for any more input.
+    got_ids.extend([id(item) for item in next(batches)])
+    assert got_ids == [id(item) for item in modules + rpms]
+
+    queue.put(files)
+    got_ids.extend([id(item) for item in next(batches)])
+
+    assert got_ids == [id(item) for item in modules + rpms + files]
+
+    # Put this so that iteration will end
+    queue.put(constants.FINISHED)
+    assert list(batches) == []
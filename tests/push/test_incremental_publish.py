@@ -0,0 +1,88 @@
+import time
+
+from more_executors.futures import f_return
+from pubtools.pulplib import FakeController, FileRepository, FileUnit
+from pushsource import FilePushItem
+
+from pubtools._pulp.tasks.push.items import PulpFilePushItem
+from pubtools._pulp.tasks.push.phase import Context, Publish, constants
+
+
+def make_item(name, dest):
+    return PulpFilePushItem(
+        pushsource_item=FilePushItem(name=name, sha256sum="a" * 64, dest=[dest]),
+        pulp_unit=FileUnit(
+            unit_id="unit-%s" % name,
+            path=name,
+            size=1,
+            sha256sum="a" * 64,
+            repository_memberships=[dest],
+        ),
+    )
+
+
+def test_incremental_publish():
+    """Publish phase in incremental mode publishes each repo as soon as all
+    items for that repo have arrived."""
+
+    pulp_ctrl = FakeController()
+    pulp_ctrl.insert_repository(FileRepository(id="repo1"))
+    pulp_ctrl.insert_repository(FileRepository(id="repo2"))
+
+    published = []
+
+    def publish_with_cache_flush(repos, units=None, errata=None):
+        published.append(sorted([repo.id for repo in repos.result()]))
+        return [f_return()]
+
+    ctx = Context()
+    queue = ctx.new_queue()
+    phase = Publish(
+        context=ctx,
+        pulp_client=pulp_ctrl.client,
+        publish_with_cache_flush=publish_with_cache_flush,
+        in_queue=queue,
+        incremental=True,
+    )
+
+    item1 = make_item("file1", "repo1")
+    item2 = make_item("file2", "repo2")
+    item3 = make_item("file3", "repo2")
+
+    for item in [item1, item2, item3]:
+        ctx.item_info.add_item(item)
+    ctx.item_info.items_known.set()
+
+    with phase:
+        # All items for repo1 have arrived, but not for repo2.
+        queue.put([item1, item2])
+
+        # repo1 should be published without waiting for the rest.
+        for _ in range(0, 100):
+            if published:
+                break
+            time.sleep(0.1)
+        assert published == [["repo1"]]
+
+        queue.put([item3])
+        queue.put(constants.FINISHED)
+
+    assert not ctx.has_error
+
+    # Then repo2 was published separately.
+    assert published == [["repo1"], ["repo2"]]
+
+    outputs = []
+    while True:
+        items = phase.out_queue.get()
+        if items is constants.FINISHED:
+            break
+        outputs.extend(items)
+
+    # Every item is output as pushed.
+    assert sorted(item.pushsource_item.name for item in outputs) == [
+        "file1",
+        "file2",
+        "file3",
+    ]
+    assert set(item.pushsource_item.state for item in outputs) == set(["PUSHED"])
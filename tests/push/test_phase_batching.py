@@ -96,3 +96,80 @@ def test_iter_respects_timeout(monkeypatch):
 
     finally:
         stop_write_items()
+
+
+def test_iter_coalesces_within_window(monkeypatch):
+    """iter_input_batched with a window coalesces inputs arriving within the window."""
+
+    monkeypatch.setattr(constants, "QUEUE_SIZE", 100)
+    monkeypatch.setattr(constants, "BATCH_TIMEOUT", 0.1)
+    monkeypatch.setattr(constants, "BATCH_MAX_TIMEOUT", 0.1)
+
+    ctx = Context()
+    ctx.interrupt_interval = 0.1
+
+    queue = ctx.new_queue()
+    phase = Phase(ctx, in_queue=queue)
+
+    def write_items():
+        # The first input takes a while to arrive, which should not count
+        # towards the window.
+        time.sleep(0.5)
+        queue.put([0])
+        # These inputs arrive later than the usual batch timeout, but within
+        # the window.
+        time.sleep(0.3)
+        queue.put([1])
+        time.sleep(0.3)
+        queue.put([2])
+        queue.put(constants.FINISHED)
+
+    thread = Thread(target=write_items)
+    thread.start()
+
+    try:
+        got_batches = list(phase.iter_input_batched(window=5.0))
+    finally:
+        thread.join()
+
+    # It should have given everything in a single batch.
+    assert got_batches == [[0, 1, 2]]
+
+
+def test_iter_window_is_per_batch(monkeypatch):
+    """iter_input_batched with a window doesn't wait for a full window per input."""
+
+    monkeypatch.setattr(constants, "QUEUE_SIZE", 100)
+    monkeypatch.setattr(constants, "BATCH_TIMEOUT", 0.1)
+    monkeypatch.setattr(constants, "BATCH_MAX_TIMEOUT", 0.1)
+
+    ctx = Context()
+    ctx.interrupt_interval = 0.1
+
+    queue = ctx.new_queue()
+    phase = Phase(ctx, in_queue=queue)
+
+    def write_items():
+        queue.put([0])
+        time.sleep(0.8)
+        queue.put([1])
+        time.sleep(3.0)
+        queue.put([2])
+        queue.put(constants.FINISHED)
+
+    thread = Thread(target=write_items)
+    thread.start()
+
+    try:
+        got_batches = []
+        start = time.time()
+        for batch in phase.iter_input_batched(window=1.0):
+            got_batches.append((batch, time.time() - start))
+    finally:
+        thread.join()
+
+    assert [batch for (batch, _) in got_batches] == [[0, 1], [2]]
+
+    # The first batch should be ready once its window has passed, rather
+    # than a window after the last input arrived.
+    assert got_batches[0][1] < 1.5
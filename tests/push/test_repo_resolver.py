@@ -0,0 +1,97 @@
+import pytest
+from pubtools.pulplib import FakeController, FileRepository, YumRepository
+from pushsource import ErratumPushItem, FilePushItem, RpmPushItem
+
+from pubtools._pulp.services.cachingpulp import CachingPulpClient
+from pubtools._pulp.tasks.push.items import (
+    PulpErratumPushItem,
+    PulpFilePushItem,
+    PulpRpmPushItem,
+)
+from pubtools._pulp.tasks.push.repos import RepoResolver
+
+
+def make_items():
+    return [
+        PulpFilePushItem(
+            pushsource_item=FilePushItem(name="file", dest=["file-repo"]),
+        ),
+        PulpRpmPushItem(
+            pushsource_item=RpmPushItem(
+                name="test.rpm", sha256sum="ab" + "0" * 62, dest=["yum-repo"]
+            )
+        ),
+        # RPM without checksum: shard is not known yet
+        PulpRpmPushItem(
+            pushsource_item=RpmPushItem(name="other.rpm", dest=["yum-repo"])
+        ),
+        PulpErratumPushItem(
+            pushsource_item=ErratumPushItem(name="RHSA-2020:1234", dest=["yum-repo"])
+        ),
+    ]
+
+
+def test_resolve_repos():
+    """RepoResolver finds all needed repos in bulk and preloads the client."""
+
+    ctrl = FakeController()
+    for repo_id in ["file-repo"]:
+        ctrl.insert_repository(FileRepository(id=repo_id))
+    for repo_id in ["yum-repo", "all-rpm-content-ab", "all-erratum-content-2020"]:
+        ctrl.insert_repository(YumRepository(id=repo_id))
+
+    client = CachingPulpClient(ctrl.client)
+    resolver = RepoResolver(client, batch_size=2)
+    for item in make_items():
+        resolver.add_item(item)
+
+    found = resolver.resolve()
+
+    assert sorted(found.keys()) == [
+        "all-erratum-content-2020",
+        "all-rpm-content-ab",
+        "file-repo",
+        "yum-repo",
+    ]
+
+    # Repos are now available from the client without another request.
+    assert client.get_repository("yum-repo").result() is found["yum-repo"]
+
+
+def test_resolve_missing():
+    """RepoResolver fails, listing every missing repo."""
+
+    ctrl = FakeController()
+    ctrl.insert_repository(YumRepository(id="yum-repo"))
+
+    resolver = RepoResolver(ctrl.client)
+    for item in make_items():
+        resolver.add_item(item)
+
+    with pytest.raises(RuntimeError) as excinfo:
+        resolver.resolve()
+
+    assert str(excinfo.value) == (
+        "Repo(s) needed by push are missing from Pulp: "
+        "all-erratum-content-2020 or all-rpm-content, all-rpm-content-ab, file-repo"
+    )
+
+
+def test_resolve_erratum_fallback_repo():
+    """RepoResolver accepts all-rpm-content for errata, since existing errata
+    may be uploaded there rather than to the repo for their year."""
+
+    ctrl = FakeController()
+    for repo_id in ["yum-repo", "all-rpm-content"]:
+        ctrl.insert_repository(YumRepository(id=repo_id))
+
+    resolver = RepoResolver(ctrl.client)
+    resolver.add_item(
+        PulpErratumPushItem(
+            pushsource_item=ErratumPushItem(name="RHSA-2020:1234", dest=["yum-repo"])
+        )
+    )
+
+    found = resolver.resolve()
+
+    assert sorted(found.keys()) == ["all-rpm-content", "yum-repo"]
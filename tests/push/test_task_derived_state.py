@@ -0,0 +1,227 @@
+import os
+
+import attr
+from pubtools.pulplib import (
+    CopyOptions,
+    FakeController,
+    FileRepository,
+    FileUnit,
+    YumRepository,
+)
+from pushsource import RpmPushItem, FilePushItem
+
+from pubtools._pulp.tasks.push.items import (
+    PulpRpmPushItem,
+    PulpFilePushItem,
+    State,
+)
+from pubtools._pulp.tasks.push.phase import Context, Upload, constants
+
+
+def test_rpm_state_derived_after_upload(data_path):
+    """Upload phase with task_derived_state derives RPM state from the
+    upload rather than searching Pulp."""
+
+    pulp_ctrl = FakeController()
+    pulp_ctrl.insert_repository(YumRepository(id="all-rpm-content-e8"))
+
+    ctx = Context()
+    queue = ctx.new_queue()
+    phase = Upload(
+        context=ctx,
+        pulp_client=pulp_ctrl.client,
+        pre_push=None,
+        in_queue=queue,
+        update_push_items=lambda _: None,
+        task_derived_state=True,
+    )
+
+    rpm = RpmPushItem(
+        name="walrus-5.21-1.noarch.rpm",
+        sha256sum="e837a635cc99f967a70f34b268baa52e0f412c1502e08e924ff5b09f1f9573f2",
+        src=os.path.join(data_path, "staged-mixed/dest1/RPMS/walrus-5.21-1.noarch.rpm"),
+        dest=["repo1"],
+    )
+
+    queue.put([PulpRpmPushItem(pushsource_item=rpm)])
+    queue.put(constants.FINISHED)
+
+    with phase:
+        pass
+
+    assert not ctx.has_error
+
+    outputs = []
+    while True:
+        items = phase.out_queue.get()
+        if items is constants.FINISHED:
+            break
+        outputs.extend(items)
+
+    assert len(outputs) == 1
+    unit = outputs[0].pulp_unit
+
+    # It should have derived the unit from the item.
+    assert unit.name == "walrus"
+    assert unit.version == "5.21"
+    assert unit.release == "1"
+    assert unit.arch == "noarch"
+    assert unit.sha256sum == rpm.sha256sum
+    assert unit.repository_memberships == ["all-rpm-content-e8"]
+
+    # unit_id can't be known without querying Pulp.
+    assert unit.unit_id is None
+
+    # Item is now considered present in Pulp, ready for association.
+    assert outputs[0].pulp_state == State.PARTIAL
+
+    # And Pulp really does have the unit in the expected repo.
+    pulp_units = list(pulp_ctrl.client.search_content())
+    assert len(pulp_units) == 1
+    assert pulp_units[0].repository_memberships == ["all-rpm-content-e8"]
+
+
+def test_state_derived_after_copy():
+    """associated_items_single_batch with task_state derives item state from
+    copy task units."""
+
+    pulp_ctrl = FakeController()
+    src = FileRepository(id="src-repo")
+    pulp_ctrl.insert_repository(src)
+    pulp_ctrl.insert_repository(FileRepository(id="dest1"))
+    pulp_ctrl.insert_repository(FileRepository(id="dest2"))
+
+    files = [
+        FileUnit(
+            path="file%s.txt" % i,
+            size=i,
+            sha256sum=("%s" % i) * 64,
+            repository_memberships=["src-repo"],
+        )
+        for i in range(3)
+    ]
+    pulp_ctrl.insert_units(src, files)
+
+    items = [
+        PulpFilePushItem(
+            pushsource_item=FilePushItem(
+                name=unit.path,
+                sha256sum=unit.sha256sum,
+                dest=["dest1", "dest2"],
+            )
+        )
+        for unit in files
+    ]
+    items = list(
+        PulpFilePushItem.items_with_pulp_state_single_batch(
+            pulp_ctrl.client, items
+        ).result()
+    )
+
+    searches = []
+    old_search = pulp_ctrl.client.search_content
+
+    def spy_search(*args, **kwargs):
+        searches.append(args)
+        return old_search(*args, **kwargs)
+
+    client = pulp_ctrl.client
+    client.search_content = spy_search
+
+    fts = list(
+        PulpFilePushItem.associated_items_single_batch(
+            client, items, CopyOptions(), task_state=True
+        )
+    )
+    out = []
+    for f in fts:
+        out.extend(f.result())
+
+    # Everything should now be in the desired repos.
+    assert sorted(item.pushsource_item.name for item in out) == [
+        "file0.txt",
+        "file1.txt",
+        "file2.txt",
+    ]
+    for item in out:
+        assert item.in_pulp_repos == ["dest1", "dest2", "src-repo"]
+        assert item.pulp_state == State.IN_REPOS
+
+    # No searches should have been needed to determine that.
+    assert not searches
+
+    # And Pulp agrees.
+    for unit in pulp_ctrl.client.search_content():
+        assert sorted(unit.repository_memberships) == ["dest1", "dest2", "src-repo"]
+
+
+def test_units_resolved():
+    """items_with_units_resolved fills in unit_id for derived units while
+    leaving other items untouched and in order."""
+
+    pulp_ctrl = FakeController()
+    repo = FileRepository(id="dest1")
+    pulp_ctrl.insert_repository(repo)
+
+    files = [
+        FileUnit(
+            path="file%s.txt" % i,
+            size=i,
+            sha256sum=("%s" % i) * 64,
+            repository_memberships=["dest1"],
+        )
+        for i in range(3)
+    ]
+    pulp_ctrl.insert_units(repo, files)
+
+    items = [
+        PulpFilePushItem(
+            pushsource_item=FilePushItem(
+                name=unit.path, sha256sum=unit.sha256sum, dest=["dest1"]
+            )
+        )
+        for unit in files
+    ]
+    items = list(
+        PulpFilePushItem.items_with_pulp_state_single_batch(
+            pulp_ctrl.client, items
+        ).result()
+    )
+    unit_ids = [item.pulp_unit.unit_id for item in items]
+    assert all(unit_ids)
+
+    # Simulate state derived from tasks for the first and last items.
+    derived = list(items)
+    for i in (0, 2):
+        derived[i] = attr.evolve(
+            items[i], pulp_unit=attr.evolve(items[i].pulp_unit, unit_id=None)
+        )
+
+    out = PulpFilePushItem.items_with_units_resolved(pulp_ctrl.client, derived).result()
+
+    # Everything has a unit_id again, in the original order.
+    assert [item.pulp_unit.unit_id for item in out] == unit_ids
+    assert [item.pushsource_item.name for item in out] == [
+        "file0.txt",
+        "file1.txt",
+        "file2.txt",
+    ]
+
+    # Item which didn't need resolving is passed through as-is.
+    assert out[1] is derived[1]
+
+
+def test_units_resolved_nothing_to_do():
+    """items_with_units_resolved doesn't query Pulp if all units are known."""
+
+    pulp_ctrl = FakeController()
+    client = pulp_ctrl.client
+    client.search_content = None
+
+    items = [
+        PulpFilePushItem(pushsource_item=FilePushItem(name="file.txt", dest=["dest1"]))
+    ]
+
+    out = PulpFilePushItem.items_with_units_resolved(client, items).result()
+
+    assert out == items
@@ -0,0 +1,153 @@
+import os
+
+import attr
+from more_executors.futures import f_return
+
+from pubtools.pulplib import FakeController, FileRepository, FileUnit, YumRepository
+from pushsource import FilePushItem, RpmPushItem
+
+from pubtools._pulp.tasks.push.items import PulpFilePushItem, PulpRpmPushItem
+from pubtools._pulp.tasks.push.phase import Context, Upload, constants
+from pubtools._pulp.tasks.push.upload import UploadRefresher
+
+
+class ClientWrapper(object):
+    # Wrap a Pulp client to count searches.
+    def __init__(self, delegate):
+        self.delegate = delegate
+        self.get_repository = delegate.get_repository
+        self.searches = []
+
+    def search_content(self, *args, **kwargs):
+        self.searches.append(args)
+        return self.delegate.search_content(*args, **kwargs)
+
+
+def test_upload_refresh_batched(data_path):
+    """Upload phase refreshes state of uploaded items using a combined search."""
+
+    pulp_ctrl = FakeController()
+    pulp_ctrl.insert_repository(YumRepository(id="all-rpm-content-54"))
+    pulp_ctrl.insert_repository(YumRepository(id="all-rpm-content-e8"))
+
+    client_wrapper = ClientWrapper(pulp_ctrl.client)
+
+    ctx = Context()
+    queue = ctx.new_queue()
+    phase = Upload(
+        context=ctx,
+        pulp_client=client_wrapper,
+        pre_push=None,
+        in_queue=queue,
+        update_push_items=lambda _: None,
+    )
+
+    rpm1 = RpmPushItem(
+        name="walrus-5.21-1.noarch.rpm",
+        sha256sum="e837a635cc99f967a70f34b268baa52e0f412c1502e08e924ff5b09f1f9573f2",
+        src=os.path.join(data_path, "staged-mixed/dest1/RPMS/walrus-5.21-1.noarch.rpm"),
+    )
+    rpm2 = RpmPushItem(
+        name="test-srpm01-1.0-1.src.rpm",
+        sha256sum="54cc4713fe704dfc7a4fd5b398f834ceb6a692f53b0c6aefaf89d88417b4c51d",
+        src=os.path.join(
+            data_path, "staged-mixed/dest1/SRPMS/test-srpm01-1.0-1.src.rpm"
+        ),
+    )
+
+    queue.put(
+        [
+            PulpRpmPushItem(pushsource_item=attr.evolve(rpm1, dest=["repo1"])),
+            PulpRpmPushItem(pushsource_item=attr.evolve(rpm2, dest=["repo1"])),
+        ]
+    )
+    queue.put(constants.FINISHED)
+
+    with phase:
+        pass
+
+    assert not ctx.has_error
+
+    outputs = []
+    while True:
+        items = phase.out_queue.get()
+        if items is constants.FINISHED:
+            break
+        outputs.extend(items)
+
+    # Both items should have been found in Pulp after upload.
+    assert sorted([item.pushsource_item.name for item in outputs]) == [
+        "test-srpm01-1.0-1.src.rpm",
+        "walrus-5.21-1.noarch.rpm",
+    ]
+    for item in outputs:
+        assert item.pulp_unit.unit_id
+        assert item.in_pulp_repos
+
+    # And it should have taken only a single search to find them.
+    assert len(client_wrapper.searches) == 1
+
+
+def test_upload_refresh_missing():
+    """UploadRefresher fails items which can't be found after upload."""
+
+    pulp_ctrl = FakeController()
+    refresher = UploadRefresher(pulp_ctrl.client, timeout=10.0, batch_size=2)
+
+    unit = FileUnit(path="exists.txt", size=1, sha256sum="a" * 64)
+    repo = FileRepository(id="some-repo")
+    pulp_ctrl.insert_repository(repo)
+    pulp_ctrl.insert_units(repo, [unit])
+
+    items = [
+        PulpFilePushItem(
+            pushsource_item=FilePushItem(name=name, sha256sum="a" * 64, dest=["x"])
+        )
+        for name in ("exists.txt", "missing.txt")
+    ]
+
+    # Reaching batch_size triggers refresh without waiting on the timeout.
+    fs = [refresher.refresh(item) for item in items]
+
+    assert fs[0].result().in_pulp_repos == ["some-repo"]
+    assert "remains missing from Pulp" in str(fs[1].exception())
+
+
+def test_upload_refresh_bad_result(monkeypatch):
+    """UploadRefresher fails every item if the refresh result can't be used,
+    rather than leaving any of them unresolved."""
+
+    def broken_items():
+        raise RuntimeError("simulated error")
+        yield  # pylint: disable=unreachable
+
+    results = [broken_items(), []]
+
+    def fake_refresh(cls, pulp_client, items):
+        return f_return(results.pop(0))
+
+    monkeypatch.setattr(
+        PulpFilePushItem,
+        "items_with_pulp_state_single_batch",
+        classmethod(fake_refresh),
+    )
+
+    pulp_ctrl = FakeController()
+    refresher = UploadRefresher(pulp_ctrl.client, timeout=10.0, batch_size=2)
+
+    items = [
+        PulpFilePushItem(
+            pushsource_item=FilePushItem(name=name, sha256sum="a" * 64, dest=["x"])
+        )
+        for name in ("file1.txt", "file2.txt", "file3.txt", "file4.txt")
+    ]
+
+    fs = [refresher.refresh(item) for item in items]
+
+    # First batch: iterating over the result failed.
+    assert "simulated error" in str(fs[0].exception())
+    assert "simulated error" in str(fs[1].exception())
+
+    # Second batch: no items came back.
+    assert "was not returned" in str(fs[2].exception())
+    assert "was not returned" in str(fs[3].exception())
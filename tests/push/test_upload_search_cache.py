@@ -0,0 +1,85 @@
+from concurrent.futures import Future
+from random import Random
+
+import attr
+from pubtools.pulplib import FakeController, FileRepository
+from pushsource import FilePushItem, ModuleMdPushItem
+
+from pubtools._pulp.services.cachingpulp import CachingPulpClient
+from pubtools._pulp.tasks.push.items import PulpFilePushItem, PulpModuleMdPushItem
+from pubtools._pulp.tasks.push.items.base import UploadContext
+
+
+UPLOADS = []
+
+
+def held_upload(repo):
+    out = Future()
+    UPLOADS.append((repo.id, out))
+    return out
+
+
+@attr.s(frozen=True, slots=True)
+class HeldFileItem(PulpFilePushItem):
+    def upload_to_repo(self, repo):
+        return held_upload(repo)
+
+
+@attr.s(frozen=True, slots=True)
+class HeldModuleMdItem(PulpModuleMdPushItem):
+    def upload_to_repo(self, repo):
+        return held_upload(repo)
+
+
+def new_client():
+    ctrl = FakeController()
+    ctrl.insert_repository(FileRepository(id="repo1"))
+    ctrl.insert_repository(FileRepository(id="repo2"))
+    return CachingPulpClient(ctrl.client, search_ttl=3600)
+
+
+def test_upload_invalidates_searches():
+    """Uploads via repository objects invalidate searches cached by the client."""
+
+    del UPLOADS[:]
+    client = new_client()
+    search1 = client.search_content()
+    assert client.search_content() is search1
+
+    item = HeldFileItem(
+        pushsource_item=FilePushItem(
+            name="file.txt", src="/some/file.txt", dest=["repo1"], sha256sum="a" * 64
+        )
+    )
+    item.ensure_uploaded(UploadContext(client=client, random=Random()))
+
+    # Search is still cached while the upload is in progress.
+    assert [repo_id for (repo_id, _) in UPLOADS] == ["repo1"]
+    assert client.search_content() is search1
+
+    # Once the upload completes, the content found by the search may be
+    # outdated, so it's not used again.
+    UPLOADS[0][1].set_result([])
+    assert client.search_content() is not search1
+
+
+def test_direct_upload_invalidates_searches():
+    """Uploads of direct upload items invalidate searches cached by the client."""
+
+    del UPLOADS[:]
+    client = new_client()
+    search1 = client.search_content()
+
+    item = HeldModuleMdItem(
+        pushsource_item=ModuleMdPushItem(
+            name="modules.yaml", src="/some/modules.yaml", dest=["repo1", "repo2"]
+        )
+    )
+    uploaded_f = item.ensure_uploaded(UploadContext(client=client))
+
+    assert sorted([repo_id for (repo_id, _) in UPLOADS]) == ["repo1", "repo2"]
+    for _, upload_f in UPLOADS:
+        upload_f.set_result([])
+
+    assert uploaded_f.result().in_pulp_repos == ["repo1", "repo2"]
+    assert client.search_content() is not search1
@@ -0,0 +1,100 @@
+from concurrent.futures import Future
+
+from pubtools._pulp.services import collector
+from pubtools._pulp.services.collector import ChunkedUpdate
+
+
+class DelayedCollector(object):
+    # A collector whose updates complete only when requested.
+    def __init__(self):
+        self.updates = []
+
+    def update_push_items(self, items):
+        f = Future()
+        self.updates.append((items, f))
+        return f
+
+
+def test_chunked_update_bounded():
+    """Push items are recorded in chunks, with bounded updates in flight."""
+    consumed = []
+
+    def gen_items():
+        for i in range(0, 10):
+            consumed.append(i)
+            yield i
+
+    fake = DelayedCollector()
+    result = ChunkedUpdate(fake, gen_items(), chunk_size=3, in_flight=2).start()
+
+    # Only two chunks should have been taken from the generator.
+    assert [items for (items, _) in fake.updates] == [[0, 1, 2], [3, 4, 5]]
+    assert consumed == [0, 1, 2, 3, 4, 5]
+
+    # As updates complete, more chunks are sent.
+    fake.updates[0][1].set_result(None)
+    assert fake.updates[-1][0] == [6, 7, 8]
+
+    fake.updates[1][1].set_result(None)
+    fake.updates[2][1].set_result(None)
+    assert fake.updates[-1][0] == [9]
+    assert not result.done()
+
+    fake.updates[3][1].set_result(None)
+    assert result.result() is None
+
+
+def test_chunked_update_empty():
+    """Recording no push items completes without any updates."""
+    fake = DelayedCollector()
+    result = ChunkedUpdate(fake, [], chunk_size=3, in_flight=2).start()
+
+    assert result.result() is None
+    assert fake.updates == []
+
+
+def test_chunked_update_error():
+    """A failed update fails the recording without sending further chunks."""
+    fake = DelayedCollector()
+    result = ChunkedUpdate(fake, range(0, 10), chunk_size=2, in_flight=1).start()
+
+    fake.updates[0][1].set_exception(RuntimeError("simulated error"))
+
+    assert "simulated error" in str(result.exception())
+    assert len(fake.updates) == 1
+
+
+def test_chunked_update_from_service(monkeypatch):
+    """CollectorService records push items in chunks of configured size."""
+    monkeypatch.setattr(collector, "RECORD_CHUNK_SIZE", 4)
+
+    fake = DelayedCollector()
+    service = collector.CollectorService()
+    monkeypatch.setattr(collector.pushcollector.Collector, "get", lambda: fake)
+
+    result = service.update_push_items_chunked(iter(range(0, 6)))
+    for _, f in fake.updates:
+        f.set_result(None)
+
+    assert result.result() is None
+    assert [items for (items, _) in fake.updates] == [[0, 1, 2, 3], [4, 5]]
+
+
+def test_chunked_update_many_immediate():
+    """Many updates which complete immediately are handled without recursion."""
+
+    class ImmediateCollector(object):
+        def __init__(self):
+            self.count = 0
+
+        def update_push_items(self, items):
+            self.count += len(items)
+            f = Future()
+            f.set_result(None)
+            return f
+
+    fake = ImmediateCollector()
+    result = ChunkedUpdate(fake, range(0, 10000), chunk_size=1, in_flight=2).start()
+
+    assert result.result() is None
+    assert fake.count == 10000
@@ -0,0 +1,123 @@
+import logging
+from concurrent.futures import Future
+
+import attr
+from pubtools.pulplib import Criteria, FakeController, FileUnit, RpmUnit, YumRepository
+
+from pubtools._pulp.updater import ContentUpdater
+
+
+class FlakyClient(object):
+    # Wraps a Pulp client to fail the first update of certain units, and to
+    # track the number of concurrent updates.
+    def __init__(self, delegate, fail_once=()):
+        self.delegate = delegate
+        self.fail_once = set(fail_once)
+        self.updated = []
+        self.pending = []
+        self.max_in_flight = 0
+
+    def update_content(self, unit):
+        self.updated.append(unit.unit_id)
+        out = Future()
+        if unit.unit_id in self.fail_once:
+            self.fail_once.remove(unit.unit_id)
+            out.set_exception(RuntimeError("simulated error %s" % unit.unit_id))
+            return out
+
+        self.pending.append((unit, out))
+        self.max_in_flight = max(self.max_in_flight, len(self.pending))
+        return out
+
+    def complete_all(self):
+        while self.pending:
+            (unit, out) = self.pending.pop(0)
+            self.delegate.update_content(unit).result()
+            out.set_result(None)
+
+
+def make_units(controller):
+    repo = YumRepository(id="repo")
+    controller.insert_repository(repo)
+    controller.insert_units(
+        repo,
+        [
+            FileUnit(path="file%s" % i, size=1, sha256sum="%s" % i * 64)
+            for i in range(0, 3)
+        ]
+        + [
+            RpmUnit(name="rpm%s" % i, version="1", release="1", arch="noarch")
+            for i in range(0, 3)
+        ],
+    )
+    return list(controller.client.search_content())
+
+
+def test_update_bounded_and_retried(caplog):
+    """ContentUpdater limits updates in flight, and retries only failed units."""
+    caplog.set_level(logging.INFO)
+
+    controller = FakeController()
+    units = make_units(controller)
+    failing_id = units[1].unit_id
+
+    client = FlakyClient(controller.client, fail_once=[failing_id])
+    updater = ContentUpdater(client, concurrency=2, progress_interval=3)
+
+    update_f = updater.update(
+        [attr.evolve(unit, cdn_path="/some/path") for unit in units]
+    )
+
+    # It should only have started two updates at once (plus one which failed
+    # immediately).
+    assert client.max_in_flight == 2
+    while not update_f.done():
+        client.complete_all()
+
+    assert update_f.result() is None
+    assert client.max_in_flight == 2
+
+    # Every unit was updated once, apart from the failed unit which was retried.
+    assert sorted(client.updated) == sorted(
+        [unit.unit_id for unit in units] + [failing_id]
+    )
+    assert client.updated[-1] == failing_id
+
+    # Units were submitted grouped by type.
+    first_updates = client.updated[: len(units)]
+    types = [
+        [unit.content_type_id for unit in units if unit.unit_id == unit_id][0]
+        for unit_id in first_updates
+    ]
+    assert types == sorted(types)
+
+    # Updates really happened.
+    for unit in controller.client.search_content(Criteria.true()):
+        assert unit.cdn_path == "/some/path"
+
+    # It logged progress and the retry.
+    messages = [rec.getMessage() for rec in caplog.records]
+    assert "Updated 3 of 6 unit(s)" in messages
+    assert "Retrying update of 1 unit(s)" in messages
+
+
+def test_update_fails_after_retries():
+    """ContentUpdater propagates an error if a unit keeps failing."""
+
+    controller = FakeController()
+    units = make_units(controller)
+
+    class FailingClient(object):
+        def update_content(self, unit):
+            raise RuntimeError("simulated error")
+
+    updater = ContentUpdater(FailingClient(), retries=1)
+    update_f = updater.update(units)
+
+    assert "simulated error" in str(update_f.exception())
+
+
+def test_update_empty():
+    """ContentUpdater immediately succeeds with no units."""
+    updater = ContentUpdater(FakeController().client)
+    assert updater.update([]).result() is None
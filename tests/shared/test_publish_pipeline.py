@@ -0,0 +1,149 @@
+import datetime
+import logging
+
+from mock import patch
+from more_executors.futures import f_return, f_sequence
+from pubtools.pulplib import FakeController, FileRepository, FileUnit
+
+from pubtools._pulp.task import PulpTask
+from pubtools._pulp.tasks.common import Publisher
+
+
+class FakeUdCache(object):
+    def __init__(self):
+        self.flushed = []
+
+    def flush(self, object_type, object_id):
+        self.flushed.append((object_type, object_id))
+        return f_return()
+
+    def flush_repo(self, repo_id):
+        return self.flush("repo", repo_id)
+
+    def flush_product(self, product_id):
+        return self.flush("eng-product", product_id)
+
+    def flush_erratum(self, erratum_id):
+        return self.flush("erratum", erratum_id)
+
+
+class PipelineTask(Publisher, PulpTask):
+    def __init__(self, *args, **kwargs):
+        super(PipelineTask, self).__init__(*args, **kwargs)
+        self.fake_udcache = FakeUdCache()
+
+    @property
+    def udcache_client(self):
+        return self.fake_udcache
+
+    @classmethod
+    def cdn_published_value(cls):
+        return datetime.datetime(2024, 1, 2, 3, 4)
+
+    def add_args(self):
+        super(PipelineTask, self).add_args()
+        self.add_publisher_args(self.parser)
+        self.parser.add_argument("--skip", type=str)
+
+
+def run_pipeline(extra_args):
+    """Publish two repos with --publish-pipeline, returning the task and the
+    units afterwards."""
+
+    ctrl = FakeController()
+    repos = [
+        FileRepository(id="repo1", eng_product_id=101),
+        FileRepository(id="repo2", eng_product_id=102),
+    ]
+    for repo in repos:
+        ctrl.insert_repository(repo)
+        ctrl.insert_units(
+            repo,
+            [FileUnit(path="%s.txt" % repo.id, size=1, sha256sum="a" * 64)],
+        )
+
+    client = ctrl.client
+    repos = [client.get_repository(repo.id).result() for repo in repos]
+    units = list(client.search_content())
+
+    with PipelineTask() as task:
+        with patch("sys.argv", ["", "--publish-pipeline"] + extra_args):
+            fs = task.publish_with_cache_flush(
+                repos, units=units, pulp_client=client, errata=[]
+            )
+            f_sequence(fs).result()
+
+    return (task, list(client.search_content()))
+
+
+def test_pipeline(caplog):
+    """Pipelined publish sets cdn_published and flushes UD cache per repo,
+    logging the usual steps."""
+
+    caplog.set_level(logging.INFO)
+    (task, units) = run_pipeline([])
+
+    assert [unit.cdn_published for unit in units] == [
+        datetime.datetime(2024, 1, 2, 3, 4)
+    ] * 2
+    assert sorted(task.fake_udcache.flushed) == [
+        ("eng-product", 101),
+        ("eng-product", 102),
+        ("repo", "repo1"),
+        ("repo", "repo2"),
+    ]
+
+    for step in ("Publish", "Set cdn_published", "Flush UD cache"):
+        assert "%s: started" % step in caplog.text
+        assert "%s: finished" % step in caplog.text
+
+
+def test_pipeline_skip_cdn_published(caplog):
+    """Pipelined publish honors --skip set-cdn_published."""
+
+    caplog.set_level(logging.INFO)
+    (task, units) = run_pipeline(["--skip", "set-cdn_published"])
+
+    # Nothing was marked as published...
+    assert [unit.cdn_published for unit in units] == [None, None]
+    assert "Set cdn_published: skipped" in caplog.text
+
+    # ...but UD cache was still flushed.
+    assert ("repo", "repo1") in task.fake_udcache.flushed
+    assert ("repo", "repo2") in task.fake_udcache.flushed
+
+
+def test_pipeline_skip_flush_ud(caplog):
+    """Pipelined publish honors --skip flush-ud-cache."""
+
+    caplog.set_level(logging.INFO)
+    (task, units) = run_pipeline(["--skip", "flush-ud-cache"])
+
+    # Units were marked as published...
+    assert [unit.cdn_published for unit in units] == [
+        datetime.datetime(2024, 1, 2, 3, 4)
+    ] * 2
+
+    # ...but UD cache was not flushed.
+    assert task.fake_udcache.flushed == []
+    assert "Flush UD cache: skipped" in caplog.text
+
+
+def test_pipeline_skip_publish(caplog):
+    """Pipelined publish with --skip publish still sets cdn_published and
+    flushes UD cache for every repo."""
+
+    caplog.set_level(logging.INFO)
+    (task, units) = run_pipeline(["--skip", "publish"])
+
+    assert "Publish: skipped" in caplog.text
+
+    assert [unit.cdn_published for unit in units] == [
+        datetime.datetime(2024, 1, 2, 3, 4)
+    ] * 2
+    assert sorted(task.fake_udcache.flushed) == [
+        ("eng-product", 101),
+        ("eng-product", 102),
+        ("repo", "repo1"),
+        ("repo", "repo2"),
+    ]
@@ -0,0 +1,136 @@
+import json
+import threading
+from concurrent.futures import Future
+
+from pubtools.pulplib import YumRepository
+
+from pubtools._pulp.scheduler import PublishScheduler
+
+
+class PublishRecorder(object):
+    # A publish_fn which records publishes and lets the test complete them.
+    def __init__(self):
+        self.started = []
+        self.futures = {}
+
+    def __call__(self, repo):
+        self.started.append(repo.id)
+        f = Future()
+        self.futures[repo.id] = f
+        return f
+
+    def finish(self, repo_id):
+        self.futures[repo_id].set_result([repo_id])
+
+
+def test_order_longest_first(tmpdir):
+    """Scheduler starts repos with longest history first, after priority repos."""
+
+    history_path = str(tmpdir.join("history.json"))
+    with open(history_path, "w") as f:
+        json.dump({"small": 1.0, "large": 100.0, "medium": 10.0}, f)
+
+    scheduler = PublishScheduler(
+        history_path=history_path, priority=["*-security-*", "nomatch"]
+    )
+
+    repos = [
+        YumRepository(id=repo_id)
+        for repo_id in ["small", "unknown", "large", "rhel-security-rpms", "medium"]
+    ]
+
+    assert [repo.id for repo in scheduler.order(repos)] == [
+        # Priority first
+        "rhel-security-rpms",
+        # Then by duration, where unknown is treated as median
+        "large",
+        "unknown",
+        "medium",
+        "small",
+    ]
+
+
+def test_bounded_concurrency(tmpdir):
+    """Scheduler limits the number of publishes running at once, and saves
+    history of publish durations."""
+
+    history_path = str(tmpdir.join("history.json"))
+    scheduler = PublishScheduler(concurrency=2, history_path=history_path)
+    recorder = PublishRecorder()
+
+    repos = [YumRepository(id="repo%s" % i) for i in range(0, 4)]
+    fs = scheduler.schedule(repos, recorder)
+
+    # Only two should have started.
+    assert recorder.started == ["repo0", "repo1"]
+
+    # Completing one allows the next to start.
+    recorder.finish("repo1")
+    assert fs[1].result() == ["repo1"]
+    assert recorder.started == ["repo0", "repo1", "repo2"]
+
+    # Failures are propagated, and also allow the next to start.
+    recorder.futures["repo0"].set_exception(RuntimeError("simulated error"))
+    assert "simulated error" in str(fs[0].exception())
+    assert recorder.started == ["repo0", "repo1", "repo2", "repo3"]
+
+    recorder.finish("repo2")
+    recorder.finish("repo3")
+
+    scheduler.save_history()
+
+    # It should have recorded durations for the successful publishes.
+    with open(history_path) as f:
+        history = json.load(f)
+    assert sorted(history.keys()) == ["repo1", "repo2", "repo3"]
+
+
+def test_immediate_completion():
+    """Scheduler copes with many publishes which complete immediately."""
+
+    def publish_fn(repo):
+        f = Future()
+        f.set_result(repo.id)
+        return f
+
+    scheduler = PublishScheduler(concurrency=1)
+    repos = [YumRepository(id="repo%s" % i) for i in range(0, 5000)]
+    fs = scheduler.schedule(repos, publish_fn)
+
+    assert [f.result() for f in fs] == [repo.id for repo in repos]
+
+
+def test_futures_in_input_order():
+    """Scheduler returns futures in the order repos were given, regardless of
+    the order they're published."""
+
+    scheduler = PublishScheduler(priority=["repo2"])
+    recorder = PublishRecorder()
+
+    repos = [YumRepository(id="repo%s" % i) for i in range(0, 3)]
+    fs = scheduler.schedule(repos, recorder)
+
+    assert recorder.started == ["repo2", "repo0", "repo1"]
+
+    for repo in repos:
+        recorder.finish(repo.id)
+
+    assert [f.result() for f in fs] == [["repo0"], ["repo1"], ["repo2"]]
+
+
+def test_concurrent_save_history(tmpdir):
+    """Scheduler writes a valid history file even if saved from several
+    threads at once."""
+
+    history_path = str(tmpdir.join("history.json"))
+    scheduler = PublishScheduler(history_path=history_path)
+    scheduler.history = dict(("repo%s" % i, float(i)) for i in range(0, 200))
+
+    threads = [threading.Thread(target=scheduler.save_history) for _ in range(0, 8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(history_path) as f:
+        assert json.load(f) == scheduler.history
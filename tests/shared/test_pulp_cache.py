@@ -1,9 +1,12 @@
 import sys
+from concurrent.futures import Future
+
 import attr
 
-from pubtools.pulplib import Client, FakeController, FileRepository
+from pubtools.pulplib import Client, Criteria, FakeController, FileRepository, FileUnit
 from pubtools._pulp.task import PulpTask
 from pubtools._pulp.services import CachingPulpClientService
+from pubtools._pulp.services.cachingpulp import CachingPulpClient
 
 
 class TaskWithPulpClient(CachingPulpClientService, PulpTask):
@@ -123,3 +126,144 @@ def test_update_invalidates(monkeypatch):
         # The cache should have been smart enough to realize it can't
         # return the old cached value since the repo was updated.
         assert repo3.product_versions == ["new", "versions"]
+
+
+class DelegatingClient(object):
+    # Wraps a Pulp client so that searches can be counted and held in progress.
+    def __init__(self, delegate):
+        self.delegate = delegate
+        self.searches = []
+        self.pending = []
+
+    def search_content(self, criteria=None):
+        self.searches.append(criteria)
+        out = Future()
+        self.pending.append((criteria, out))
+        return out
+
+    def complete(self):
+        for criteria, out in self.pending:
+            out.set_result(self.delegate.search_content(criteria).result())
+        self.pending = []
+
+    def update_content(self, unit):
+        return self.delegate.update_content(unit)
+
+
+def test_client_search_single_flight():
+    """CachingPulpClient shares identical searches which are in progress."""
+
+    ctrl = FakeController()
+    delegate = DelegatingClient(ctrl.client)
+    client = CachingPulpClient(delegate, search_ttl=0)
+
+    search1 = client.search_content(Criteria.with_field("name", "foo"))
+    search2 = client.search_content(Criteria.with_field("name", "foo"))
+    search3 = client.search_content(Criteria.with_field("name", "bar"))
+
+    # Identical search should share the same request.
+    assert search1 is search2
+    assert search1 is not search3
+    assert len(delegate.searches) == 2
+
+    delegate.complete()
+
+    # With no TTL, completed searches are not cached.
+    search4 = client.search_content(Criteria.with_field("name", "foo"))
+    assert search4 is not search1
+
+    assert client.search_hits == 1
+    assert client.search_misses == 3
+
+
+def test_client_search_ttl_and_invalidate():
+    """CachingPulpClient caches searches up to TTL and invalidates on update."""
+
+    ctrl = FakeController()
+    repo = FileRepository(id="test-repo")
+    ctrl.insert_repository(repo)
+    ctrl.insert_units(repo, [FileUnit(path="a.txt", size=1, sha256sum="a" * 64)])
+
+    delegate = DelegatingClient(ctrl.client)
+    client = CachingPulpClient(delegate, search_ttl=3600, search_cache_size=1)
+
+    search1 = client.search_content()
+    delegate.complete()
+    unit = list(search1.result())[0]
+
+    # Completed search is cached.
+    assert client.search_content() is search1
+
+    # Updating content invalidates.
+    client.update_content(attr.evolve(unit, cdn_path="/foo")).result()
+    search2 = client.search_content()
+    assert search2 is not search1
+    delegate.complete()
+    assert list(search2.result())[0].cdn_path == "/foo"
+
+    # Caching another search evicts the oldest, since cache size is 1.
+    client.search_content(Criteria.with_field("path", "a.txt"))
+    delegate.complete()
+    assert client.search_content() is not search2
+
+
+def test_client_search_outside_lock():
+    """CachingPulpClient doesn't hold its lock while starting a search, so a
+    slow or reentrant delegate doesn't block other callers."""
+
+    ctrl = FakeController()
+    client = None
+
+    class ReentrantClient(object):
+        def search_content(self, criteria=None):
+            # Using the caching client from here would deadlock if the lock
+            # were held.
+            client.preload_repositories([])
+            return ctrl.client.search_content(criteria)
+
+    client = CachingPulpClient(ReentrantClient(), search_ttl=0)
+
+    assert list(client.search_content().result()) == []
+    assert client.search_misses == 1
+
+
+def test_client_search_error():
+    """CachingPulpClient propagates an error raised when starting a search,
+    without caching it."""
+
+    class BrokenClient(object):
+        def search_content(self, criteria=None):
+            raise RuntimeError("simulated error")
+
+    client = CachingPulpClient(BrokenClient(), search_ttl=3600)
+
+    search1 = client.search_content()
+    assert "simulated error" in str(search1.exception())
+
+    # Failed search is not reused.
+    assert client.search_content() is not search1
+
+
+def test_client_track_content_change():
+    """CachingPulpClient stops sharing searches once a tracked change to
+    content completes."""
+
+    ctrl = FakeController()
+    delegate = DelegatingClient(ctrl.client)
+    client = CachingPulpClient(delegate, search_ttl=0)
+
+    search1 = client.search_content()
+
+    change_f = Future()
+    assert client.track_content_change(change_f) is change_f
+
+    # Search is still shared while the change is in progress...
+    assert client.search_content() is search1
+
+    # ...but not after it completes, since it might be outdated.
+    change_f.set_result(None)
+    search2 = client.search_content()
+    assert search2 is not search1
+
+    delegate.complete()
+    assert list(search2.result()) == []
@@ -0,0 +1,99 @@
+from concurrent.futures import Future
+
+import pytest
+
+from pubtools._pulp.scheduler import RepoLockScheduler
+
+
+class OpRecorder(object):
+    # Creates operations which record when they're started and let the test
+    # complete them.
+    def __init__(self):
+        self.started = []
+        self.futures = {}
+
+    def op(self, name):
+        def fn():
+            self.started.append(name)
+            f = Future()
+            self.futures[name] = f
+            return f
+
+        return fn
+
+    def finish(self, name):
+        self.futures[name].set_result(name)
+
+
+def test_conflicting_ops_wait():
+    """Operations sharing a repo run one at a time, in the order scheduled,
+    while operations on other repos run concurrently."""
+
+    scheduler = RepoLockScheduler()
+    recorder = OpRecorder()
+
+    fs = [
+        scheduler.schedule(["repo1"], recorder.op("a")),
+        scheduler.schedule(["repo1", "repo2"], recorder.op("b")),
+        scheduler.schedule(["repo3"], recorder.op("c")),
+        # Could run now, but must not overtake b on repo2.
+        scheduler.schedule(["repo2"], recorder.op("d")),
+    ]
+
+    assert recorder.started == ["a", "c"]
+
+    recorder.finish("c")
+    assert recorder.started == ["a", "c"]
+
+    recorder.finish("a")
+    assert recorder.started == ["a", "c", "b"]
+
+    recorder.finish("b")
+    assert recorder.started == ["a", "c", "b", "d"]
+
+    recorder.finish("d")
+    assert [f.result() for f in fs] == ["a", "b", "c", "d"]
+
+
+def test_bounded_concurrency():
+    """Scheduler limits the number of operations running at once."""
+
+    scheduler = RepoLockScheduler(concurrency=2)
+    recorder = OpRecorder()
+
+    fs = [
+        scheduler.schedule(["repo%s" % i], recorder.op("op%s" % i)) for i in range(0, 4)
+    ]
+
+    assert recorder.started == ["op0", "op1"]
+
+    recorder.finish("op1")
+    assert recorder.started == ["op0", "op1", "op2"]
+
+    for name in ["op0", "op2", "op3"]:
+        recorder.finish(name)
+
+    assert [f.result() for f in fs] == ["op0", "op1", "op2", "op3"]
+
+
+def test_immediate_and_failed_ops():
+    """Operations completing immediately or failing release their repos."""
+
+    scheduler = RepoLockScheduler()
+
+    def fail():
+        raise RuntimeError("simulated error")
+
+    def ok():
+        f = Future()
+        f.set_result("ok")
+        return f
+
+    fs = [scheduler.schedule(["repo"], ok) for _ in range(0, 1000)]
+    failed_f = scheduler.schedule(["repo"], fail)
+    last_f = scheduler.schedule(["repo"], ok)
+
+    assert all([f.result() == "ok" for f in fs])
+    with pytest.raises(RuntimeError):
+        failed_f.result()
+    assert last_f.result() == "ok"
@@ -0,0 +1,122 @@
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("aiohttp")
+
+from pubtools._pulp.ud_async import AsyncUdCacheClient
+
+
+class StubUdServer(object):
+    # A local HTTP server standing in for UD cache flush API.
+    def __init__(self):
+        self.paths = []
+        self.auth = []
+        self.fail_paths = {}
+        self.lock = threading.Lock()
+
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.paths.append(self.path)
+                    stub.auth.append(self.headers.get("Authorization"))
+                    failures = stub.fail_paths.get(self.path, 0)
+                    if failures:
+                        stub.fail_paths[self.path] = failures - 1
+
+                self.send_response(500 if failures else 200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:%s/" % self.server.server_address[1]
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+def test_flush(caplog):
+    """Async client flushes by hitting expected URLs."""
+
+    caplog.set_level(logging.INFO)
+
+    with StubUdServer() as server:
+        with AsyncUdCacheClient(server.url, auth=("user", "pass")) as client:
+            client.flush_product(1234).result()
+            client.flush_repo("some-repo").result()
+            client.flush_erratum("RHBA-1234").result()
+
+    assert server.paths == [
+        "/internal/rcm/flush-cache/eng-product/1234",
+        "/internal/rcm/flush-cache/repo/some-repo",
+        "/internal/rcm/flush-cache/erratum/RHBA-1234",
+    ]
+
+    # It should have used basic auth ("user:pass")
+    assert set(server.auth) == set(["Basic dXNlcjpwYXNz"])
+
+    assert caplog.messages == [
+        "Invalidating eng-product 1234",
+        "Invalidating repo some-repo",
+        "Invalidating erratum RHBA-1234",
+    ]
+
+
+def test_many_concurrent():
+    """Async client can handle many flushes at once."""
+
+    with StubUdServer() as server:
+        with AsyncUdCacheClient(server.url, concurrency=50) as client:
+            fs = [client.flush_repo("repo%s" % i) for i in range(0, 500)]
+            for f in fs:
+                f.result()
+
+    assert sorted(server.paths) == sorted(
+        ["/internal/rcm/flush-cache/repo/repo%s" % i for i in range(0, 500)]
+    )
+
+
+def test_retries():
+    """Async client retries automatically on error."""
+
+    with StubUdServer() as server:
+        server.fail_paths["/internal/rcm/flush-cache/repo/some-repo"] = 2
+
+        with AsyncUdCacheClient(server.url, max_retry_sleep=0.001) as client:
+            # It should succeed due to retrying
+            client.flush_repo("some-repo").result()
+
+    assert len(server.paths) == 3
+
+
+def test_eventually_fails(caplog):
+    """Async client propagates an error if retries are exhausted."""
+
+    with StubUdServer() as server:
+        server.fail_paths["/internal/rcm/flush-cache/repo/some-repo"] = 100
+
+        with AsyncUdCacheClient(server.url, max_retry_sleep=0.001) as client:
+            exception = client.flush_repo("some-repo").exception()
+
+    assert "500" in str(exception)
+    assert "Invalidating repo some-repo failed" in caplog.text
@@ -0,0 +1,114 @@
+from concurrent.futures import Future
+
+from more_executors.futures import f_return, f_return_error
+
+from pubtools._pulp.ud import UdFlushCoordinator
+
+
+class FakeUdCache(object):
+    def __init__(self):
+        self.flushed = []
+        self.fail_next = False
+        self.hold = False
+        self.held = []
+
+    def flush(self, object_type, object_id):
+        self.flushed.append((object_type, object_id))
+        if self.fail_next:
+            self.fail_next = False
+            return f_return_error(RuntimeError("simulated error"))
+        if self.hold:
+            # Leave the flush in progress until released.
+            f = Future()
+            self.held.append(f)
+            return f
+        return f_return()
+
+    def release(self):
+        self.hold = False
+        for f in self.held:
+            f.set_result(None)
+
+    def flush_repo(self, repo_id):
+        return self.flush("repo", repo_id)
+
+    def flush_product(self, product_id):
+        return self.flush("eng-product", product_id)
+
+    def flush_erratum(self, erratum_id):
+        return self.flush("erratum", erratum_id)
+
+
+def test_dedupe():
+    """Coordinator only flushes each object once while a flush is in progress."""
+
+    client = FakeUdCache()
+    client.hold = True
+    flusher = UdFlushCoordinator(client)
+
+    assert not flusher.is_flushed("repo", "repo1")
+
+    fs = []
+    for _ in range(0, 3):
+        fs.append(flusher.flush_repo("repo1"))
+        fs.append(flusher.flush_product(123))
+        fs.append(flusher.flush_erratum("RHSA-1234:56"))
+    fs.append(flusher.flush_repo("repo2"))
+
+    assert client.flushed == [
+        ("repo", "repo1"),
+        ("eng-product", 123),
+        ("erratum", "RHSA-1234:56"),
+        ("repo", "repo2"),
+    ]
+    assert flusher.requested == 4
+    assert flusher.saved == 6
+
+    # Nothing is flushed until the requests complete.
+    assert not flusher.is_flushed("repo", "repo1")
+
+    client.release()
+    for f in fs:
+        f.result()
+
+    assert flusher.is_flushed("repo", "repo1")
+    assert flusher.is_flushed("eng-product", 123)
+    assert not flusher.is_flushed("repo", "repo3")
+
+
+def test_flush_again_after_complete():
+    """Coordinator sends a new request for an object if the earlier flush has
+    already completed, e.g. if a repo is published, flushed, then republished."""
+
+    client = FakeUdCache()
+    flusher = UdFlushCoordinator(client)
+
+    # Publish & flush...
+    flusher.flush_repo("repo1").result()
+
+    # ...then republish & flush again.
+    flusher.flush_repo("repo1").result()
+
+    # It should have flushed both times, since UD may have cached content from
+    # before the republish during the first flush.
+    assert client.flushed == [("repo", "repo1"), ("repo", "repo1")]
+    assert flusher.requested == 2
+    assert flusher.saved == 0
+    assert flusher.is_flushed("repo", "repo1")
+
+
+def test_failed_flush_retried():
+    """Coordinator sends a new request for an object if the earlier flush failed."""
+
+    client = FakeUdCache()
+    flusher = UdFlushCoordinator(client)
+
+    client.fail_next = True
+    assert flusher.flush_repo("repo1").exception()
+    assert not flusher.is_flushed("repo", "repo1")
+
+    flusher.flush_repo("repo1").result()
+    assert flusher.is_flushed("repo", "repo1")
+
+    assert client.flushed == [("repo", "repo1"), ("repo", "repo1")]
+    assert flusher.saved == 0